@@ -0,0 +1,272 @@
+"""
+Micro-benchmarks for the WhatsApp plugins' pure helpers and message formatters.
+
+These run in-process without the host app, a browser or a network (``core.plugins`` is
+stubbed by ``host_stubs``), so they are cheap enough to run before every change to the
+hot-path helpers:
+
+    python benchmarks/bench_helpers.py --save       # record baselines for this machine
+    python benchmarks/bench_helpers.py              # compare, exit 1 on regressions
+    python benchmarks/bench_helpers.py --filter format --threshold 0.3
+
+Baselines are per machine and Python version; timings are the best of ``--repeat``
+runs, in nanoseconds per call.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+from collections import deque
+from pathlib import Path
+
+from harness import BenchPlugin, _BenchSettings
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "bench_helpers.json"
+
+ARABIC_NAMES = ["مؤسسة النور للتجارة", "شركة الرياض للمقاولات", "مطعم البيت الشامي", "صيدلية الدواء"]
+ENGLISH_NAMES = ["Al Noor Trading Est.", "Riyadh Contracting Co.", "Green Leaf Catering", "Delta Pharma"]
+ITEM_NAMES = ["Printer paper A4 (كرتون)", "حبر طابعة HP 305", "Office chair", "خدمة صيانة شهرية",
+              "Cleaning supplies", "قهوة عربية ١ كجم", "USB-C cable 2m", "Delivery fee / رسوم توصيل"]
+
+
+def _filenames(rng: random.Random) -> list:
+    names = []
+    for i in range(200):
+        vendor = rng.choice(ARABIC_NAMES + ENGLISH_NAMES)
+        names.append(rng.choice([
+            f"فاتورة ضريبية {vendor} {i}.pdf",
+            f"Invoice #{1000 + i} - {vendor}.PDF",
+            f"C:\\Users\\Accounts\\Downloads\\{vendor}: {i}?.pdf",
+            f"scan {i}\nsecond line",
+            f"IMG-2025{i:04d}-WA00{i % 10}",
+            "",
+        ]))
+    return names
+
+
+def _phone_inputs(rng: random.Random) -> list:
+    inputs = []
+    for i in range(200):
+        phone = f"9665{rng.randrange(10_000_000, 99_999_999)}"
+        choice = i % 4
+        if choice == 0:
+            inputs.append(({"whatsapp_sender_phone": f"+{phone[:3]} {phone[3:5]} {phone[5:8]} {phone[8:]}"}, ""))
+        elif choice == 1:
+            inputs.append(({"whatsapp_chat_title": f"{rng.choice(ARABIC_NAMES)} ({phone})"}, ""))
+        elif choice == 2:
+            inputs.append(({}, f"false_{phone}@c.us_3EB0{rng.getrandbits(64):016X}:result"))
+        else:
+            inputs.append(({"whatsapp_chat_title": rng.choice(ENGLISH_NAMES)}, "fallback:delta_pharma:abc"))
+    return inputs
+
+
+def _titles(rng: random.Random) -> list:
+    titles = []
+    for i in range(200):
+        if i % 2:
+            titles.append(f"+966 5{rng.randrange(10, 99)} {rng.randrange(100, 999)} {rng.randrange(1000, 9999)}")
+        else:
+            titles.append(rng.choice(ARABIC_NAMES + ENGLISH_NAMES) + f" - {rng.choice(['Accounts', 'المحاسبة'])}")
+    return titles
+
+
+def _invoice(rng: random.Random, items: int) -> dict:
+    line_items = []
+    for _ in range(items):
+        qty = rng.randint(1, 12)
+        price = round(rng.uniform(1, 900), 2)
+        line_items.append({
+            "description": rng.choice(ITEM_NAMES),
+            "quantity": qty,
+            "unit_price": price,
+            "line_total": round(qty * price, 2),
+            "total": round(qty * price, 2),
+        })
+    subtotal = sum(item["line_total"] for item in line_items)
+    return {
+        "invoice_number": f"INV-{rng.randrange(100000, 999999)}",
+        "invoice_date": "2025-03-14T09:12:44Z",
+        "vendor_name": rng.choice(ARABIC_NAMES),
+        "vat_id": "300012345600003",
+        "currency": "SAR",
+        "vat_total": round(subtotal * 0.15, 2),
+        "invoice_total": round(subtotal * 1.15, 2),
+        "line_items": line_items,
+    }
+
+
+class _FakeMessageElement:
+    """A message bubble without ``data-id``, so keys come from the hashed fallbacks."""
+
+    def __init__(self, pre_plain: str, text: str):
+        self.pre_plain = pre_plain
+        self.text = text
+
+    async def get_attribute(self, name: str):
+        return self.pre_plain if name == "data-pre-plain-text" else None
+
+    async def inner_text(self):
+        return self.text
+
+
+def build_cases() -> dict:
+    """``name -> (callable, calls per invocation)``; every callable runs over a batch of inputs."""
+    from plugins.whatsapp_automation_agent.whatsapp_client import WhatsAppClient
+    from plugins.whatsapp_automation_agent import WhatsAppAgentPlugin
+    from plugins.whatsapp_quick_share import WhatsAppRedirectPlugin
+
+    rng = random.Random(1234)
+    client = WhatsAppClient(BenchPlugin())
+
+    filenames = _filenames(rng)
+    phone_inputs = _phone_inputs(rng)
+    titles = _titles(rng)
+    allowed = [t if i % 3 else t.split(" - ")[0] for i, t in enumerate(titles)]
+
+    elements = []
+    for i in range(200):
+        text = f"{rng.choice(ARABIC_NAMES)}: فاتورة رقم {i} / invoice {i} attached " * 4
+        pre_plain = f"[10:{i % 60:02d}, 14/03/2025] {rng.choice(ENGLISH_NAMES)}: " if i % 2 else ""
+        elements.append((_FakeMessageElement(pre_plain, text), rng.choice(ARABIC_NAMES + ENGLISH_NAMES)))
+    loop = asyncio.new_event_loop()
+
+    async def message_keys():
+        for element, header in elements:
+            await client._get_message_key(element, header)
+
+    reply_keys = [f"false_9665{i:08d}@c.us_3EB0{i:012X}:{suffix}"
+                  for i in range(20_000) for suffix in ("ack", "result")]
+
+    def mark_reply_keys():
+        client._recent_reply_keys = deque(maxlen=500)
+        client._recent_reply_lookup = set()
+        for key in reply_keys:
+            client._mark_reply_key(key)
+
+    agent_plugin = WhatsAppAgentPlugin.__new__(WhatsAppAgentPlugin)
+    agent_plugin.settings = _BenchSettings()
+    share_plugin = WhatsAppRedirectPlugin.__new__(WhatsAppRedirectPlugin)
+    share_plugin.message_template = WhatsAppRedirectPlugin.DEFAULT_TEMPLATE
+    small_invoices = [_invoice(rng, 3) for _ in range(50)]
+    large_invoice = _invoice(rng, 500)
+
+    return {
+        "normalize_download_filename": (
+            lambda: [client._normalize_download_filename(name) for name in filenames], len(filenames)),
+        "extract_phone_candidate": (
+            lambda: [client._extract_phone_candidate(meta, key) for meta, key in phone_inputs], len(phone_inputs)),
+        "normalize_for_match": (
+            lambda: [client._normalize_for_match(a) in client._normalize_for_match(t)
+                     for a, t in zip(allowed, titles)], len(titles)),
+        "get_message_key_fallback_hash": (
+            lambda: loop.run_until_complete(message_keys()), len(elements)),
+        "mark_reply_key_eviction_40k": (mark_reply_keys, 1),
+        "agent_format_message": (
+            lambda: [agent_plugin._format_message(data) for data in small_invoices], len(small_invoices)),
+        "agent_format_message_500_items": (lambda: agent_plugin._format_message(large_invoice), 1),
+        "quick_share_format_message": (
+            lambda: [share_plugin._format_message(data) for data in small_invoices], len(small_invoices)),
+        "quick_share_format_message_500_items": (lambda: share_plugin._format_message(large_invoice), 1),
+    }
+
+
+def measure(func, calls: int, repeat: int, min_time: float) -> float:
+    """Best-of-``repeat`` nanoseconds per call, each run lasting at least ``min_time`` seconds."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2
+    best = min([elapsed] + timer.repeat(repeat=max(repeat - 1, 0), number=number))
+    return best / number / calls * 1e9
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: dict, existing: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cases = dict(existing.get("cases") or {})
+    cases.update({name: {"ns_per_call": round(ns, 1)} for name, ns in results.items()})
+    payload = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cases": cases,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    rows = []
+    cases = baseline.get("cases") or {}
+    for name, ns in results.items():
+        base = (cases.get(name) or {}).get("ns_per_call")
+        change = (ns / base - 1.0) if base else None
+        if change is None:
+            verdict = "new"
+        elif change > threshold:
+            verdict = "REGRESSION"
+        elif change < -threshold:
+            verdict = "faster"
+        else:
+            verdict = "ok"
+        rows.append({"name": name, "ns_per_call": round(ns, 1), "baseline": base,
+                     "change": None if change is None else round(change, 3), "verdict": verdict})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the WhatsApp plugins' pure helpers.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="store these timings as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing run")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in build_cases().items() if args.filter in name}
+    results = {}
+    for name, (func, calls) in cases.items():
+        results[name] = measure(func, calls, args.repeat, args.min_time)
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.threshold)
+    print(f"{'case':<40} {'ns/call':>12} {'baseline':>12} {'change':>8}")
+    for row in rows:
+        base = f"{row['baseline']:,.0f}" if row["baseline"] else "-"
+        change = f"{row['change']:+.0%}" if row["change"] is not None else "-"
+        print(f"{row['name']:<40} {row['ns_per_call']:>12,.0f} {base:>12} {change:>8}  {row['verdict']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"threshold": args.threshold, "results": rows}, f, indent=2)
+        print(f"Results written to {args.json}")
+    if args.save:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = [row["name"] for row in rows if row["verdict"] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
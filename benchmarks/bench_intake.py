@@ -0,0 +1,182 @@
+"""
+End-to-end intake benchmark for the WhatsApp Automation Agent.
+
+Runs the real ``WhatsAppClient`` (headless Chromium via Playwright) against the
+offline fake WhatsApp Web in ``fake_whatsapp/``, drives it with scripted incoming
+messages and reports intake latency and invoices per minute.
+
+    python benchmarks/bench_intake.py --chats 5 --messages 4 --interval 1.5
+    python benchmarks/bench_intake.py --mix document:3,image:1,text:1 --json result.json
+    python benchmarks/bench_intake.py --virtual-time 50 --chats 20 --messages 10
+
+Requires ``playwright`` and its Chromium build (``python -m playwright install chromium``).
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from harness import AgentRun, summarize, stage_latencies, print_stages
+from fake_whatsapp.server import FakeWhatsAppServer, MessageGenerator
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition(":")
+        mix[kind.strip()] = float(weight or 1)
+    unknown = set(mix) - {"document", "image", "text"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown message kinds: {sorted(unknown)}")
+    return mix
+
+
+def build_report(server, generator, plugin, client, started_at: float, finished_at: float,
+                 real_elapsed: float | None = None) -> dict:
+    state = server.state
+    injected = {mid: state.injected[mid] for mid in generator.sent}
+    expected = {mid: rec for mid, rec in injected.items() if rec["kind"] in ("document", "image")}
+
+    intake = {}
+    for entry in plugin.api.processing.imported:
+        key = entry["metadata"].get("whatsapp_message_key") or ""
+        message_id = key.rsplit("_", 1)[-1]
+        if message_id in expected and message_id not in intake:
+            intake[message_id] = entry["at"] - expected[message_id]["at"]
+
+    # First reply in the sender's chat after each message: the "downloading" acknowledgement.
+    ack = []
+    for message_id, record in expected.items():
+        first = next(
+            (out["at"] for out in state.outgoing if out["chat"] == record["chat"] and out["at"] >= record["at"]),
+            None,
+        )
+        if first is not None:
+            ack.append(first - record["at"])
+
+    elapsed = max(finished_at - started_at, 1e-6)
+    real_elapsed = elapsed if real_elapsed is None else max(real_elapsed, 1e-6)
+    ingested_at = [entry["at"] for entry in plugin.api.processing.imported]
+    window = (max(ingested_at) - started_at) if ingested_at else elapsed
+
+    return {
+        "injected": {
+            "total": len(injected),
+            "by_kind": {kind: sum(1 for r in injected.values() if r["kind"] == kind) for kind in ("document", "image", "text")},
+        },
+        "ingested": len(intake),
+        "missed": sorted(set(expected) - set(intake)),
+        "duplicates_imported": len(plugin.api.processing.imported) - len(intake),
+        "intake_latency_seconds": summarize(list(intake.values())),
+        "ack_latency_seconds": summarize(ack),
+        "invoices_per_minute": round(len(intake) / max(window, 1e-6) * 60, 2),
+        "replies_sent": len(state.outgoing),
+        "elapsed_seconds": round(elapsed, 2),
+        "clock": "virtual" if client.clock.virtual else "real",
+        "real_elapsed_seconds": round(real_elapsed, 2),
+        "speedup": round(elapsed / real_elapsed, 1),
+        "stages": stage_latencies(client),
+    }
+
+
+def print_report(report: dict, args):
+    print(f"Load: {args.chats} chats x {args.messages} messages, interval {args.interval}s, mix {args.mix}")
+    print(f"Injected: {report['injected']['total']} {report['injected']['by_kind']}")
+    print(f"Ingested: {report['ingested']}  missed: {len(report['missed'])}  duplicate imports: {report['duplicates_imported']}")
+    for name in ("intake_latency_seconds", "ack_latency_seconds"):
+        s = report[name]
+        print(f"{name:<24} n={s['count']:<4} p50={s['p50']:>7.3f}  p95={s['p95']:>7.3f}  max={s['max']:>7.3f}")
+    print(f"Invoices per minute: {report['invoices_per_minute']}")
+    print(f"Replies sent: {report['replies_sent']}  elapsed: {report['elapsed_seconds']}s")
+    if report["clock"] == "virtual":
+        print(f"Virtual time: {report['elapsed_seconds']}s in {report['real_elapsed_seconds']}s real "
+              f"({report['speedup']}x)")
+    print_stages(report["stages"])
+
+
+def run_benchmark(args) -> dict:
+    server = FakeWhatsAppServer(port=args.port).start()
+    generator = MessageGenerator(
+        server.state,
+        chats=args.chats,
+        messages_per_chat=args.messages,
+        interval=args.interval,
+        mix=args.mix,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    generator.prepare()
+
+    try:
+        with AgentRun(server.url, processing_delay=args.processing_delay, workdir=args.workdir,
+                      login_timeout=args.login_timeout, virtual_time=args.virtual_time) as run:
+            print(f"Fake WhatsApp Web at {server.url}; agent logged in, starting load.")
+            clock = run.clock
+            # All latencies are measured on the agent's clock, virtual or real.
+            server.state.now = clock.time
+            real_started = time.time()
+            started_at = clock.time()
+            if clock.virtual:
+                generator.start(clock=clock, loop=run.client.loop)
+            else:
+                generator.start()
+
+            deadline = real_started + args.timeout
+            expected_kinds = ("document", "image")
+            while time.time() < deadline:
+                time.sleep(0.05 if clock.virtual else 0.5)
+                if not generator.finished.is_set():
+                    continue
+                expected = sum(1 for mid in generator.sent if server.state.injected[mid]["kind"] in expected_kinds)
+                if len(run.plugin.api.processing.imported) >= expected:
+                    # Give trailing notices a moment so ack latencies are complete.
+                    run.wait_clock(max(args.processing_delay, 0) + args.settle, deadline)
+                    break
+            finished_at = clock.time()
+            real_elapsed = time.time() - real_started
+            generator.stop()
+            return build_report(server, generator, run.plugin, run.client, started_at, finished_at, real_elapsed)
+    finally:
+        generator.stop()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intake latency and throughput against a fake WhatsApp Web.")
+    parser.add_argument("--chats", type=int, default=5, help="number of sender chats")
+    parser.add_argument("--messages", type=int, default=4, help="messages per chat")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between injected messages")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds added to the interval")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("document:3,image:1"),
+                        help="message kind weights, e.g. document:3,image:1,text:1")
+    parser.add_argument("--processing-delay", type=float, default=3.0,
+                        help="seconds until the fake host reports processing complete (<0 disables)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="give up after this many real seconds of load")
+    parser.add_argument("--login-timeout", type=float, default=90.0)
+    parser.add_argument("--settle", type=float, default=5.0, help="extra seconds to wait after the last intake")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--virtual-time", type=float, default=0, metavar="SPEED",
+                        help="run the agent on a virtual clock this many times faster than real time (0 = real)")
+    parser.add_argument("--port", type=int, default=0, help="fixture port (0 = any free port)")
+    parser.add_argument("--workdir", help="directory for the browser profile and downloads")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show agent logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    report = run_benchmark(args)
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    return 0 if not report["missed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
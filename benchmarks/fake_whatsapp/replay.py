@@ -0,0 +1,233 @@
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse, parse_qs, unquote
+
+from .server import FakeWhatsAppServer, _FakeWhatsAppHandler
+
+
+def _phone_tail(value: str) -> str:
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-9:] if len(digits) >= 7 else ""
+
+
+class RecordingReplay:
+    """
+    A recorded session (see ``SessionRecorder``) turned into a deterministic script.
+
+    Chat-list snapshots become *sweeps*; each sweep lists the chats the agent opened
+    during recording, with the DOM of the open chat (and the media viewer, when one was
+    captured). A sweep ends once the replaying agent has opened every chat in it, so
+    progress follows the agent's actions rather than wall-clock time. Outbound sends are
+    replayed from the ``outbound.*`` snapshots.
+    """
+
+    def __init__(self, recording_dir: str):
+        self.recording_dir = recording_dir
+        self._lock = threading.Lock()
+        self.head = self._load_json("head.json", {})
+        self.meta = self._load_json("meta.json", {})
+        self.media = dict(self.meta.get("media") or {})
+        self.sweeps = []
+        self.outbound = []
+        self._load_snapshots()
+
+        self.step = 0
+        self.opened = set()
+        self.outbound_used = set()
+        self.outgoing = []
+        self.unmatched_opens = []
+
+    @property
+    def har_path(self) -> str:
+        path = os.path.join(self.recording_dir, "network.har")
+        return path if os.path.exists(path) else ""
+
+    @property
+    def done(self) -> bool:
+        return self.step >= len(self.sweeps)
+
+    def expected_keys(self) -> list:
+        """Message keys whose files were downloaded during recording."""
+        keys = []
+        for sweep in self.sweeps:
+            for chat in sweep["chats"]:
+                if chat["message_key"] in self.media and chat["message_key"] not in keys:
+                    keys.append(chat["message_key"])
+        return keys
+
+    def _load_json(self, name: str, default):
+        path = os.path.join(self.recording_dir, name)
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load_snapshots(self):
+        path = os.path.join(self.recording_dir, "snapshots.jsonl")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No snapshots.jsonl in {self.recording_dir}")
+        sweep = None
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                label = record.get("label")
+                meta = record.get("meta") or {}
+                if label == "chat_list":
+                    sweep = {"pane_side": record.get("pane_side", ""), "t": record.get("t", 0), "chats": []}
+                    self.sweeps.append(sweep)
+                elif label == "chat":
+                    if sweep is None:
+                        sweep = {"pane_side": record.get("pane_side", ""), "t": record.get("t", 0), "chats": []}
+                        self.sweeps.append(sweep)
+                    sweep["chats"].append({
+                        "message_key": meta.get("message_key") or "",
+                        "row_id": meta.get("row_id") or "",
+                        "title": (meta.get("title") or "").strip(),
+                        "main": record.get("main", ""),
+                        "viewer": "",
+                    })
+                elif label == "viewer" and sweep is not None:
+                    for chat in reversed(sweep["chats"]):
+                        if chat["message_key"] == meta.get("message_key"):
+                            chat["viewer"] = record.get("body", "")
+                            break
+                elif label == "outbound.chat":
+                    self.outbound.append({
+                        "phone": meta.get("phone") or "",
+                        "main": record.get("main", ""),
+                        "pane_side": record.get("pane_side", ""),
+                        "attach_menu": "",
+                        "preview": "",
+                    })
+                elif label in ("outbound.attach_menu", "outbound.preview") and self.outbound:
+                    self.outbound[-1][label.split(".", 1)[1]] = record.get("body", "")
+        # Sweeps in which the agent opened nothing carry no expectations.
+        self.sweeps = [s for s in self.sweeps if s["chats"]]
+
+    def state(self, since: int = -1) -> dict:
+        with self._lock:
+            payload = {"step": self.step, "total": len(self.sweeps), "done": self.done}
+            if since != self.step and not self.done:
+                payload["pane_side"] = self.sweeps[self.step]["pane_side"]
+            return payload
+
+    def open_chat(self, row_id: str, title: str) -> dict:
+        """The agent clicked a chat row: return the recorded open-chat DOM for it."""
+        with self._lock:
+            if self.done:
+                return {"main": ""}
+            sweep = self.sweeps[self.step]
+            clean_title = (title or "").strip()
+            match = None
+            for index, chat in enumerate(sweep["chats"]):
+                if row_id and chat["row_id"] and chat["row_id"] == row_id:
+                    match = index
+                    break
+                if clean_title and chat["title"] and (chat["title"] == clean_title or clean_title in chat["title"]):
+                    match = index
+                    break
+            if match is None:
+                self.unmatched_opens.append({"step": self.step, "row_id": row_id, "title": clean_title})
+                return {"main": ""}
+            chat = sweep["chats"][match]
+            self.opened.add(match)
+            if len(self.opened) >= len(sweep["chats"]):
+                self.step += 1
+                self.opened = set()
+            media_name = self.media.get(chat["message_key"], "")
+            return {
+                "main": chat["main"],
+                "viewer": chat["viewer"],
+                "message_key": chat["message_key"],
+                "filename": media_name.split("_", 1)[-1] if media_name else "",
+            }
+
+    def open_outbound(self, phone: str) -> dict:
+        with self._lock:
+            tail = _phone_tail(phone)
+            candidates = [i for i, o in enumerate(self.outbound) if i not in self.outbound_used]
+            match = next((i for i in candidates if tail and _phone_tail(self.outbound[i]["phone"]) == tail), None)
+            if match is None and candidates:
+                match = candidates[0]
+            if match is None:
+                return {"main": ""}
+            self.outbound_used.add(match)
+            return dict(self.outbound[match], context=f"outbound:{phone}")
+
+    def media_path(self, message_key: str) -> str:
+        name = self.media.get(message_key)
+        if not name:
+            return ""
+        path = os.path.join(self.recording_dir, "media", name)
+        return path if os.path.exists(path) else ""
+
+    def record_outgoing(self, context: str, text: str = "", filename: str = ""):
+        with self._lock:
+            self.outgoing.append({"context": context, "text": text, "filename": filename, "at": time.time()})
+
+
+class _ReplayHandler(_FakeWhatsAppHandler):
+    server_version = "FakeWhatsAppReplay/1.0"
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+
+        if path in ("/", "/send", "/send/"):
+            self._send_static("replay.html", "text/html; charset=utf-8")
+        elif path == "/replay.js":
+            self._send_static("replay.js", "application/javascript; charset=utf-8")
+        elif path == "/api/replay/head":
+            self._send_json(self.state.head or {})
+        elif path == "/api/replay/state":
+            try:
+                since = int(query.get("since", ["-1"])[0])
+            except ValueError:
+                since = -1
+            self._send_json(self.state.state(since))
+        elif path == "/api/replay/outbound":
+            self._send_json(self.state.open_outbound(query.get("phone", [""])[0]))
+        elif path.startswith("/media/"):
+            message_key = unquote(path[len("/media/"):])
+            file_path = self.state.media_path(message_key)
+            if not file_path:
+                self._send_json({"error": "not found"}, code=404)
+                return
+            with open(file_path, "rb") as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            self._send(200, body, content_type)
+        else:
+            self._send_json({"error": "not found"}, code=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        payload = self._read_json()
+        if path == "/api/replay/open":
+            self._send_json(self.state.open_chat(str(payload.get("row_id") or ""), str(payload.get("title") or "")))
+        elif path == "/api/send":
+            self.state.record_outgoing(
+                str(payload.get("context") or ""),
+                text=str(payload.get("text") or ""),
+                filename=str(payload.get("filename") or ""),
+            )
+            self._send_json({"ok": True})
+        else:
+            self._send_json({"error": "not found"}, code=404)
+
+
+class ReplayServer(FakeWhatsAppServer):
+    """Serves a recorded session to the agent from loopback."""
+
+    handler_class = _ReplayHandler
+
+    def __init__(self, recording_dir: str, port: int = 0, host: str = "127.0.0.1"):
+        super().__init__(port=port, host=host, state=RecordingReplay(recording_dir))
@@ -0,0 +1,407 @@
+import asyncio
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Messages per chat sent to the page; older history is irrelevant to the client.
+STATE_HISTORY_LIMIT = 40
+
+
+def make_pdf_bytes(label: str) -> bytes:
+    """Small but well-formed single-page PDF carrying a label."""
+    text = label.replace("(", "[").replace(")", "]")
+    stream = f"BT /F1 14 Tf 72 720 Td (Invoice {text}) Tj ET".encode("latin-1", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_png_bytes(seed: int, width: int = 64, height: int = 48) -> bytes:
+    """Solid-colour RGB PNG; the seed picks the colour so payloads differ."""
+    rnd = random.Random(seed)
+    pixel = bytes((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    raw = b"".join(b"\x00" + pixel * width for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+class FakeChat:
+    __slots__ = ("id", "name", "phone", "unread", "last_ts", "messages")
+
+    def __init__(self, chat_id: str, name: str, phone: str):
+        self.id = chat_id
+        self.name = name
+        self.phone = phone
+        self.unread = 0
+        self.last_ts = 0.0
+        self.messages = []
+
+
+class FakeWhatsAppState:
+    """Chats, messages and media served to the fake WhatsApp Web page."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.version = 0
+        self.chats = {}
+        self.media = {}
+        self.injected = {}   # message id -> injection record
+        self.outgoing = []   # messages sent by the client, in order
+        # Timestamp source; benchmarks in virtual time point this at the agent's clock.
+        self.now = time.time
+        # "connected", "phone_offline", "reconnecting" or "conflict" (open in another window).
+        self.connection = "connected"
+
+    def _next_id(self, prefix: str) -> str:
+        self._seq += 1
+        return f"{prefix}{self._seq:08X}"
+
+    def _chat_for_phone(self, phone: str, name: str = "") -> FakeChat:
+        digits = "".join(ch for ch in str(phone) if ch.isdigit())
+        chat = self.chats.get(digits)
+        if chat is None:
+            chat = FakeChat(f"{digits}@c.us", name or f"+{digits}", digits)
+            self.chats[digits] = chat
+        return chat
+
+    def add_chat(self, phone: str, name: str = "") -> str:
+        with self._lock:
+            chat = self._chat_for_phone(phone, name)
+            self.version += 1
+            return chat.id
+
+    def inject_message(self, phone: str, kind: str = "document", text: str = "",
+                       filename: str = "", name: str = "") -> str:
+        """Deliver an incoming message; returns its message id."""
+        with self._lock:
+            chat = self._chat_for_phone(phone, name)
+            message_id = self._next_id("BENCH")
+            media_id = ""
+            if kind == "document":
+                filename = filename or f"invoice_{message_id}.pdf"
+                media_id = message_id
+                self.media[media_id] = (filename, "application/pdf", make_pdf_bytes(message_id))
+            elif kind == "image":
+                filename = filename or f"IMG_{message_id}.png"
+                media_id = message_id
+                self.media[media_id] = (filename, "image/png", make_png_bytes(self._seq))
+            now = self.now()
+            chat.messages.append({
+                "id": message_id,
+                "data_id": f"false_{chat.id}_{message_id}",
+                "dir": "in",
+                "kind": kind,
+                "text": text,
+                "filename": filename,
+                "media": media_id,
+                "ts": now,
+            })
+            chat.unread += 1
+            chat.last_ts = now
+            self.injected[message_id] = {"chat": chat.id, "phone": chat.phone, "kind": kind, "at": now}
+            self.version += 1
+            return message_id
+
+    def open_phone(self, phone: str) -> str:
+        return self.add_chat(phone)
+
+    def mark_read(self, chat_id: str):
+        with self._lock:
+            for chat in self.chats.values():
+                if chat.id == chat_id and chat.unread:
+                    chat.unread = 0
+                    self.version += 1
+
+    def set_connection(self, mode: str):
+        """Show WhatsApp's connection banners / conflict screen on the page."""
+        with self._lock:
+            self.connection = mode
+            self.version += 1
+
+    def record_outgoing(self, chat_id: str, text: str = "", filename: str = ""):
+        with self._lock:
+            chat = next((c for c in self.chats.values() if c.id == chat_id), None)
+            if chat is None:
+                return
+            message_id = self._next_id("OUT")
+            now = self.now()
+            chat.messages.append({
+                "id": message_id,
+                "data_id": f"true_{chat.id}_{message_id}",
+                "dir": "out",
+                "kind": "document" if filename else "text",
+                "text": text,
+                "filename": filename,
+                "media": "",
+                "ts": now,
+            })
+            chat.last_ts = now
+            self.outgoing.append({"chat": chat.id, "phone": chat.phone, "text": text, "filename": filename, "at": now})
+            self.version += 1
+
+    def prune(self, before: float, keep_messages: int = STATE_HISTORY_LIMIT):
+        """Forget records older than ``before`` and media no longer on the page (long runs)."""
+        with self._lock:
+            for chat in self.chats.values():
+                for message in chat.messages[:-keep_messages]:
+                    self.media.pop(message["media"], None)
+                del chat.messages[:-keep_messages]
+            self.injected = {mid: rec for mid, rec in self.injected.items() if rec["at"] >= before}
+            self.outgoing = [out for out in self.outgoing if out["at"] >= before]
+
+    def snapshot(self, since: int = -1) -> dict:
+        with self._lock:
+            if since == self.version:
+                return {"version": self.version}
+            chats = []
+            for chat in self.chats.values():
+                chats.append({
+                    "id": chat.id,
+                    "name": chat.name,
+                    "phone": chat.phone,
+                    "unread": chat.unread,
+                    "last_ts": chat.last_ts,
+                    "messages": chat.messages[-STATE_HISTORY_LIMIT:],
+                })
+            return {"version": self.version, "chats": chats, "connection": self.connection}
+
+
+class _FakeWhatsAppHandler(BaseHTTPRequestHandler):
+    server_version = "FakeWhatsAppWeb/1.0"
+
+    def log_message(self, format, *args):
+        return
+
+    @property
+    def state(self) -> FakeWhatsAppState:
+        return self.server.state
+
+    def _send(self, code: int, body: bytes, content_type: str, extra_headers: dict | None = None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: dict, code: int = 200):
+        self._send(code, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send_static(self, name: str, content_type: str):
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            self._send(200, f.read(), content_type)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+
+        if path in ("/", "/send", "/send/"):
+            self._send_static("index.html", "text/html; charset=utf-8")
+        elif path == "/app.js":
+            self._send_static("app.js", "application/javascript; charset=utf-8")
+        elif path == "/api/state":
+            try:
+                since = int(query.get("since", ["-1"])[0])
+            except ValueError:
+                since = -1
+            self._send_json(self.state.snapshot(since))
+        elif path == "/api/open":
+            phone = query.get("phone", [""])[0]
+            if not any(ch.isdigit() for ch in phone):
+                self._send_json({"error": "invalid phone"}, code=400)
+                return
+            self._send_json({"chat_id": self.state.open_phone(phone)})
+        elif path.startswith("/media/"):
+            entry = self.state.media.get(path.rsplit("/", 1)[-1])
+            if entry is None:
+                self._send_json({"error": "not found"}, code=404)
+                return
+            filename, content_type, body = entry
+            self._send(200, body, content_type, {"Content-Disposition": f'inline; filename="{filename}"'})
+        else:
+            self._send_json({"error": "not found"}, code=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        payload = self._read_json()
+        if path == "/api/read":
+            self.state.mark_read(str(payload.get("chat_id") or ""))
+            self._send_json({"ok": True})
+        elif path == "/api/use_here":
+            self.state.set_connection("connected")
+            self._send_json({"ok": True})
+        elif path == "/api/send":
+            self.state.record_outgoing(
+                str(payload.get("chat_id") or ""),
+                text=str(payload.get("text") or ""),
+                filename=str(payload.get("filename") or ""),
+            )
+            self._send_json({"ok": True})
+        else:
+            self._send_json({"error": "not found"}, code=404)
+
+
+class FakeWhatsAppServer:
+    """Loopback server for the fake WhatsApp Web page and its JSON API."""
+
+    handler_class = _FakeWhatsAppHandler
+
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", state=None):
+        self.host = host
+        self.port = port
+        self.state = state if state is not None else FakeWhatsAppState()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self.handler_class)
+        self._httpd.daemon_threads = True
+        self._httpd.state = self.state
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="FakeWhatsAppWeb", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class MessageGenerator:
+    """
+    Scripted sender that drives the fake server with incoming messages.
+
+    ``chats`` senders each deliver ``messages_per_chat`` messages; a message leaves
+    every ``interval`` seconds (round-robin across chats, with optional jitter).
+    ``mix`` weights the message kinds, e.g. ``{"document": 3, "image": 1}``.
+    """
+
+    def __init__(self, state: FakeWhatsAppState, chats: int = 5, messages_per_chat: int = 4,
+                 interval: float = 2.0, mix: dict | None = None, jitter: float = 0.0, seed: int = 7):
+        self.state = state
+        self.chats = max(1, chats)
+        self.messages_per_chat = max(0, messages_per_chat)
+        self.interval = max(0.0, interval)
+        self.mix = {kind: weight for kind, weight in (mix or {"document": 1}).items() if weight > 0}
+        self.jitter = max(0.0, jitter)
+        self.random = random.Random(seed)
+        self.sent = []
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._future = None
+
+    @staticmethod
+    def phone_for(index: int) -> str:
+        return f"96650{index:07d}"
+
+    def _pick_kind(self) -> str:
+        kinds = list(self.mix)
+        return self.random.choices(kinds, weights=[self.mix[k] for k in kinds])[0]
+
+    def prepare(self):
+        """Create the sender chats up front so they exist before the client logs in."""
+        for index in range(self.chats):
+            self.state.add_chat(self.phone_for(index + 1), name=f"Supplier {index + 1:02d}")
+
+    def _schedule(self):
+        """Yield ``(phone, kind, text, delay_after)`` for every scripted message."""
+        for round_index in range(self.messages_per_chat):
+            for chat_index in range(self.chats):
+                kind = self._pick_kind()
+                text = f"Invoice batch {round_index + 1}" if kind == "text" else ""
+                delay = self.interval
+                if self.jitter:
+                    delay += self.random.uniform(-self.jitter, self.jitter)
+                yield self.phone_for(chat_index + 1), kind, text, delay
+
+    def _run(self):
+        try:
+            for phone, kind, text, delay in self._schedule():
+                if self._stop.is_set():
+                    return
+                self.sent.append(self.state.inject_message(phone, kind=kind, text=text))
+                if delay > 0 and self._stop.wait(delay):
+                    return
+        finally:
+            self.finished.set()
+
+    async def _run_on_clock(self, clock):
+        try:
+            for phone, kind, text, delay in self._schedule():
+                if self._stop.is_set():
+                    return
+                self.sent.append(self.state.inject_message(phone, kind=kind, text=text))
+                if delay > 0:
+                    await clock.sleep(delay)
+        finally:
+            self.finished.set()
+
+    def start(self, clock=None, loop=None):
+        """
+        Send on a thread with real waits, or, given the agent's virtual ``clock`` and
+        ``loop``, as a task on that loop so intervals pass in virtual time.
+        """
+        if clock is not None and loop is not None:
+            self._thread = None
+            self._future = asyncio.run_coroutine_threadsafe(self._run_on_clock(clock), loop)
+            return self
+        self._thread = threading.Thread(target=self._run, name="FakeWhatsAppGenerator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        elif self._future is not None:
+            self._future.cancel()
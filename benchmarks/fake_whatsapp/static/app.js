@@ -0,0 +1,308 @@
+// Fake WhatsApp Web: just enough DOM behaviour for the automation agent's selectors.
+// State lives on the loopback server (/api/state); this page renders it the way
+// WhatsApp Web does (chat rows with unread badges, message bubbles, viewer, composer).
+"use strict";
+
+const state = { version: -1, chats: new Map(), openChat: null, rendered: new Set(), pendingFile: null };
+const blobUrls = new Map();
+
+const pane = document.getElementById("pane-side");
+const main = document.getElementById("main");
+const title = document.getElementById("chat-title");
+const messagesEl = document.getElementById("messages");
+const composer = document.getElementById("composer");
+const sendIcon = document.getElementById("send");
+
+function el(tag, attrs, text) {
+  const node = document.createElement(tag);
+  for (const [key, value] of Object.entries(attrs || {})) {
+    if (key === "className") node.className = value;
+    else node.setAttribute(key, value);
+  }
+  if (text) node.textContent = text;
+  return node;
+}
+
+async function api(path, body) {
+  const options = body === undefined ? {} : {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  };
+  const response = await fetch(path, options);
+  return response.json();
+}
+
+// Images arrive as blob: URLs in real WhatsApp Web; fetch them before the message shows up.
+async function ensureBlob(mediaId) {
+  if (!blobUrls.has(mediaId)) {
+    const response = await fetch("/media/" + mediaId);
+    blobUrls.set(mediaId, URL.createObjectURL(await response.blob()));
+  }
+  return blobUrls.get(mediaId);
+}
+
+function triggerDownload(message) {
+  const link = el("a", { href: "/media/" + message.media, download: message.filename });
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+}
+
+function renderRow(chat) {
+  let row = pane.querySelector(`div[role='listitem'][data-id='${chat.id}']`);
+  if (!row) {
+    row = el("div", { role: "listitem", "data-id": chat.id, tabindex: "-1" });
+    row.appendChild(el("span", { title: chat.name, dir: "auto" }, chat.name));
+    row.addEventListener("click", () => openChat(chat.id));
+  }
+  const badge = row.querySelector("span[aria-label]");
+  if (chat.unread > 0 && chat.id !== state.openChat) {
+    const label = `${chat.unread} unread message${chat.unread === 1 ? "" : "s"}`;
+    if (badge) {
+      badge.setAttribute("aria-label", label);
+      badge.textContent = String(chat.unread);
+    } else {
+      row.appendChild(el("span", { "aria-label": label }, String(chat.unread)));
+    }
+  } else if (badge) {
+    badge.remove();
+  }
+  return row;
+}
+
+function renderList() {
+  const chats = [...state.chats.values()].sort((a, b) => b.last_ts - a.last_ts);
+  chats.forEach((chat, index) => {
+    const row = renderRow(chat);
+    // Reorder like WhatsApp does when a chat receives a message.
+    if (pane.children[index] !== row) pane.insertBefore(row, pane.children[index] || null);
+  });
+}
+
+function renderMessage(message) {
+  const bubble = el("div", {
+    className: message.dir === "in" ? "message-in" : "message-out",
+    "data-id": message.data_id,
+  });
+  if (message.kind === "document") {
+    const doc = el("div", { className: "doc", "aria-label": `Document ${message.filename}` });
+    doc.appendChild(el("span", { "data-icon": "document" }, "\u{1F4C4}"));
+    doc.appendChild(el("span", { dir: "auto" }, message.filename));
+    if (message.dir === "in") {
+      const button = el("div", { role: "button", title: `Download "${message.filename}"` });
+      button.appendChild(el("span", { "data-icon": "download" }, "⬇"));
+      button.addEventListener("click", () => triggerDownload(message));
+      doc.appendChild(button);
+    }
+    bubble.appendChild(doc);
+  } else if (message.kind === "image") {
+    const img = el("img", { src: blobUrls.get(message.media) || "", alt: "" });
+    img.addEventListener("click", () => openViewer(message));
+    bubble.appendChild(img);
+  }
+  if (message.text) {
+    const text = el("span", { className: "selectable-text copyable-text", dir: "ltr" });
+    text.appendChild(el("span", {}, message.text));
+    bubble.appendChild(text);
+  }
+  return bubble;
+}
+
+function renderMessages() {
+  const chat = state.chats.get(state.openChat);
+  if (!chat) return;
+  for (const message of chat.messages) {
+    if (state.rendered.has(message.id)) continue;
+    state.rendered.add(message.id);
+    messagesEl.appendChild(renderMessage(message));
+  }
+  messagesEl.scrollTop = messagesEl.scrollHeight;
+}
+
+function openChat(chatId) {
+  const chat = state.chats.get(chatId);
+  if (!chat) return;
+  if (state.openChat !== chatId) {
+    state.openChat = chatId;
+    state.rendered = new Set();
+    messagesEl.textContent = "";
+    title.textContent = chat.name;
+    composer.textContent = "";
+    updateSendIcon();
+  }
+  main.classList.add("open");
+  renderMessages();
+  if (chat.unread) {
+    chat.unread = 0;
+    api("/api/read", { chat_id: chatId });
+  }
+  renderList();
+}
+
+async function applyState(data) {
+  if (!data.chats) return;
+  const images = [];
+  for (const chat of data.chats) {
+    for (const message of chat.messages) {
+      if (message.kind === "image" && message.media) images.push(ensureBlob(message.media));
+    }
+  }
+  await Promise.all(images);
+  state.chats = new Map(data.chats.map((chat) => [chat.id, chat]));
+  renderConnection(data.connection || "connected");
+  state.version = data.version;
+  const open = state.chats.get(state.openChat);
+  if (open && open.unread) {
+    open.unread = 0;
+    api("/api/read", { chat_id: open.id });
+  }
+  renderList();
+  renderMessages();
+}
+
+// --- connection banners ----------------------------------------------------------
+
+function renderConnection(mode) {
+  if (mode === state.connection) return;
+  state.connection = mode;
+  document.querySelectorAll("#connection-banner, #conflict-screen").forEach((node) => node.remove());
+  if (mode === "phone_offline" || mode === "reconnecting") {
+    const phone = mode === "phone_offline";
+    const banner = el("div", { id: "connection-banner" });
+    banner.appendChild(el("span", { "data-icon": phone ? "alert-phone" : "alert-computer" }, "!"));
+    banner.appendChild(el("span", {}, phone ? " Phone not connected" : " Computer not connected"));
+    pane.parentNode.insertBefore(banner, pane);
+  } else if (mode === "conflict") {
+    const dialog = el("div", { className: "overlay", role: "dialog", id: "conflict-screen" },
+      "WhatsApp is open in another window. Click \"Use here\" to use WhatsApp in this window.");
+    const useHere = el("div", { role: "button" }, "Use here");
+    useHere.addEventListener("click", () => api("/api/use_here", {}));
+    dialog.appendChild(useHere);
+    document.body.appendChild(dialog);
+  }
+}
+
+async function poll() {
+  try {
+    await applyState(await api("/api/state?since=" + state.version));
+  } catch (error) {
+    // Server restarts are expected in benchmarks; keep polling.
+  }
+  setTimeout(poll, 200);
+}
+
+// --- media viewer -------------------------------------------------------------
+
+function closeOverlays() {
+  document.querySelectorAll(".overlay, #attach-menu").forEach((node) => node.remove());
+  state.pendingFile = null;
+}
+
+function openViewer(message) {
+  closeOverlays();
+  const viewer = el("div", { className: "overlay", id: "viewer", role: "dialog" });
+  viewer.appendChild(el("img", { src: blobUrls.get(message.media) || "", alt: "" }));
+  const download = el("div", { role: "button", "aria-label": "Download", title: "Download" });
+  download.appendChild(el("span", { "data-icon": "download" }, "⬇"));
+  download.addEventListener("click", () => triggerDownload(message));
+  viewer.appendChild(download);
+  document.body.appendChild(viewer);
+}
+
+document.addEventListener("keydown", (event) => {
+  if (event.key === "Escape") closeOverlays();
+});
+
+// --- composer and attachments ----------------------------------------------------
+
+function updateSendIcon() {
+  sendIcon.hidden = composer.innerText.trim() === "";
+}
+
+function sendComposer() {
+  const text = composer.innerText.replace(/\n+$/, "");
+  if (!state.openChat || !text.trim()) return;
+  api("/api/send", { chat_id: state.openChat, text });
+  composer.textContent = "";
+  updateSendIcon();
+}
+
+composer.addEventListener("keydown", (event) => {
+  if (event.key === "Enter" && !event.shiftKey) {
+    event.preventDefault();
+    sendComposer();
+  }
+});
+composer.addEventListener("input", updateSendIcon);
+sendIcon.addEventListener("click", sendComposer);
+
+document.getElementById("attach").addEventListener("click", () => {
+  closeOverlays();
+  const menu = el("ul", { id: "attach-menu", role: "application" });
+  const photos = el("li", { "aria-label": "Photos & videos" });
+  photos.appendChild(el("span", { "data-icon": "attach-menu-image" }, "Photos & videos"));
+  photos.addEventListener("click", () => document.getElementById("file-input").click());
+  const documents = el("li", { "aria-label": "Document" });
+  documents.appendChild(el("span", { "data-icon": "attach-menu-document" }, "Document"));
+  documents.addEventListener("click", () => document.getElementById("doc-input").click());
+  menu.append(photos, documents);
+  document.body.appendChild(menu);
+});
+
+function showPreview(file) {
+  closeOverlays();
+  state.pendingFile = file;
+  const preview = el("div", { className: "overlay", id: "preview", role: "dialog" });
+  preview.appendChild(el("span", { dir: "auto" }, file.name));
+  const caption = el("div", {
+    contenteditable: "true",
+    role: "textbox",
+    "aria-placeholder": "Add a caption",
+    title: "Add a caption",
+  });
+  const send = el("span", { "data-icon": "send", "aria-label": "Send" }, "➤");
+  send.addEventListener("click", () => {
+    api("/api/send", { chat_id: state.openChat, text: caption.innerText.trim(), filename: file.name });
+    closeOverlays();
+  });
+  preview.append(caption, send);
+  document.body.appendChild(preview);
+}
+
+for (const id of ["file-input", "doc-input"]) {
+  const input = document.getElementById(id);
+  input.addEventListener("change", () => {
+    if (input.files.length) showPreview(input.files[0]);
+    input.value = "";
+  });
+}
+
+// --- deep links ----------------------------------------------------------------
+
+async function boot() {
+  const params = new URLSearchParams(location.search);
+  await applyState(await api("/api/state?since=-1"));
+  if (location.pathname.startsWith("/send")) {
+    const phone = params.get("phone") || "";
+    const result = await api("/api/open?phone=" + encodeURIComponent(phone));
+    if (result.chat_id) {
+      await applyState(await api("/api/state?since=-1"));
+      openChat(result.chat_id);
+      const text = params.get("text") || "";
+      if (text) {
+        composer.textContent = text;
+        updateSendIcon();
+      }
+    } else {
+      const dialog = el("div", { className: "overlay", role: "dialog" }, "Phone number shared via url is invalid.");
+      const ok = el("div", { role: "button" }, "OK");
+      ok.addEventListener("click", () => dialog.remove());
+      dialog.appendChild(ok);
+      document.body.appendChild(dialog);
+    }
+  }
+  setTimeout(poll, 200);
+}
+
+boot();
@@ -0,0 +1,266 @@
+// Replays a recorded WhatsApp Web session: the DOM comes from the recording, and this
+// script adds back the few behaviours the agent drives (opening chats, downloads, the
+// media viewer, the composer and the attach/preview flow) using the same selectors.
+"use strict";
+
+const DOWNLOAD = "[data-icon='download'], [data-icon='ic-download'], [data-icon='down'], [data-icon='arrow-down'], "
+  + "[aria-label='Download'], [aria-label='تنزيل'], [title='Download'], [title='تنزيل']";
+const SEND = "[data-icon='send'], [data-icon='wds-ic-send-filled'], [aria-label='Send']";
+const ATTACH = "[data-icon='plus'], [data-icon='attach-menu-plus'], [data-icon='clip'], "
+  + "[aria-label='Attach'], [aria-label='إرفاق'], [title='Attach'], [title='إرفاق']";
+const ATTACH_ITEMS = "[data-icon^='attach-menu'], [data-icon='attach-image']";
+const UNREAD = "[aria-label*='unread message'], [aria-label*='رسالة غير مقروءة']";
+
+const replay = { step: -1, chat: null, outbound: null, context: "" };
+const side = document.getElementById("replay-side");
+const mainHost = document.getElementById("replay-main");
+const fileInput = document.getElementById("replay-file");
+
+async function api(path, body) {
+  const options = body === undefined ? {} : {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  };
+  const response = await fetch(path, options);
+  return response.json();
+}
+
+function parse(html) {
+  const template = document.createElement("template");
+  template.innerHTML = html || "";
+  return template.content;
+}
+
+// Recorded images were inlined as data URLs; WhatsApp serves blob: URLs, so restore those.
+async function restoreBlobs(fragment) {
+  const images = [...fragment.querySelectorAll("img[data-recorded-blob]")];
+  await Promise.all(images.map(async (img) => {
+    const response = await fetch(img.getAttribute("src"));
+    img.setAttribute("src", URL.createObjectURL(await response.blob()));
+  }));
+  return fragment;
+}
+
+async function renderMain(html) {
+  const fragment = await restoreBlobs(parse(html));
+  mainHost.textContent = "";
+  mainHost.appendChild(fragment);
+}
+
+function closeOverlays() {
+  document.querySelectorAll(".replay-overlay").forEach((node) => node.remove());
+}
+
+function overlay(id) {
+  closeOverlays();
+  const node = document.createElement("div");
+  node.className = "replay-overlay";
+  node.id = id;
+  node.setAttribute("role", "dialog");
+  document.body.appendChild(node);
+  return node;
+}
+
+// Pull a control out of a recorded full-page snapshot, or build a stand-in.
+function recordedControl(bodyHtml, selector, fallback) {
+  const found = parse(bodyHtml).querySelector(selector);
+  if (found) {
+    const control = found.closest("[role='button'], button, li") || found;
+    return document.importNode(control, true);
+  }
+  return fallback();
+}
+
+function triggerDownload() {
+  if (!replay.chat || !replay.chat.message_key) return;
+  const link = document.createElement("a");
+  link.href = "/media/" + encodeURIComponent(replay.chat.message_key);
+  link.download = replay.chat.filename || "download";
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+}
+
+function openViewer(img) {
+  const viewer = overlay("replay-viewer");
+  const copy = document.createElement("img");
+  copy.src = img.src;
+  viewer.appendChild(copy);
+  viewer.appendChild(recordedControl(replay.chat && replay.chat.viewer, DOWNLOAD, () => {
+    const button = document.createElement("div");
+    button.setAttribute("role", "button");
+    button.setAttribute("aria-label", "Download");
+    button.textContent = "Download";
+    return button;
+  }));
+}
+
+function showAttachMenu() {
+  const menu = overlay("replay-attach");
+  const html = replay.outbound && replay.outbound.attach_menu;
+  const recorded = parse(html).querySelector(ATTACH_ITEMS);
+  const container = recorded && (recorded.closest("ul, [role='application'], [role='menu']") || recorded.parentElement);
+  if (container) {
+    menu.appendChild(document.importNode(container, true));
+  } else {
+    const item = document.createElement("li");
+    const icon = document.createElement("span");
+    icon.setAttribute("data-icon", "attach-menu-image");
+    icon.textContent = "Photos & videos";
+    item.appendChild(icon);
+    menu.appendChild(item);
+  }
+}
+
+function showPreview(file) {
+  const preview = overlay("replay-preview");
+  const html = replay.outbound && replay.outbound.preview;
+  const name = document.createElement("span");
+  name.textContent = file.name;
+  preview.appendChild(name);
+  preview.appendChild(recordedControl(html, "[contenteditable='true'][aria-placeholder], [contenteditable='true'][title]", () => {
+    const caption = document.createElement("div");
+    caption.setAttribute("contenteditable", "true");
+    caption.setAttribute("aria-placeholder", "Add a caption");
+    return caption;
+  }));
+  const send = recordedControl(html, SEND, () => {
+    const icon = document.createElement("span");
+    icon.setAttribute("data-icon", "send");
+    icon.textContent = "➤";
+    return icon;
+  });
+  send.setAttribute("data-replay-send-file", file.name);
+  preview.appendChild(send);
+}
+
+function composerText() {
+  const composer = mainHost.querySelector("footer [contenteditable='true']");
+  return composer ? composer.innerText.trim() : "";
+}
+
+function sendText() {
+  const composer = mainHost.querySelector("footer [contenteditable='true']");
+  const text = composerText();
+  if (!text) return;
+  api("/api/send", { context: replay.context, text });
+  composer.textContent = "";
+}
+
+async function openRow(row) {
+  row.querySelectorAll(UNREAD).forEach((badge) => badge.remove());
+  const titleNode = row.querySelector("span[title]");
+  const result = await api("/api/replay/open", {
+    row_id: row.getAttribute("data-id") || "",
+    title: titleNode ? titleNode.getAttribute("title") : row.innerText.split("\n")[0],
+  });
+  replay.chat = result;
+  replay.context = result.message_key || "";
+  closeOverlays();
+  await renderMain(result.main);
+}
+
+document.addEventListener("click", (event) => {
+  const target = event.target;
+  const previewSend = target.closest("[data-replay-send-file]");
+  if (previewSend) {
+    const caption = document.querySelector("#replay-preview [contenteditable='true']");
+    api("/api/send", {
+      context: replay.context,
+      text: caption ? caption.innerText.trim() : "",
+      filename: previewSend.getAttribute("data-replay-send-file"),
+    });
+    closeOverlays();
+    return;
+  }
+  if (target.closest("#replay-attach")) {
+    fileInput.click();
+    return;
+  }
+  const row = target.closest("#pane-side [role='listitem']");
+  if (row) {
+    openRow(row);
+    return;
+  }
+  if (target.closest(DOWNLOAD) && (target.closest("#main") || target.closest("#replay-viewer"))) {
+    triggerDownload();
+    return;
+  }
+  const img = target.closest("#main img");
+  if (img && img.src.startsWith("blob:")) {
+    openViewer(img);
+    return;
+  }
+  if (target.closest("#main footer") && target.closest(SEND)) {
+    sendText();
+    return;
+  }
+  if (target.closest("#main") && target.closest(ATTACH)) {
+    showAttachMenu();
+  }
+}, true);
+
+document.addEventListener("keydown", (event) => {
+  if (event.key === "Escape") {
+    closeOverlays();
+    return;
+  }
+  const composer = event.target.closest && event.target.closest("#main footer [contenteditable='true']");
+  if (composer && event.key === "Enter" && !event.shiftKey) {
+    event.preventDefault();
+    sendText();
+  }
+}, true);
+
+fileInput.addEventListener("change", () => {
+  if (fileInput.files.length) showPreview(fileInput.files[0]);
+  fileInput.value = "";
+});
+
+async function applyHead() {
+  const head = await api("/api/replay/head");
+  if (head.dir) document.documentElement.dir = head.dir;
+  if (head.lang) document.documentElement.lang = head.lang;
+  for (const href of head.stylesheets || []) {
+    const link = document.createElement("link");
+    link.rel = "stylesheet";
+    link.href = href;
+    document.head.prepend(link);
+  }
+  for (const css of head.styles || []) {
+    const style = document.createElement("style");
+    style.textContent = css;
+    document.head.prepend(style);
+  }
+}
+
+async function poll() {
+  try {
+    const state = await api("/api/replay/state?since=" + replay.step);
+    if (state.pane_side !== undefined && state.step !== replay.step) {
+      replay.step = state.step;
+      side.textContent = "";
+      side.appendChild(parse(state.pane_side));
+    }
+  } catch (error) {
+    // keep polling
+  }
+  setTimeout(poll, 250);
+}
+
+async function boot() {
+  await applyHead();
+  await poll();
+  if (location.pathname.startsWith("/send")) {
+    const params = new URLSearchParams(location.search);
+    const outbound = await api("/api/replay/outbound?phone=" + encodeURIComponent(params.get("phone") || ""));
+    replay.outbound = outbound;
+    replay.context = outbound.context || "";
+    await renderMain(outbound.main);
+    const composer = mainHost.querySelector("footer [contenteditable='true']");
+    if (composer) composer.textContent = params.get("text") || "";
+  }
+}
+
+boot();
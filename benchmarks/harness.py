@@ -0,0 +1,191 @@
+"""Shared pieces for running the real WhatsApp agent against the offline fixtures."""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import host_stubs  # noqa: E402
+
+host_stubs.install()
+
+
+class _BenchSettings(dict):
+    def value(self, key, default=None, type=None):
+        value = self.get(key, default)
+        if type is not None and value is not None:
+            return type(value)
+        return value
+
+
+class _BenchProcessing:
+    """Stands in for the host processing queue; records when each file arrives."""
+
+    def __init__(self, plugin, processing_delay: float):
+        self.plugin = plugin
+        self.processing_delay = processing_delay
+        self.imported = []
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def import_file_to_queue(self, file_path, source, metadata=None):
+        entry = {
+            "at": self.plugin.now(),
+            "file_path": file_path,
+            "size": os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+            "metadata": dict(metadata or {}),
+        }
+        with self._lock:
+            self.imported.append(entry)
+        if self.processing_delay >= 0:
+            # Emulate the host pipeline finishing later and firing a source-processing event.
+            client = self.plugin.wa_client
+            asyncio.run_coroutine_threadsafe(self._complete_later(entry), client.loop)
+        return True
+
+    def drain(self) -> list:
+        """Hand over and forget the entries recorded so far (long-running callers)."""
+        with self._lock:
+            entries, self.imported = self.imported, []
+            return entries
+
+    def imported_keys(self) -> list:
+        with self._lock:
+            return [entry["metadata"].get("whatsapp_message_key") or "" for entry in self.imported]
+
+    async def _complete_later(self, entry):
+        await self.plugin.wa_client.clock.sleep(self.processing_delay)
+        self.completed += 1
+        payload = {
+            "invoice_number": f"BENCH-{self.completed}",
+            "vendor_name": "Benchmark Vendor",
+            "invoice_total": 115.0,
+            "currency": "SAR",
+        }
+        self.plugin.wa_client.notify_processing_result(payload, entry["metadata"])
+
+
+class _BenchApi:
+    def __init__(self, plugin, processing_delay: float):
+        self.processing = _BenchProcessing(plugin, processing_delay)
+
+
+class BenchPlugin:
+    """Just the plugin surface ``WhatsAppClient`` touches."""
+
+    def __init__(self, settings: dict | None = None, processing_delay: float = 3.0):
+        self.settings = _BenchSettings(settings or {})
+        self.api = _BenchApi(self, processing_delay)
+        self.status_history = []
+        self.wa_client = None
+
+    def get_setting(self, key: str, default_val=None, type=None):
+        return self.settings.value(key, default_val, type=type)
+
+    def now(self) -> float:
+        return self.wa_client.clock.time() if self.wa_client else time.time()
+
+    def update_status(self, message: str):
+        self.status_history.append((time.time(), message))
+
+
+class AgentRun:
+    """
+    Run ``WhatsAppClient`` on its own thread against a fixture URL, like the plugin does.
+
+    ``virtual_time`` > 0 swaps in a ``VirtualClock`` with that speed factor, so the
+    agent's sleeps, retries and poll cadence run on fast-forwarded virtual time.
+    """
+
+    def __init__(self, web_url: str, settings: dict | None = None, processing_delay: float = -1,
+                 workdir: str = "", login_timeout: float = 90.0, har_replay_path: str = "",
+                 virtual_time: float = 0):
+        from plugins.whatsapp_automation_agent.whatsapp_client import WhatsAppClient
+        from plugins.whatsapp_automation_agent.clock import VirtualClock
+
+        self.workdir = Path(workdir or tempfile.mkdtemp(prefix="wa_bench_"))
+        self.plugin = BenchPlugin(settings={"bot_mode": False, **(settings or {})}, processing_delay=processing_delay)
+        self.client = WhatsAppClient(self.plugin)
+        self.plugin.wa_client = self.client
+        self.client.web_url = web_url
+        self.client.user_data_dir = str(self.workdir / "session")
+        self.client.downloads_dir = str(self.workdir / "downloads")
+        self.client.har_replay_path = har_replay_path
+        if virtual_time > 0:
+            self.client.clock = VirtualClock(speed=virtual_time)
+        self.login_timeout = login_timeout
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.client.run, name="WhatsAppAgent", daemon=True)
+        self._thread.start()
+        deadline = time.time() + self.login_timeout
+        while not self.client.is_logged_in:
+            if time.time() > deadline or not self._thread.is_alive():
+                self.close()
+                raise RuntimeError(f"Agent did not reach the chat list: {self.plugin.status_history[-3:]}")
+            time.sleep(0.2)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.client.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=15)
+
+    @property
+    def clock(self):
+        return self.client.clock
+
+    def call(self, coro, timeout: float = 120.0):
+        """Run a coroutine on the agent loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.client.loop).result(timeout=timeout)
+
+    def wait_clock(self, seconds: float, real_deadline: float | None = None):
+        """Block until the agent's clock (real or virtual) has advanced by ``seconds``."""
+        target = self.clock.time() + seconds
+        while self.clock.time() < target:
+            if real_deadline is not None and time.time() > real_deadline:
+                return
+            time.sleep(0.02)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.50), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def stage_latencies(client) -> dict:
+    """The agent's own histograms, flattened to ``name[label=value]`` keys."""
+    stages = {}
+    for item in client.metrics_snapshot().get("histograms", []):
+        label = item["name"] + "".join(f"[{k}={v}]" for k, v in sorted(item["labels"].items()))
+        stages[label] = {"count": item["count"], "p50": item["p50"], "p95": item["p95"], "max": item["max"]}
+    return stages
+
+
+def print_stages(stages: dict):
+    print("Stage latencies (seconds):")
+    for label, s in sorted(stages.items()):
+        print(f"  {label:<58} n={s['count']:<4} p50={s['p50']:>7.3f}  p95={s['p95']:>7.3f}  max={s['max']:>7.3f}")
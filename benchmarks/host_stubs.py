@@ -0,0 +1,70 @@
+"""
+Minimal stand-ins for the host application's ``core.plugins`` API.
+
+Benchmarks import plugin modules outside Invoices Reader; this registers just enough
+of the SDK surface (logger, decorators, base class) for those imports to succeed.
+Real host modules are used whenever they are importable.
+"""
+import logging
+import sys
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _passthrough_decorator(*args, **kwargs):
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda func: func
+
+
+class DeclarativePlugin:
+    id = ""
+    name = ""
+    version = "0.0.0"
+
+    def __init__(self):
+        self.api = None
+
+
+def get_logger(name: str):
+    return logging.getLogger(name)
+
+
+def install():
+    """Make ``core.plugins``, the repo's ``plugins`` package and their ``libs`` importable."""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    # The host's plugin loader puts each plugin's bundled ``libs`` on the path; installed
+    # packages still win because these go last.
+    for libs in sorted((REPO_ROOT / "plugins").glob("*/libs")):
+        if str(libs) not in sys.path:
+            sys.path.append(str(libs))
+
+    try:
+        import core.plugins.sdk  # noqa: F401  (running inside the host app)
+        return
+    except ImportError:
+        pass
+
+    core = types.ModuleType("core")
+    core.__path__ = []
+    plugins = types.ModuleType("core.plugins")
+    plugins.__path__ = []
+    sdk = types.ModuleType("core.plugins.sdk")
+
+    sdk.get_logger = get_logger
+    sdk.DeclarativePlugin = DeclarativePlugin
+    sdk.Action = _passthrough_decorator
+    sdk.Field = lambda *args, **kwargs: None
+    sdk.hook = _passthrough_decorator
+
+    for attr in ("get_logger", "DeclarativePlugin", "Action", "Field", "hook"):
+        setattr(plugins, attr, getattr(sdk, attr))
+    plugins.sdk = sdk
+    core.plugins = plugins
+
+    sys.modules["core"] = core
+    sys.modules["core.plugins"] = plugins
+    sys.modules["core.plugins.sdk"] = sdk
@@ -0,0 +1,119 @@
+"""
+Replay a recorded WhatsApp Web session against the real agent, offline.
+
+Recordings come from the agent's Session Recorder (``diagnostics/recordings/<stamp>/``).
+The chat list, open chats and overlays are served from the recorded DOM, WhatsApp-hosted
+assets from the recorded HAR, and downloads from the recorded media copies. The run
+passes when every message whose file was downloaded during recording is imported
+again, and every recorded outbound send completes.
+
+    python benchmarks/replay_session.py ~/.local/share/InvoicesReader/whatsapp_agent/diagnostics/recordings/20250101_120000
+    python benchmarks/replay_session.py <recording> --no-har --json replay.json
+
+Requires ``playwright`` and its Chromium build; no network access is needed.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from harness import AgentRun, stage_latencies, print_stages
+from fake_whatsapp.replay import ReplayServer
+from fake_whatsapp.server import make_pdf_bytes
+
+
+def run_replay(args) -> dict:
+    server = ReplayServer(args.recording, port=args.port).start()
+    replay = server.state
+    expected = replay.expected_keys()
+    print(f"Replaying {len(replay.sweeps)} sweeps, {len(expected)} media messages, "
+          f"{len(replay.outbound)} outbound sends from {args.recording}")
+
+    started_at = time.time()
+    outbound_results = []
+    try:
+        with AgentRun(server.url, workdir=args.workdir, login_timeout=args.login_timeout,
+                      har_replay_path=replay.har_path if args.har else "") as run:
+            deadline = started_at + args.timeout
+            while time.time() < deadline:
+                imported = set(run.plugin.api.processing.imported_keys())
+                if replay.done and all(key in imported for key in expected):
+                    break
+                time.sleep(0.5)
+
+            if replay.outbound:
+                attachment = os.path.join(str(run.workdir), "replay_invoice.pdf")
+                with open(attachment, "wb") as f:
+                    f.write(make_pdf_bytes("REPLAY"))
+                for outbound in list(replay.outbound):
+                    sent_before = len(replay.outgoing)
+                    ok, message = run.call(
+                        run.client.send_invoice_async(outbound["phone"] or "0", "Replay send", attachment),
+                        timeout=args.timeout,
+                    )
+                    delivered = any(out["filename"] for out in replay.outgoing[sent_before:])
+                    outbound_results.append({"phone": outbound["phone"], "ok": ok, "delivered": delivered, "message": message})
+
+            imported = run.plugin.api.processing.imported_keys()
+            stages = stage_latencies(run.client)
+    finally:
+        server.stop()
+
+    missing = [key for key in expected if key not in imported]
+    return {
+        "recording": args.recording,
+        "sweeps": len(replay.sweeps),
+        "sweeps_completed": min(replay.step, len(replay.sweeps)),
+        "expected": len(expected),
+        "ingested": len(expected) - len(missing),
+        "missing": missing,
+        "unexpected": [key for key in imported if key not in expected],
+        "unmatched_opens": replay.unmatched_opens,
+        "replies": [out["text"] for out in replay.outgoing if out["text"]],
+        "outbound": outbound_results,
+        "elapsed_seconds": round(time.time() - started_at, 2),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded WhatsApp Web session against the agent.")
+    parser.add_argument("recording", help="recording directory (contains snapshots.jsonl)")
+    parser.add_argument("--no-har", dest="har", action="store_false", help="do not serve assets from network.har")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--login-timeout", type=float, default=90.0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--workdir", default="", help="directory for the browser profile and downloads")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show agent logs")
+    args = parser.parse_args()
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="wa_replay_")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    report = run_replay(args)
+    print(f"Sweeps: {report['sweeps_completed']}/{report['sweeps']}  "
+          f"ingested: {report['ingested']}/{report['expected']}  replies: {len(report['replies'])}")
+    for key in report["missing"]:
+        print(f"  MISSING {key}")
+    for item in report["unmatched_opens"]:
+        print(f"  unmatched chat open at sweep {item['step']}: {item['row_id'] or item['title']}")
+    for item in report["outbound"]:
+        state = "ok" if item["ok"] and item["delivered"] else "FAILED"
+        print(f"  outbound {item['phone']}: {state} ({item['message']})")
+    print_stages(report["stages"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    failed = report["missing"] or any(not (o["ok"] and o["delivered"]) for o in report["outbound"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
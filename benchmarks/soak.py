@@ -0,0 +1,422 @@
+"""
+Soak test: run the real WhatsApp agent for hours against the fake WhatsApp Web and
+watch for slow leaks and creeping latency.
+
+A steady stream of messages (``--rate`` per minute) is injected while a sampler records,
+every ``--sample-interval`` seconds:
+
+- Python process RSS and tracemalloc traced memory, with the top growing allocation sites
+- asyncio task and thread counts on the agent
+- total RSS of the Chromium processes Playwright started
+- intake latency and each agent stage's p95 within the sample window
+
+The report fits a least-squares trend line to every series after ``--warmup`` and gives
+a verdict per series: ``LEAK``/``CREEP`` when the slope exceeds its per-hour threshold and
+the fit is consistent (r^2), ``stable`` otherwise.
+
+    python benchmarks/soak.py --hours 4 --rate 6 --json soak.json --csv soak.csv
+    python benchmarks/soak.py --hours 0.25 --rate 30 --sample-interval 15   # quick check
+
+Requires ``playwright`` and its Chromium build. ``psutil`` is used for process memory
+when installed; otherwise ``/proc`` is read (Linux only).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import linecache
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from harness import AgentRun, percentile
+from fake_whatsapp.server import FakeWhatsAppServer, MessageGenerator
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CHROMIUM_NAMES = ("chrome", "chromium", "headless_shell")
+# Per-hour slopes above which a series is flagged (units as in the sample).
+DEFAULT_THRESHOLDS = {
+    "python_rss_mb": 8.0,
+    "traced_mb": 4.0,
+    "chromium_rss_mb": 40.0,
+    "asyncio_tasks": 2.0,
+    "threads": 1.0,
+    "intake_p95": 0.5,
+}
+CONSISTENT_FIT_R2 = 0.5
+
+
+def _proc_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _proc_children(root: int) -> list:
+    """Descendant pids of ``root`` from /proc (used when psutil is missing)."""
+    parents = {}
+    for name in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r", encoding="utf-8") as f:
+                # The command name may contain spaces; fields resume after its ')'.
+                parents[int(name)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    found, frontier = [], [root]
+    while frontier:
+        parent = frontier.pop()
+        children = [pid for pid, ppid in parents.items() if ppid == parent]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def _proc_name(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/comm", "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def python_rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1048576
+    return _proc_rss_kb(os.getpid()) / 1024
+
+
+def chromium_rss_mb() -> tuple:
+    """``(total RSS in MB, process count)`` of Chromium processes under this one."""
+    if psutil is not None:
+        total, count = 0, 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                if any(name in child.name().lower() for name in CHROMIUM_NAMES):
+                    total += child.memory_info().rss
+                    count += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total / 1048576, count
+    pids = [pid for pid in _proc_children(os.getpid())
+            if any(name in _proc_name(pid).lower() for name in CHROMIUM_NAMES)]
+    return sum(_proc_rss_kb(pid) for pid in pids) / 1024, len(pids)
+
+
+def trend(xs: list, ys: list) -> dict:
+    """Least-squares line through the points: slope per x-unit, intercept and r^2."""
+    n = len(xs)
+    if n < 3:
+        return {"slope": 0.0, "intercept": ys[0] if ys else 0.0, "r2": 0.0, "points": n}
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    slope = sxy / sxx if sxx else 0.0
+    r2 = (sxy * sxy) / (sxx * syy) if sxx and syy else 0.0
+    return {"slope": slope, "intercept": mean_y - slope * mean_x, "r2": r2, "points": n}
+
+
+def sparkline(values: list, width: int = 40) -> str:
+    values = [v for v in values if v is not None]
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [values[int(i * step)] for i in range(width)]
+    low, high = min(values), max(values)
+    bars = "▁▂▃▄▅▆▇█"
+    span = (high - low) or 1.0
+    return "".join(bars[min(len(bars) - 1, int((v - low) / span * (len(bars) - 1)))] for v in values)
+
+
+class SoakSampler:
+    """Collects one resource/latency sample per call to ``sample``."""
+
+    def __init__(self, run: AgentRun, server, top_allocators: int = 10, miss_after: float = 600.0):
+        self.run = run
+        self.server = server
+        self.top_allocators = top_allocators
+        self.miss_after = miss_after
+        self.samples = []
+        self.started_at = time.time()
+        self.baseline_snapshot = None
+        self.top_growth = []
+        self.ingested = 0
+        self.missed = 0
+        self._pending = {}        # message id -> injection time, awaiting intake
+        self._seen_injected = set()
+        self._last_histograms = {}
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def mark_baseline(self):
+        """Reference point for allocation growth, taken once the agent is warmed up."""
+        self.baseline_snapshot = self._snapshot()
+
+    def _task_count(self) -> int:
+        async def count():
+            return len(asyncio.all_tasks())
+
+        try:
+            return self.run.call(count(), timeout=10)
+        except Exception:
+            return -1
+
+    def _intake_window(self) -> list:
+        """Intake latencies of files imported since the last sample."""
+        state = self.server.state
+        expected_kinds = ("document", "image")
+        for message_id, record in list(state.injected.items()):
+            if message_id not in self._seen_injected and record["kind"] in expected_kinds:
+                self._seen_injected.add(message_id)
+                self._pending[message_id] = record["at"]
+        latencies = []
+        for entry in self.run.plugin.api.processing.drain():
+            key = entry["metadata"].get("whatsapp_message_key") or ""
+            injected_at = self._pending.pop(key.rsplit("_", 1)[-1], None)
+            if injected_at is not None:
+                latencies.append(entry["at"] - injected_at)
+        self.ingested += len(latencies)
+
+        cutoff = time.time() - self.miss_after
+        overdue = [mid for mid, at in self._pending.items() if at < cutoff]
+        for message_id in overdue:
+            del self._pending[message_id]
+        self.missed += len(overdue)
+        # Keep the fixture's own memory flat so it does not read as an agent leak.
+        state.prune(before=cutoff)
+        self._seen_injected &= set(state.injected)
+        return latencies
+
+    def _stage_window(self) -> dict:
+        """p95 of each agent histogram over just this window (bucket-count deltas)."""
+        from plugins.whatsapp_automation_agent.metrics import Histogram
+
+        stages = {}
+        for item in self.run.client.metrics_snapshot().get("histograms", []):
+            label = item["name"] + "".join(f"[{k}={v}]" for k, v in sorted(item["labels"].items()))
+            previous = self._last_histograms.get(label)
+            counts = item["bucket_counts"]
+            delta = [c - p for c, p in zip(counts, previous)] if previous else list(counts)
+            self._last_histograms[label] = counts
+            if sum(delta) == 0:
+                continue
+            histogram = Histogram(item["name"], (), buckets=item["buckets"])
+            histogram.max = item["max"]
+            stages[label] = round(histogram.percentile(0.95, delta), 4)
+        return stages
+
+    def sample(self) -> dict:
+        traced, _ = tracemalloc.get_traced_memory()
+        chromium_mb, chromium_procs = chromium_rss_mb()
+        latencies = self._intake_window()
+        record = {
+            "elapsed_hours": round((time.time() - self.started_at) / 3600, 4),
+            "python_rss_mb": round(python_rss_mb(), 2),
+            "traced_mb": round(traced / 1048576, 2),
+            "chromium_rss_mb": round(chromium_mb, 2),
+            "chromium_processes": chromium_procs,
+            "asyncio_tasks": self._task_count(),
+            "threads": threading.active_count(),
+            "window_ingested": len(latencies),
+            "intake_p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "intake_p95": round(percentile(latencies, 0.95), 3) if latencies else None,
+            "pending": len(self._pending),
+            "stages_p95": self._stage_window(),
+        }
+        if self.baseline_snapshot is not None:
+            growth = self._snapshot().compare_to(self.baseline_snapshot, "lineno")
+            self.top_growth = [
+                {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_kb": round(stat.size / 1024, 1), "growth_kb": round(stat.size_diff / 1024, 1),
+                 "count_growth": stat.count_diff}
+                for stat in growth[:self.top_allocators] if stat.size_diff > 0
+            ]
+            record["top_growth"] = self.top_growth[:3]
+        self.samples.append(record)
+        return record
+
+
+def verdicts(samples: list, warmup_hours: float, thresholds: dict) -> dict:
+    """Trend line and verdict for every tracked series, ignoring the warm-up samples."""
+    steady = [s for s in samples if s["elapsed_hours"] >= warmup_hours] or samples
+    result = {}
+    for name, threshold in thresholds.items():
+        points = [(s["elapsed_hours"], s[name]) for s in steady if s.get(name) is not None and s[name] >= 0]
+        fit = trend([p[0] for p in points], [p[1] for p in points])
+        growing = fit["slope"] > threshold and fit["r2"] >= CONSISTENT_FIT_R2
+        kind = "CREEP" if name.startswith("intake") else "LEAK"
+        result[name] = {
+            "slope_per_hour": round(fit["slope"], 4),
+            "r2": round(fit["r2"], 3),
+            "threshold_per_hour": threshold,
+            "first": points[0][1] if points else None,
+            "last": points[-1][1] if points else None,
+            "verdict": kind if growing else ("insufficient data" if fit["points"] < 3 else "stable"),
+        }
+
+    # Stages are judged on their own p95 windows, relative to where they started.
+    stage_names = sorted({name for s in steady for name in s["stages_p95"]})
+    stages = {}
+    for name in stage_names:
+        points = [(s["elapsed_hours"], s["stages_p95"][name]) for s in steady if name in s["stages_p95"]]
+        fit = trend([p[0] for p in points], [p[1] for p in points])
+        base = max(points[0][1], 1e-3) if points else 1e-3
+        creeping = fit["slope"] / base > 0.25 and fit["r2"] >= CONSISTENT_FIT_R2
+        stages[name] = {
+            "slope_per_hour": round(fit["slope"], 4),
+            "r2": round(fit["r2"], 3),
+            "verdict": "CREEP" if creeping else ("insufficient data" if fit["points"] < 3 else "stable"),
+        }
+    result["stages"] = stages
+    return result
+
+
+def run_soak(args) -> dict:
+    hours = args.hours
+    chats = max(1, args.chats)
+    total_messages = math.ceil(args.rate * hours * 60)
+    server = FakeWhatsAppServer(port=args.port).start()
+    generator = MessageGenerator(
+        server.state,
+        chats=chats,
+        messages_per_chat=math.ceil(total_messages / chats),
+        interval=60.0 / max(args.rate, 1e-6),
+        mix=args.mix,
+        seed=args.seed,
+    )
+    generator.prepare()
+    tracemalloc.start(args.trace_frames)
+
+    try:
+        with AgentRun(server.url, processing_delay=args.processing_delay, workdir=args.workdir,
+                      login_timeout=args.login_timeout) as run:
+            sampler = SoakSampler(run, server, top_allocators=args.top, miss_after=args.miss_after)
+            print(f"Soak: {hours}h at {args.rate} msg/min over {chats} chats, sampling every {args.sample_interval}s")
+            generator.start()
+            end_at = sampler.started_at + hours * 3600
+            next_sample = time.time()
+            while time.time() < end_at:
+                if time.time() >= next_sample:
+                    if sampler.baseline_snapshot is None and \
+                            time.time() - sampler.started_at >= args.warmup * 3600:
+                        sampler.mark_baseline()
+                    s = sampler.sample()
+                    print(f"[{s['elapsed_hours']:6.2f}h] rss={s['python_rss_mb']:.1f}MB traced={s['traced_mb']:.1f}MB "
+                          f"chromium={s['chromium_rss_mb']:.0f}MB/{s['chromium_processes']}p tasks={s['asyncio_tasks']} "
+                          f"intake_p95={s['intake_p95']} pending={s['pending']}", flush=True)
+                    next_sample += args.sample_interval
+                time.sleep(min(1.0, max(0.0, next_sample - time.time())))
+            generator.stop()
+            sampler.sample()
+    finally:
+        generator.stop()
+        server.stop()
+        tracemalloc.stop()
+
+    return {
+        "config": {"hours": hours, "rate_per_minute": args.rate, "chats": chats,
+                   "sample_interval": args.sample_interval, "warmup_hours": args.warmup,
+                   "psutil": psutil is not None},
+        "injected": len(generator.sent),
+        "ingested": sampler.ingested,
+        "missed": sampler.missed,
+        "verdicts": verdicts(sampler.samples, args.warmup, DEFAULT_THRESHOLDS),
+        "top_growth": sampler.top_growth,
+        "samples": sampler.samples,
+    }
+
+
+def print_report(report: dict):
+    print(f"\nInjected {report['injected']}  ingested {report['ingested']}  missed {report['missed']}")
+    print(f"{'series':<18} {'trend':<42} {'first':>9} {'last':>9} {'slope/h':>10} {'r2':>6}  verdict")
+    for name, v in report["verdicts"].items():
+        if name == "stages":
+            continue
+        line = sparkline([s.get(name) for s in report["samples"] if (s.get(name) or 0) >= 0])
+        first = "-" if v["first"] is None else f"{v['first']:.2f}"
+        last = "-" if v["last"] is None else f"{v['last']:.2f}"
+        print(f"{name:<18} {line:<42} {first:>9} {last:>9} {v['slope_per_hour']:>+10.3f} {v['r2']:>6.2f}  {v['verdict']}")
+    print("Stage p95 trends:")
+    for name, v in report["verdicts"]["stages"].items():
+        line = sparkline([s["stages_p95"].get(name) for s in report["samples"]])
+        print(f"  {name:<56} {line:<42} {v['slope_per_hour']:>+8.3f}s/h  {v['verdict']}")
+    if report["top_growth"]:
+        print("Top growing allocation sites since warm-up:")
+        for item in report["top_growth"]:
+            print(f"  {item['growth_kb']:>+10.1f} KB  {item['count_growth']:>+7} blocks  {item['where']}")
+
+
+def write_csv(path: str, samples: list):
+    fields = [key for key in samples[0] if key not in ("stages_p95", "top_growth")] if samples else []
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(samples)
+
+
+def main():
+    from bench_intake import parse_mix
+
+    parser = argparse.ArgumentParser(description="Multi-hour soak of the WhatsApp agent against a fake WhatsApp Web.")
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--rate", type=float, default=6.0, help="incoming messages per minute")
+    parser.add_argument("--chats", type=int, default=8, help="number of sender chats")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("document:3,image:1,text:1"))
+    parser.add_argument("--processing-delay", type=float, default=3.0)
+    parser.add_argument("--sample-interval", type=float, default=60.0, help="seconds between samples")
+    parser.add_argument("--warmup", type=float, default=0.25, help="hours excluded from trends")
+    parser.add_argument("--miss-after", type=float, default=600.0,
+                        help="seconds after which a file message not yet imported counts as missed")
+    parser.add_argument("--trace-frames", type=int, default=1, help="tracemalloc frames per allocation")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to report")
+    parser.add_argument("--login-timeout", type=float, default=90.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--workdir", default="", help="directory for the browser profile and downloads")
+    parser.add_argument("--json", help="write the full report to this file")
+    parser.add_argument("--csv", help="write the samples to this file")
+    parser.add_argument("--verbose", action="store_true", help="show agent logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    report = run_soak(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    if args.csv:
+        write_csv(args.csv, report["samples"])
+        print(f"Samples written to {args.csv}")
+
+    flagged = [name for name, v in report["verdicts"].items() if name != "stages" and v["verdict"] in ("LEAK", "CREEP")]
+    flagged += [name for name, v in report["verdicts"]["stages"].items() if v["verdict"] == "CREEP"]
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
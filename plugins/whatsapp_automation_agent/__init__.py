@@ -1,8 +1,11 @@
 from core.plugins import DeclarativePlugin, Action, Field, hook
 from core.plugins.sdk import get_logger
 import threading
+import concurrent.futures
 import os
 from .whatsapp_client import WhatsAppClient
+from .worker import AgentProcess
+from .status_server import AgentStatusServer, DEFAULT_STATUS_PORT
 
 logger = get_logger(__name__)
 
@@ -24,6 +27,7 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
         self.settings = QSettings("InvoicesReader", "Plugin_WhatsAppAgent")
         self.wa_client = WhatsAppClient(self)
         self.agent_thread = None
+        self.status_server = None
         self._status_message = "Waiting for agent to start..."
 
     def get_setting(self, key: str, default_val=None, type=None):
@@ -35,6 +39,8 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
     def set_setting(self, key: str, value):
         """Helper to set a setting using QSettings"""
         self.settings.setValue(key, value)
+        if isinstance(self.wa_client, AgentProcess):
+            self.wa_client.update_setting(key, value)
 
     def on_load(self):
         """Called after framework initializes the plugin (API is available)."""
@@ -50,6 +56,9 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
         except Exception as e:
             logger.error(f"Failed to register WhatsApp settings tab: {e}")
         
+        if self.get_setting('status_server_enabled', False, type=bool):
+            self.start_status_server()
+
         auto_start_val = self.get_setting('auto_start', False, type=bool)
         if auto_start_val:
             self.start_agent()
@@ -59,7 +68,9 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
         if str(source).lower() != 'whatsapp':
             return
 
-        if not self.wa_client or not self.wa_client.is_running:
+        # Still delivered in warm standby: the client settles its intake and download
+        # bookkeeping, and only skips the chat reply while it is not running.
+        if not self.wa_client or self.wa_client.stopped:
             return
 
         normalized_status = str(status or "").lower()
@@ -88,25 +99,161 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
             self.api.ui.toast("WhatsApp Agent is already running.", "warning")
             return
             
-        self.api.ui.toast("Starting WhatsApp Agent...", "info")
+        resuming = self.wa_client.standby
+        self.api.ui.toast("Resuming WhatsApp Agent..." if resuming else "Starting WhatsApp Agent...", "info")
+        self.start_agent_async()
+
+    def start_agent_async(self) -> concurrent.futures.Future:
+        """
+        Start the agent, or resume it from warm standby, without blocking.
+
+        The returned future resolves once WhatsApp is logged in and polling; it fails if
+        the agent stops first. A start while a stop is still tearing down runs after it.
+        """
+        client = self.wa_client
+        if client.is_running:
+            return client.when_ready()
+        started = concurrent.futures.Future()
+
+        def _start_after_stop(_):
+            self._launch_agent().add_done_callback(lambda f: _copy_future(f, started))
+
+        def _after_resume(resumed):
+            if resumed.result():
+                client.when_ready().add_done_callback(lambda f: _copy_future(f, started))
+            elif self.agent_thread is not None and self.agent_thread.is_alive() and not client.stopped:
+                client.when_stopped().add_done_callback(_start_after_stop)
+            else:
+                _start_after_stop(None)
+
+        # A worker answers the resume over its pipe; chain on it rather than wait for it here.
+        client.resume_async().add_done_callback(_after_resume)
+        return started
+
+    def _launch_agent(self) -> concurrent.futures.Future:
+        self._select_client()
         self._status_message = "Starting browser..."
-        
+        self.wa_client.startup.begin()
+        self.wa_client.stopped = False  # so that when_ready waits for the new thread
+        ready = self.wa_client.when_ready()
         self.agent_thread = threading.Thread(target=self.wa_client.run, daemon=True)
         self.agent_thread.start()
+        return ready
+
+    def _select_client(self):
+        """In-process client or a worker process, per ``agent_process``; only switched while stopped."""
+        want_process = self.get_setting('agent_process', False, type=bool)
+        if want_process:
+            supported, why = AgentProcess.supported()
+            if not supported:
+                logger.warning(f"[WA] Agent worker process {why}; running the agent in-process.")
+                want_process = False
+        if want_process != isinstance(self.wa_client, AgentProcess):
+            # Dedup and routing state start empty either way: the previous client is fully stopped.
+            self.wa_client = AgentProcess(self) if want_process else WhatsAppClient(self)
 
     @Action(label="Stop Agent", location="settings", icon="fa5s.stop-circle")
     def stop_agent(self, *args):
-        """Stop the agent and close the browser."""
-        if not self.wa_client.is_running:
+        """Stop the agent (or park it in warm standby) without waiting on the UI thread."""
+        client = self.wa_client
+        if not client.is_running and not client.standby:
             return
             
         self.api.ui.toast("Stopping WhatsApp Agent...", "info")
-        self.wa_client.stop()
-        if self.agent_thread:
-            self.agent_thread.join(timeout=5)
-            
-        self._status_message = "Agent stopped."
-        self.api.ui.toast("WhatsApp Agent stopped.", "success")
+        self.stop_agent_async().add_done_callback(self._on_agent_stopped)
+
+    def stop_agent_async(self, standby: bool | None = None) -> concurrent.futures.Future:
+        """
+        Stop the agent without blocking; the future resolves with "stopped" or "standby".
+
+        ``standby`` (default: the ``warm_standby`` setting) keeps the Playwright driver and
+        the logged-in page up so the next start resumes in about a second. Stopping an
+        agent that is already in standby shuts it down completely.
+        """
+        client = self.wa_client
+        if standby is None:
+            standby = self.get_setting('warm_standby', False, type=bool)
+        if not standby:
+            stopped = client.when_stopped()
+            client.stop()
+            return stopped
+        outcome = concurrent.futures.Future()
+
+        def _after_standby(entered):
+            if entered.result():
+                stopped = client.when_stopped(standby=True)
+            else:
+                stopped = client.when_stopped()
+                client.stop()
+            stopped.add_done_callback(lambda f: _copy_future(f, outcome))
+
+        client.enter_standby_async().add_done_callback(_after_standby)
+        return outcome
+
+    def _on_agent_stopped(self, future):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            self.update_status(f"Error stopping agent: {e}")
+            return
+        if outcome == "standby":
+            self._status_message = "Agent in standby (browser kept warm)."
+        else:
+            self._status_message = "Agent stopped."
+
+    @Action(label="Profile Agent CPU", location="settings", icon="fa5s.tachometer-alt")
+    def profile_agent(self, *args):
+        """Profile the agent thread for the configured number of seconds."""
+        ok, message = self.start_profiling()
+        self.api.ui.toast(message, "info" if ok else "warning")
+
+    def start_profiling(self, seconds: float | None = None, mode: str | None = None) -> tuple[bool, str]:
+        """Start a CPU profile of the agent thread; results go to diagnostics/profiles/ in the agent data folder."""
+        if seconds is None:
+            seconds = self.get_setting('profiler_seconds', 30, type=int)
+        if mode is None:
+            mode = self.get_setting('profiler_mode', 'sampling', type=str)
+        return self.wa_client.start_profiling(seconds=seconds, mode=mode)
+
+    def stop_profiling(self):
+        """Stop a running profile early and write what was collected."""
+        self.wa_client.profiler.stop()
+
+    def profiler_status(self) -> dict:
+        return self.wa_client.profiler.status()
+
+    @Action(label="Snapshot Agent Memory", location="settings", icon="fa5s.memory")
+    def snapshot_agent_memory(self, *args):
+        """Take a memory snapshot and diff it against the previous one."""
+        ok, message = self.take_memory_snapshot()
+        self.api.ui.toast(message, "info" if ok else "warning")
+
+    def take_memory_snapshot(self, label: str = "manual") -> tuple[bool, str]:
+        """Queue a tracemalloc snapshot; the report goes to diagnostics/memory/ in the agent data folder."""
+        return self.wa_client.memory.request_snapshot(label)
+
+    def memory_report(self) -> dict | None:
+        """Full report of the last snapshot: growing allocation sites, object types and client state sizes."""
+        return self.wa_client.memory.last_report
+
+    def memory_status(self) -> dict:
+        return self.wa_client.memory.status()
+
+    @property
+    def exports(self):
+        """Functions other plugins can call via ``api.get_plugin_api('whatsapp_automation_agent')``."""
+        return {
+            'start_agent': self.start_agent_async,
+            'stop_agent': self.stop_agent_async,
+            'get_metrics_snapshot': self.get_metrics_snapshot,
+            'get_startup_timeline': self.get_startup_timeline,
+            'start_profiling': self.start_profiling,
+            'stop_profiling': self.stop_profiling,
+            'profiler_status': self.profiler_status,
+            'take_memory_snapshot': self.take_memory_snapshot,
+            'memory_report': self.memory_report,
+            'memory_status': self.memory_status,
+        }
 
     @Action(label="Send WhatsApp", location="toolbar:right", icon="fa5b.whatsapp")
     def send_via_whatsapp(self, invoice: dict = None):
@@ -154,17 +301,34 @@ class WhatsAppAgentPlugin(DeclarativePlugin):
             except Exception as e:
                 self.update_status(f"Error checking send result: {e}")
                 
-        # Schedule the async coroutine in the agent's event loop
-        import asyncio
-        if hasattr(self.wa_client, 'loop') and self.wa_client.loop and self.wa_client.loop.is_running():
-            future = asyncio.run_coroutine_threadsafe(
-                self.wa_client.send_invoice_async(phone, text, file_path),
-                self.wa_client.loop
-            )
-            future.add_done_callback(_send_callback)
+        # Runs on the agent's event loop; a send queued during an agent restart goes out after it.
+        if self.wa_client.is_running:
+            self.wa_client.send_invoice(phone, text, file_path).add_done_callback(_send_callback)
         else:
             self.api.ui.toast("Agent loop is not running.", "error")
 
+    def start_status_server(self) -> bool:
+        """Start the optional loopback HTTP status/metrics endpoint."""
+        if self.status_server and self.status_server.is_running:
+            return True
+        port = self.get_setting('status_server_port', DEFAULT_STATUS_PORT, type=int)
+        self.status_server = AgentStatusServer(self, port=port)
+        return self.status_server.start()
+
+    def stop_status_server(self):
+        """Stop the loopback HTTP status/metrics endpoint if it is running."""
+        if self.status_server:
+            self.status_server.stop()
+            self.status_server = None
+
+    def get_metrics_snapshot(self) -> dict:
+        """Pipeline counters, gauges and stage latency percentiles (p50/p95/p99)."""
+        return self.wa_client.metrics_snapshot()
+
+    def get_startup_timeline(self) -> dict:
+        """Per-phase timing of the current/last agent start, compared with earlier starts."""
+        return self.wa_client.startup.summary()
+
     def _format_message(self, data: dict) -> str:
         """Replace variables in template with data (cloned from whatsapp-redirect)"""
         template = self.get_setting('message_template', """\U0001F4C4 *Invoice #{invoice_number}*
@@ -279,7 +443,8 @@ Thanks!""", type=str)
 
     def on_unload(self):
         """Clean up resources before plugin is unloaded."""
-        if self.wa_client.is_running:
+        self.stop_status_server()
+        if not self.wa_client.stopped:
             self.wa_client.stop()
 
     def update_status(self, message: str):
@@ -287,3 +452,11 @@ Thanks!""", type=str)
         self._status_message = message
         logger.info(f"WhatsApp Status: {message}")
 
+
+def _copy_future(source: concurrent.futures.Future, target: concurrent.futures.Future):
+    if target.done():
+        return
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
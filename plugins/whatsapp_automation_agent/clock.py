@@ -0,0 +1,143 @@
+import time
+import heapq
+import asyncio
+import datetime
+import itertools
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+
+class AgentClock:
+    """Wall-clock time for the agent: real sleeps, Playwright timeouts used as given."""
+
+    virtual = False
+
+    def time(self) -> float:
+        return time.time()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def timeout(self, ms: float) -> float:
+        """Playwright timeout (milliseconds) for a wait the code would give ``ms``."""
+        return ms
+
+    async def attach(self, page):
+        """Hook for the page the agent drives; real time needs nothing."""
+        return None
+
+    def stop(self):
+        return None
+
+
+class VirtualClock(AgentClock):
+    """
+    Discrete-event clock for tests and benchmarks.
+
+    ``sleep`` never waits out its duration. Sleepers are kept in a deadline heap and,
+    every ``tick`` of real time, virtual time jumps to the earliest deadline; when
+    nobody sleeps it still flows ``speed`` times faster than real time. Wake-up order
+    therefore depends only on the deadlines, not on how long browser calls take.
+
+    Playwright waits are against a real browser, so timeouts are only scaled down to
+    ``min_timeout_ms``. With ``control_page`` the page's own timers (``Date``,
+    ``setTimeout``, animation frames) run on the same virtual time through Playwright's
+    clock API (``page.clock.install``/``pause_at``/``run_for``).
+    """
+
+    virtual = True
+
+    def __init__(self, speed: float = 50.0, tick: float = 0.005, min_timeout_ms: float = 1000,
+                 control_page: bool = True, start: float | None = None):
+        self.speed = max(1.0, float(speed))
+        self.tick = max(0.0005, float(tick))
+        self.min_timeout_ms = min_timeout_ms
+        self.control_page = control_page
+        self.advanced_seconds = 0.0
+        self.jumps = 0
+        self._now = time.time() if start is None else float(start)
+        self._sleepers = []
+        self._seq = itertools.count()
+        self._driver = None
+        self._page = None
+        self._page_controlled = False
+
+    def time(self) -> float:
+        return self._now
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._sleepers, (self._now + seconds, next(self._seq), future))
+        self._ensure_driver(loop)
+        await future
+
+    def timeout(self, ms: float) -> float:
+        if not ms:
+            return ms
+        return max(self.min_timeout_ms, ms / self.speed)
+
+    async def attach(self, page):
+        """Scale the page's default timeouts and put its timers on virtual time."""
+        self._page = page
+        self._page_controlled = False
+        try:
+            page.set_default_timeout(self.timeout(30000))
+            page.set_default_navigation_timeout(self.timeout(60000))
+        except Exception:
+            pass
+        if not self.control_page:
+            return
+        try:
+            started = datetime.datetime.fromtimestamp(self._now)
+            await page.clock.install(time=started)
+            # Installed clocks keep ticking in real time until paused.
+            self._now += 0.001
+            await page.clock.pause_at(datetime.datetime.fromtimestamp(self._now))
+            self._page_controlled = True
+        except Exception as e:
+            logger.warning(f"[WA] Virtual clock could not control page time: {e}")
+        self._ensure_driver(asyncio.get_running_loop())
+
+    def stop(self):
+        if self._driver is not None:
+            self._driver.cancel()
+            self._driver = None
+        self._page = None
+        self._page_controlled = False
+
+    def _ensure_driver(self, loop):
+        if self._driver is None or self._driver.done() or self._driver.get_loop() is not loop:
+            self._driver = loop.create_task(self._drive())
+
+    async def _drive(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            while self._sleepers and self._sleepers[0][2].done():
+                heapq.heappop(self._sleepers)  # cancelled sleeper
+            if self._sleepers:
+                target = max(self._sleepers[0][0], self._now)
+                self.jumps += 1
+            else:
+                target = self._now + self.tick * self.speed
+            await self._advance_to(target)
+
+    async def _advance_to(self, target: float):
+        delta = target - self._now
+        if delta > 0:
+            self._now = target
+            self.advanced_seconds += delta
+            page = self._page
+            if self._page_controlled and page is not None and not page.is_closed():
+                try:
+                    await page.clock.run_for(max(1, int(delta * 1000)))
+                except Exception:
+                    pass
+        while self._sleepers and self._sleepers[0][0] <= self._now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,241 @@
+import re
+import time
+import asyncio
+from collections import deque
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+STATE_LOADING = "loading"
+STATE_QR_REQUIRED = "qr_required"
+STATE_CONNECTED = "connected"
+STATE_PHONE_OFFLINE = "phone_offline"
+STATE_RECONNECTING = "reconnecting"
+STATE_CONFLICT = "conflict"  # "WhatsApp is open in another window"
+STATE_LOGGED_OUT = "logged_out"
+
+# Logged in, but the page cannot send or receive until this clears.
+DEGRADED_STATES = {STATE_PHONE_OFFLINE, STATE_RECONNECTING, STATE_CONFLICT}
+
+BINDING_NAME = "__waConnectionState"
+
+# Classifies the page on every DOM mutation (debounced) and reports changes through the
+# exposed binding. Banner text is matched in English; the data-icon checks are not localized.
+OBSERVER_SCRIPT = """
+(() => {
+  if (window.top !== window || window.__waConnectionObserver) return;
+  window.__waConnectionObserver = true;
+  const lower = (node) => ((node && (node.innerText || node.textContent)) || "").toLowerCase();
+  const detect = () => {
+    if (!document.body) return ["loading", ""];
+    const pane = document.querySelector("#pane-side");
+    for (const dialog of document.querySelectorAll("div[role='dialog'], [data-animate-modal-popup='true']")) {
+      const text = lower(dialog);
+      if (text.includes("use here") || text.includes("another window")) return ["conflict", text.slice(0, 160)];
+    }
+    if (!pane) {
+      const text = lower(document.body).slice(0, 2000);
+      if (text.includes("use here")) return ["conflict", text.slice(0, 160)];
+      if (document.querySelector("canvas")) return ["qr_required", ""];
+      return ["loading", ""];
+    }
+    if (document.querySelector("span[data-icon='alert-phone']")) return ["phone_offline", "alert-phone"];
+    if (document.querySelector("span[data-icon='alert-computer']")) return ["reconnecting", "alert-computer"];
+    // Banners sit above the chat list; message previews inside #pane-side must not count.
+    const side = document.querySelector("#side");
+    let banner = "";
+    if (side) {
+      for (const child of side.children) {
+        if (!child.contains(pane)) banner += " " + lower(child);
+      }
+    }
+    if (/phone not connected|trying to reach phone|make sure your phone has an active internet/.test(banner)) {
+      return ["phone_offline", banner.trim().slice(0, 160)];
+    }
+    if (/computer not connected|reconnecting|connecting\\u2026|connecting\\.\\.\\./.test(banner)) {
+      return ["reconnecting", banner.trim().slice(0, 160)];
+    }
+    return ["connected", ""];
+  };
+  let last = null;
+  let timer = null;
+  const report = () => {
+    timer = null;
+    const [state, detail] = detect();
+    if (state === last) return;
+    last = state;
+    try { window.__waConnectionState(state, detail); } catch (error) {}
+  };
+  const schedule = () => { if (timer === null) timer = setTimeout(report, 250); };
+  const start = () => {
+    new MutationObserver(schedule).observe(document.documentElement, { childList: true, subtree: true, characterData: true });
+    setInterval(schedule, 5000);
+    report();
+  };
+  if (document.documentElement) start(); else document.addEventListener("DOMContentLoaded", start);
+})();
+"""
+
+
+class ConnectionMonitor:
+    """
+    Connection state of WhatsApp Web, driven by a MutationObserver in the page.
+
+    The observer reports each change through an exposed binding, so the agent learns
+    about "phone not connected", reconnect banners, the "open in another window" screen
+    and a returning QR code within a fraction of a second instead of by polling. Callers
+    use ``wait_change`` / ``wait_connected``; ``on_change(old, new)`` lets the client
+    pause and resume work. With ``use_here`` set the conflict screen is answered with
+    "Use here", at most once per ``use_here_interval`` seconds so two instances do not
+    keep taking the session from each other.
+    """
+
+    def __init__(self, metrics=None, journal=None, on_change=None, clock=None, use_here: bool = False,
+                 use_here_interval: float = 60.0):
+        self.metrics = metrics
+        self.clock = clock
+        self.journal = journal
+        self.on_change = on_change
+        self.use_here = use_here
+        self.use_here_interval = use_here_interval
+        self.state = STATE_LOADING
+        self.detail = ""
+        self.since = time.time()
+        self.observed = False
+        self.use_here_clicks = 0
+        self.history = deque(maxlen=50)
+        self.was_connected = False
+        self._page = None
+        self._changed = None
+        self._last_use_here = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return self.state in DEGRADED_STATES
+
+    @property
+    def connected(self) -> bool:
+        return self.state == STATE_CONNECTED
+
+    async def attach(self, page):
+        """Install the observer; call before the first navigation. Returns False if unavailable."""
+        self._page = page
+        self._changed = asyncio.Event()
+        self.state = STATE_LOADING
+        self.since = time.time()
+        self.was_connected = False
+        self.observed = False
+        try:
+            await page.expose_binding(BINDING_NAME, self._on_binding)
+            await page.add_init_script(OBSERVER_SCRIPT)
+            self.observed = True
+        except Exception as e:
+            logger.warning(f"[WA] Connection observer unavailable, falling back to polling: {e}")
+        return self.observed
+
+    def _on_binding(self, source, state, detail=""):
+        self.set_state(str(state), str(detail or ""))
+
+    async def refresh(self) -> str:
+        """Classify the page directly (fallback when the observer is unavailable)."""
+        page = self._page
+        if page is None:
+            return self.state
+        try:
+            if await page.locator("div#pane-side").count() > 0:
+                state = STATE_CONNECTED
+            elif await page.locator("canvas").count() > 0:
+                state = STATE_QR_REQUIRED
+            else:
+                state = STATE_LOADING
+        except Exception:
+            return self.state
+        self.set_state(state)
+        return self.state
+
+    def set_state(self, state: str, detail: str = ""):
+        if state == STATE_QR_REQUIRED and self.was_connected:
+            state = STATE_LOGGED_OUT
+        if state == self.state:
+            return
+        old, now = self.state, time.time()
+        duration = now - self.since
+        self.state, self.detail, self.since = state, detail, now
+        if state == STATE_CONNECTED:
+            self.was_connected = True
+        self.history.append({"at": round(now, 3), "from": old, "to": state, "after_seconds": round(duration, 3)})
+        if self.metrics is not None:
+            self.metrics.inc("connection.transitions", state=state)
+            if old in DEGRADED_STATES:
+                self.metrics.observe("connection.degraded", duration, state=old)
+        if self.journal is not None:
+            self.journal.emit("connection", "state", outcome=state, previous=old, duration=round(duration, 3),
+                              detail=detail or None)
+        log = logger.warning if state in DEGRADED_STATES or state == STATE_LOGGED_OUT else logger.info
+        log(f"[WA] Connection {old} -> {state} after {duration:.1f}s{f' ({detail})' if detail else ''}")
+        if self._changed is not None:
+            self._changed.set()
+        if self.on_change is not None:
+            try:
+                self.on_change(old, state)
+            except Exception as e:
+                logger.warning(f"[WA] Connection state handler failed: {e}")
+        if state == STATE_CONFLICT and self.use_here:
+            asyncio.get_running_loop().create_task(self._click_use_here())
+
+    async def wait_change(self, timeout: float):
+        """Wait up to ``timeout`` seconds for the next state change."""
+        sleep = self.clock.sleep if self.clock is not None else asyncio.sleep
+        if self._changed is None:
+            await sleep(timeout)
+            return
+        self._changed.clear()
+        waiters = {asyncio.ensure_future(self._changed.wait()), asyncio.ensure_future(sleep(timeout))}
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        if not self.observed:
+            await self.refresh()
+
+    async def wait_connected(self, timeout: float) -> bool:
+        """Wait until connected again, for at most ``timeout`` seconds."""
+        now = self.clock.time if self.clock is not None else time.time
+        deadline = now() + timeout
+        while not self.connected:
+            remaining = deadline - now()
+            if remaining <= 0:
+                return False
+            await self.wait_change(remaining)
+        return True
+
+    async def _click_use_here(self):
+        if time.monotonic() - self._last_use_here < self.use_here_interval:
+            logger.warning("[WA] WhatsApp was opened in another window again; not taking it back so soon.")
+            return
+        self._last_use_here = time.monotonic()
+        page = self._page
+        try:
+            button = page.get_by_role("button", name=re.compile(r"use here", re.I))
+            if await button.count() == 0:
+                button = page.locator("div[role='button']:has-text('Use here'), button:has-text('Use here')")
+            await button.first.click(timeout=self.clock.timeout(5000) if self.clock is not None else 5000)
+            self.use_here_clicks += 1
+            if self.metrics is not None:
+                self.metrics.inc("connection.use_here")
+            logger.info("[WA] Clicked 'Use here' to take the session back.")
+        except Exception as e:
+            logger.warning(f"[WA] Could not click 'Use here': {e}")
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "detail": self.detail,
+            "since": round(self.since, 3),
+            "degraded": self.degraded,
+            "observer": self.observed,
+            "use_here": self.use_here,
+            "use_here_clicks": self.use_here_clicks,
+            "recent": list(self.history)[-10:],
+        }
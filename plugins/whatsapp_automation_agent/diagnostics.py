@@ -0,0 +1,172 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+# Stage latency budgets (seconds); exceeding one counts as a failure worth a trace dump.
+DEFAULT_STAGE_BUDGETS = {
+    "inbound.chat_open": 8.0,
+    "inbound.media_download": 40.0,
+    "inbound.import_file_to_queue": 5.0,
+    "reply.send": 15.0,
+    "outbound.total": 75.0,
+}
+
+
+class TraceRingBuffer:
+    """
+    Rolling Playwright trace (actions, DOM snapshots, screenshots, network) kept in the
+    driver and only written to disk when something goes wrong.
+
+    Every ``window_seconds`` the current chunk is written to one of two alternating files
+    under ``rolling/`` and a new one started, which bounds driver memory. A dump saves the
+    current chunk plus the previous one (``*_before.zip``), so it always covers at least
+    one full window before the failure. Dumps are rate-limited and the dump directory is
+    trimmed to ``quota_bytes``.
+    """
+
+    def __init__(self, traces_dir: str, window_seconds: float = 180, quota_bytes: int = 200 * 1024 * 1024,
+                 min_dump_interval: float = 60):
+        self.traces_dir = traces_dir
+        self.window_seconds = window_seconds
+        self.quota_bytes = quota_bytes
+        self.min_dump_interval = min_dump_interval
+        self.context = None
+        self.active = False
+        self.dumps_written = 0
+        self.dumps_suppressed = 0
+        self.last_dump_path = ""
+        self._chunk_started = 0.0
+        self._last_dump_at = 0.0
+        self._busy = False
+        self._dump_task = None
+        self._rolling_index = 0
+        self._previous_chunk = ""
+
+    async def start(self, context) -> bool:
+        """Begin tracing the browser context."""
+        if self.active:
+            return True
+        try:
+            await context.tracing.start(name="whatsapp_agent", snapshots=True, screenshots=True, sources=False)
+        except Exception as e:
+            logger.warning(f"[WA] Could not start diagnostics trace: {e}")
+            return False
+        self.context = context
+        self.active = True
+        self._chunk_started = time.monotonic()
+        logger.info(f"[WA] Diagnostics trace ring buffer active (window {int(self.window_seconds)}s).")
+        return True
+
+    async def stop(self):
+        """Stop tracing and drop whatever is buffered."""
+        if not self.active:
+            return
+        self.active = False
+        try:
+            await self.context.tracing.stop()
+        except Exception:
+            pass
+        self.context = None
+        self._previous_chunk = ""
+
+    async def maybe_rotate(self):
+        """Set the current chunk aside as the previous one once it is older than the window."""
+        if not self.active or self._busy:
+            return
+        if time.monotonic() - self._chunk_started < self.window_seconds:
+            return
+        self._busy = True
+        rolling_dir = os.path.join(self.traces_dir, "rolling")
+        # Two files, alternating, so the chunk being written never replaces the one kept.
+        chunk_path = os.path.join(rolling_dir, f"chunk_{self._rolling_index}.zip")
+        try:
+            await asyncio.to_thread(os.makedirs, rolling_dir, exist_ok=True)
+            await self.context.tracing.stop_chunk(path=chunk_path)
+            self._previous_chunk = chunk_path
+            self._rolling_index ^= 1
+            await self.context.tracing.start_chunk()
+        except Exception as e:
+            logger.warning(f"[WA] Diagnostics trace rotation failed, disabling: {e}")
+            self.active = False
+        finally:
+            self._chunk_started = time.monotonic()
+            self._busy = False
+
+    def request_dump(self, reason: str):
+        """Schedule a dump of the buffered trace from inside the agent loop (non-blocking)."""
+        if not self.active:
+            return
+        now = time.monotonic()
+        if self._busy or now - self._last_dump_at < self.min_dump_interval:
+            self.dumps_suppressed += 1
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._last_dump_at = now
+        self._busy = True
+        self._dump_task = loop.create_task(self._dump(reason))
+
+    async def _dump(self, reason: str):
+        slug = re.sub(r"[^a-zA-Z0-9_.-]+", "_", reason or "failure")[:60]
+        file_path = os.path.join(self.traces_dir, f"trace_{time.strftime('%Y%m%d_%H%M%S')}_{slug}.zip")
+        try:
+            await asyncio.to_thread(os.makedirs, self.traces_dir, exist_ok=True)
+            await self.context.tracing.stop_chunk(path=file_path)
+            self.dumps_written += 1
+            if self._previous_chunk:
+                previous, self._previous_chunk = self._previous_chunk, ""
+                try:
+                    await asyncio.to_thread(shutil.copy2, previous, file_path[:-len(".zip")] + "_before.zip")
+                except OSError as e:
+                    logger.warning(f"[WA] Could not save the previous diagnostics trace chunk: {e}")
+            self.last_dump_path = file_path
+            logger.warning(f"[WA] Diagnostics trace saved ({reason}): {file_path}")
+        except Exception as e:
+            logger.warning(f"[WA] Failed to save diagnostics trace ({reason}): {e}")
+        finally:
+            try:
+                if self.active:
+                    await self.context.tracing.start_chunk()
+            except Exception as e:
+                logger.warning(f"[WA] Diagnostics trace restart failed, disabling: {e}")
+                self.active = False
+            self._chunk_started = time.monotonic()
+            self._busy = False
+        await asyncio.to_thread(self._enforce_quota)
+
+    def _enforce_quota(self):
+        try:
+            entries = []
+            for name in os.listdir(self.traces_dir):
+                if not name.endswith(".zip"):
+                    continue
+                path = os.path.join(self.traces_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            return
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.quota_bytes:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                break
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "window_seconds": self.window_seconds,
+            "dumps_written": self.dumps_written,
+            "dumps_suppressed": self.dumps_suppressed,
+            "last_dump_path": self.last_dump_path,
+        }
@@ -0,0 +1,598 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import threading
+from core.plugins.sdk import get_logger
+from .paths import data_dir
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+LEGACY_DIR = os.path.join(PLUGIN_DIR, "downloads")
+INDEX_NAME = "index.json"
+# Content-addressed bodies, ``objects/ab/<sha256>``; the dated names are hard links to them.
+OBJECTS_DIR = "objects"
+# Chromium saves downloads here, on the store's filesystem, so landing one is a rename.
+INCOMING_DIR = "incoming"
+HASH_CHUNK = 1024 * 1024
+# Keep a compressed copy only if it saves at least this much (PDFs and photos often do not).
+MIN_COMPRESSION_SAVING = 0.10
+# Reserved names whose download never completed are dropped after this long.
+ORPHAN_GRACE_SECONDS = 3600
+
+STATE_PENDING = "pending"    # handed to the host, no outcome yet
+STATE_INGESTED = "ingested"  # processed (or a duplicate): only kept for reference
+STATE_FAILED = "failed"      # processing failed; kept so the user can retry
+STATE_REJECTED = "rejected"  # failed validation, never handed to the host
+
+
+def hash_file(path: str) -> tuple[str, int]:
+    """SHA-256 hex digest and size of ``path``, read once in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _stored_bytes(entries) -> int:
+    """Bytes on disk: an object counts once however many names link to it."""
+    objects, total = {}, 0
+    for entry in entries:
+        if entry.get("linked"):
+            objects[entry["sha256"]] = entry["size"]
+        else:
+            total += entry["size"]
+    return total + sum(objects.values())
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def default_downloads_dir() -> str:
+    return data_dir("downloads")
+
+
+class DownloadStore:
+    """
+    Received files, with a size quota, an age limit and optional compression.
+
+    ``land`` takes a finished download, hashes it in one pass and moves it into
+    ``objects/`` under its SHA-256 (a rename when Chromium saved it in ``incoming/``);
+    the file gets a unique name under a per-day folder that is a hard link to the
+    object, so an invoice sent twice is stored once. ``register`` records the name
+    against its message key, and ``settle`` queues the host's outcome for the store's thread,
+    which applies queued outcomes as they arrive. Maintenance runs in that thread too, every
+    ``interval`` seconds or when ``kick``-ed. It deletes files the host
+    has finished with: ingested or failed ones older than ``max_age_days``, then the least
+    recently used ingested ones while the store is above ``quota_bytes``. Files still
+    pending are never deleted. With ``compress`` on, ingested files are gzipped in place.
+    The index lives next to the files as ``index.json``.
+    """
+
+    def __init__(self, root: str = "", quota_bytes: int = 1024 * 1024 * 1024, max_age_days: float = 30,
+                 compress: bool = False, interval: float = 600.0, metrics=None):
+        self.root = root or default_downloads_dir()
+        self.quota_bytes = quota_bytes
+        self.max_age_days = max_age_days
+        self.compress = compress
+        self.interval = interval
+        self.metrics = metrics
+        self.removed_total = 0
+        self.freed_bytes_total = 0
+        self.compressed_total = 0
+        self.deduplicated_total = 0
+        self.copied_total = 0
+        self.last_maintenance = None
+        self.last_maintenance_seconds = None
+        self._entries = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._settlements = []
+        self._maintain_requested = False
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- files -----------------------------------------------------------------------
+
+    def set_root(self, root: str):
+        """Move the store to ``root`` (before use); the index there is loaded on demand."""
+        with self._lock:
+            if os.path.abspath(root) != os.path.abspath(self.root):
+                self.root = root
+                self._entries = None
+                self._dirty = False
+
+    def allocate(self, filename: str) -> str:
+        """A new, unique path for ``filename``; the empty file reserves the name."""
+        folder = os.path.join(self.root, time.strftime("%Y-%m-%d"))
+        os.makedirs(folder, exist_ok=True)
+        stem, ext = os.path.splitext(filename)
+        candidate = filename
+        for n in range(2, 10000):
+            path = os.path.join(folder, candidate)
+            try:
+                with open(path, "x"):
+                    pass
+                return path
+            except FileExistsError:
+                candidate = f"{stem} ({n}){ext}"
+        raise OSError(f"No free file name for {filename} in {folder}")
+
+    def incoming_dir(self) -> str:
+        """Where the browser should save downloads (same filesystem as the objects)."""
+        path = os.path.join(self.root, OBJECTS_DIR, INCOMING_DIR)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def staging_path(self) -> str:
+        """A scratch path in ``incoming/`` for a file that has to be written by us."""
+        return os.path.join(self.incoming_dir(), f"{time.time_ns()}-{threading.get_ident()}.tmp")
+
+    def land(self, source: str, filename: str, move: bool = True) -> str:
+        """
+        Store the finished file at ``source`` as ``filename``; returns its path in the store.
+
+        Blocking I/O, keep it off the agent loop. With ``move``, ``source`` is consumed.
+        """
+        sha256, size = hash_file(source)
+        obj = os.path.join(self.root, OBJECTS_DIR, sha256[:2], sha256)
+        if os.path.exists(obj):
+            os.utime(obj)  # keeps the object clear of the unreferenced-object sweep
+            if move:
+                _remove_quietly(source)
+            self.deduplicated_total += 1
+            if self.metrics is not None:
+                self.metrics.inc("downloads.deduplicated")
+        else:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            moved = False
+            if move:
+                try:
+                    os.replace(source, obj)
+                    moved = True
+                except OSError:
+                    pass  # another filesystem (or the file is still held open)
+            if not moved:
+                tmp = f"{obj}.{threading.get_ident()}.tmp"
+                shutil.copyfile(source, tmp)
+                os.replace(tmp, obj)
+                if move:
+                    _remove_quietly(source)
+                self.copied_total += 1
+        path = self.allocate(filename)
+        try:
+            os.link(obj, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+            linked = True
+        except OSError:
+            # No hard links here (e.g. FAT, some network shares): keep a plain copy.
+            _remove_quietly(f"{path}.tmp")
+            shutil.copyfile(obj, path)
+            linked = False
+        now = round(time.time(), 3)
+        with self._lock:
+            self._load()
+            self._entries[self._relative(path)] = {
+                "message_key": "", "size": size, "sha256": sha256, "linked": linked,
+                "state": STATE_PENDING, "created": now, "used": now,
+            }
+            self._dirty = True
+        return path
+
+    def land_bytes(self, data: bytes, filename: str) -> str:
+        """``land`` for a body we already hold in memory (the blob fallback)."""
+        staging = self.staging_path()
+        with open(staging, "wb") as f:
+            f.write(data)
+        return self.land(staging, filename)
+
+    def register(self, path: str, message_key: str = "") -> dict:
+        """
+        Record a stored file against the message it came from; returns its index entry.
+
+        May read the index or stat the file; keep it off the agent loop.
+        """
+        now = round(time.time(), 3)
+        with self._lock:
+            self._load()
+            rel = self._relative(path)
+            entry = self._entries.get(rel)
+            if entry is None:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return {}
+                entry = self._entries[rel] = {
+                    "message_key": "", "size": size, "state": STATE_PENDING, "created": now,
+                }
+            entry.update(message_key=message_key, used=now)
+            self._dirty = True
+            return dict(entry)
+
+    def lookup(self, path: str) -> dict:
+        """The index entry of ``path`` (``sha256``, ``size``, ``state``...), or an empty dict."""
+        with self._lock:
+            self._load()
+            return dict(self._entries.get(self._relative(path)) or {})
+
+    def settle(self, message_key: str, state: str):
+        """The host finished with the file(s) of ``message_key``; queued, callable from any thread."""
+        if not message_key:
+            return
+        with self._lock:
+            self._settlements.append((message_key, state, round(time.time(), 3)))
+        self._wakeup.set()
+
+    def _apply_settlements(self):
+        """Apply the queued outcomes in one pass over the index; runs in the store's thread."""
+        with self._lock:
+            if not self._settlements:
+                return
+            outcomes = {key: (state, at) for key, state, at in self._settlements}
+            self._settlements = []
+            self._load()
+            for entry in self._entries.values():
+                outcome = outcomes.get(entry.get("message_key"))
+                if outcome is not None and entry["state"] != outcome[0]:
+                    entry["state"], entry["settled"] = outcome
+                    self._dirty = True
+
+    def touch(self, path: str):
+        """A file was read again (e.g. re-sent); pushes it back in the LRU order."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self._relative(path))
+            if entry is not None:
+                entry["used"] = round(time.time(), 3)
+                self._dirty = True
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.root)).replace("\\", "/")
+
+    def _load(self):
+        """Read the index once; call with the lock held."""
+        if self._entries is not None:
+            return
+        try:
+            with open(os.path.join(self.root, INDEX_NAME), "r", encoding="utf-8") as f:
+                self._entries = dict(json.load(f).get("files", {}))
+        except (OSError, ValueError, AttributeError):
+            self._entries = {}
+
+    def _save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"files": dict(self._entries)}
+            self._dirty = False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            path = os.path.join(self.root, INDEX_NAME)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=0)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            self._dirty = True
+            logger.warning(f"[WA] Could not save download index: {e}")
+
+    # -- maintenance -----------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.kick()
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, args=(self._stop,), name="WhatsAppDownloadStore", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the maintenance thread; the index is saved on its way out."""
+        self._stop.set()
+        self._wakeup.set()
+        self._thread = None
+
+    def kick(self):
+        """Run maintenance soon (e.g. after a burst of downloads)."""
+        self._maintain_requested = True
+        self._wakeup.set()
+
+    def _worker(self, stop_event):
+        self._migrate_legacy()
+        next_pass = 0.0
+        while not stop_event.is_set():
+            self._apply_settlements()
+            if self._maintain_requested or time.monotonic() >= next_pass:
+                self._maintain_requested = False
+                self.maintain()
+                next_pass = time.monotonic() + self.interval
+            self._wakeup.wait(max(0.0, next_pass - time.monotonic()))
+            self._wakeup.clear()
+        self._apply_settlements()
+        self._save()
+
+    def maintain(self) -> dict:
+        """One maintenance pass; blocking file I/O, keep it off the agent loop."""
+        started = time.perf_counter()
+        removed, freed, compressed = 0, 0, 0
+        try:
+            self._apply_settlements()
+            self._reconcile()
+            removed, freed = self._collect()
+            freed += self._collect_objects()
+            if self.compress:
+                compressed = self._compress_ingested()
+            self._save()
+        except Exception as e:
+            logger.warning(f"[WA] Download store maintenance failed: {e}")
+        self.removed_total += removed
+        self.freed_bytes_total += freed
+        self.compressed_total += compressed
+        self.last_maintenance = time.time()
+        self.last_maintenance_seconds = round(time.perf_counter() - started, 3)
+        if self.metrics is not None:
+            self.metrics.observe("downloads.maintenance", self.last_maintenance_seconds)
+            if removed:
+                self.metrics.inc("downloads.removed", removed)
+            self.metrics.gauge("downloads.bytes").set(self.total_bytes())
+        if removed or compressed:
+            logger.info(f"[WA] Download store: removed {removed} file(s) ({freed / 1048576:.1f} MB), "
+                        f"compressed {compressed}; {self.total_bytes() / 1048576:.1f} MB kept.")
+        return {"removed": removed, "freed_bytes": freed, "compressed": compressed}
+
+    def _reconcile(self):
+        """Match the index with the disk: forget deleted files, adopt or drop unindexed ones."""
+        with self._lock:
+            self._load()
+            known = set(self._entries)
+        on_disk = set()
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for folder, folders, names in os.walk(self.root):
+            if os.path.abspath(folder) == os.path.abspath(self.root) and OBJECTS_DIR in folders:
+                folders.remove(OBJECTS_DIR)  # swept by _collect_objects
+            for name in names:
+                path = os.path.join(folder, name)
+                rel = self._relative(path)
+                if rel == INDEX_NAME or name.endswith(".tmp"):
+                    continue
+                on_disk.add(rel)
+                if rel in known:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue  # may still be downloading or about to be registered
+                    if stat.st_size == 0:
+                        os.remove(path)  # a reserved name whose download failed
+                        on_disk.discard(rel)
+                        continue
+                except OSError:
+                    continue
+                # Saved but never handed over (e.g. the agent stopped in between).
+                with self._lock:
+                    self._entries[rel] = {
+                        "message_key": "", "size": stat.st_size, "state": STATE_FAILED,
+                        "created": round(stat.st_mtime, 3), "used": round(stat.st_mtime, 3),
+                        "settled": round(stat.st_mtime, 3),
+                    }
+                    self._dirty = True
+        missing = known - on_disk
+        with self._lock:
+            for rel in missing:
+                self._entries.pop(rel, None)
+                self._dirty = True
+            for entry in self._entries.values():
+                # Landed but never handed over (e.g. the agent stopped in between).
+                if entry["state"] == STATE_PENDING and not entry.get("message_key") and entry["created"] < cutoff:
+                    entry.update(state=STATE_FAILED, settled=entry["created"])
+                    self._dirty = True
+
+    def _collect(self) -> tuple[int, int]:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        finished = [(rel, e) for rel, e in entries if e["state"] != STATE_PENDING]
+        doomed = []
+        if self.max_age_days > 0:
+            cutoff = now - self.max_age_days * 86400
+            doomed = [rel for rel, e in finished if e.get("settled", e["created"]) < cutoff]
+        total = _stored_bytes(e for _, e in entries)
+        links = {}
+        for _, e in entries:
+            if e.get("linked"):
+                links[e["sha256"]] = links.get(e["sha256"], 0) + 1
+
+        def release(e) -> int:
+            """Bytes freed by dropping ``e``: a shared object only goes with its last name."""
+            if not e.get("linked"):
+                return e["size"]
+            links[e["sha256"]] -= 1
+            return 0 if links[e["sha256"]] else e["size"]
+
+        if self.quota_bytes > 0:
+            total -= sum(release(e) for rel, e in finished if rel in doomed)
+            # Least recently used first; failed files go last, the user may still want them.
+            for rel, e in sorted(finished, key=lambda item: (item[1]["state"] == STATE_FAILED, item[1]["used"])):
+                if total <= self.quota_bytes:
+                    break
+                if rel not in doomed:
+                    doomed.append(rel)
+                    total -= release(e)
+            if total > self.quota_bytes:
+                logger.warning(f"[WA] Download store is over its quota with files the host has not processed yet "
+                               f"({total / 1048576:.0f} MB > {self.quota_bytes / 1048576:.0f} MB).")
+        removed, freed = 0, 0
+        linked = {rel for rel, e in entries if e.get("linked")}
+        for rel in doomed:
+            path = os.path.join(self.root, rel)
+            try:
+                # A linked name frees nothing by itself; its object goes in _collect_objects.
+                size = 0 if rel in linked else os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                size = 0
+            except OSError as e:
+                logger.warning(f"[WA] Could not remove {rel}: {e}")
+                continue
+            with self._lock:
+                self._entries.pop(rel, None)
+                self._dirty = True
+            removed += 1
+            freed += size
+        self._remove_empty_folders()
+        return removed, freed
+
+    def _collect_objects(self) -> int:
+        """Delete objects no name links to any more, and stale incoming files."""
+        with self._lock:
+            referenced = {e["sha256"] for e in self._entries.values() if e.get("linked")}
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        freed = 0
+        for folder, _, names in os.walk(os.path.join(self.root, OBJECTS_DIR)):
+            for name in names:
+                if name in referenced:
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue  # being landed (or downloaded) right now
+                    os.remove(path)
+                    freed += stat.st_size
+                except OSError:
+                    continue
+        return freed
+
+    def _compress_ingested(self) -> int:
+        with self._lock:
+            candidates = [rel for rel, e in self._entries.items()
+                          if e["state"] == STATE_INGESTED and not e.get("compressed") and not rel.endswith(".gz")]
+        compressed = 0
+        for rel in candidates:
+            if self._stop.is_set():
+                break
+            path = os.path.join(self.root, rel)
+            target = f"{path}.gz"
+            try:
+                with open(path, "rb") as src, gzip.open(f"{target}.tmp", "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst)
+                original, packed = os.path.getsize(path), os.path.getsize(f"{target}.tmp")
+            except OSError as e:
+                logger.warning(f"[WA] Could not compress {rel}: {e}")
+                continue
+            with self._lock:
+                entry = self._entries.pop(rel, None)
+                if entry is None:  # removed meanwhile
+                    os.remove(f"{target}.tmp")
+                    continue
+                if packed > original * (1 - MIN_COMPRESSION_SAVING):
+                    os.remove(f"{target}.tmp")
+                    entry["compressed"] = "skipped"
+                    self._entries[rel] = entry
+                else:
+                    os.replace(f"{target}.tmp", target)
+                    os.remove(path)
+                    # The .gz stands alone; the object goes once no other name links to it.
+                    entry.update(compressed="gzip", size=packed, original_size=original, linked=False)
+                    self._entries[f"{rel}.gz"] = entry
+                    compressed += 1
+                self._dirty = True
+        return compressed
+
+    def _remove_empty_folders(self):
+        today = time.strftime("%Y-%m-%d")
+        try:
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name != today and os.path.isdir(path) and not os.listdir(path):
+                    os.rmdir(path)
+        except OSError:
+            pass
+
+    def _migrate_legacy(self):
+        """Move files from the old downloads folder inside the plugin into the store."""
+        if not os.path.isdir(LEGACY_DIR) or os.path.abspath(LEGACY_DIR) == os.path.abspath(self.root):
+            return
+        moved = 0
+        folder = os.path.join(self.root, "legacy")
+        for name in os.listdir(LEGACY_DIR):
+            source = os.path.join(LEGACY_DIR, name)
+            if not os.path.isfile(source):
+                continue
+            try:
+                os.makedirs(folder, exist_ok=True)
+                target = os.path.join(folder, name)
+                stem, ext = os.path.splitext(name)
+                n = 2
+                while os.path.exists(target):
+                    target = os.path.join(folder, f"{stem} ({n}){ext}")
+                    n += 1
+                shutil.move(source, target)
+            except OSError as e:
+                logger.warning(f"[WA] Could not move {name} out of the plugin folder: {e}")
+                continue
+            modified = os.path.getmtime(target)
+            with self._lock:
+                self._load()
+                # Their outcome was never recorded; by now the host has long had them.
+                self._entries[self._relative(target)] = {
+                    "message_key": "", "size": os.path.getsize(target), "state": STATE_INGESTED,
+                    "created": round(modified, 3), "used": round(modified, 3), "settled": round(modified, 3),
+                }
+                self._dirty = True
+            moved += 1
+        try:
+            os.rmdir(LEGACY_DIR)
+        except OSError:
+            pass
+        if moved:
+            logger.info(f"[WA] Moved {moved} earlier download(s) to {folder}.")
+
+    def known_digests(self) -> dict:
+        """SHA-256 -> time settled, for every file the host has finished with successfully."""
+        with self._lock:
+            self._load()
+            return {e["sha256"]: e.get("settled", e["created"]) for e in self._entries.values()
+                    if e.get("sha256") and e["state"] == STATE_INGESTED}
+
+    # -- reporting -------------------------------------------------------------------
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load()
+            return _stored_bytes(self._entries.values())
+
+    def status(self) -> dict:
+        with self._lock:
+            self._load()
+            entries = list(self._entries.values())
+        states = {}
+        for entry in entries:
+            states[entry["state"]] = states.get(entry["state"], 0) + 1
+        return {
+            "root": self.root,
+            "files": len(entries),
+            "objects": len({e["sha256"] for e in entries if e.get("linked")}),
+            "size_mb": round(_stored_bytes(entries) / 1048576, 2),
+            "by_state": states,
+            "quota_mb": round(self.quota_bytes / 1048576),
+            "max_age_days": self.max_age_days,
+            "compress": self.compress,
+            "removed_total": self.removed_total,
+            "freed_mb_total": round(self.freed_bytes_total / 1048576, 2),
+            "compressed_total": self.compressed_total,
+            "deduplicated_total": self.deduplicated_total,
+            "copied_total": self.copied_total,
+            "last_maintenance": self.last_maintenance,
+            "last_maintenance_seconds": self.last_maintenance_seconds,
+        }
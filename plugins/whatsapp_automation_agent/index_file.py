@@ -0,0 +1,103 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+SAVE_DELAY_SECONDS = 30.0
+
+
+class IndexFile:
+    """
+    An ordered ``{key: entry}`` map kept in a JSON file as ``{"<section>": {...}}``.
+
+    Least recently ``put`` first; at most ``max_entries`` are kept. ``entries`` is None
+    until ``load``. Owners read and change ``entries`` under ``lock`` (re-entrant, so
+    ``put`` and ``pop`` can be called while holding it). Changes are written at most
+    every ``SAVE_DELAY_SECONDS``, and by ``close``.
+    """
+
+    def __init__(self, path: str, section: str, max_entries: int, label: str = "index"):
+        self.path = path
+        self.section = section
+        self.max_entries = max_entries
+        self.label = label
+        self.entries = None
+        self.lock = threading.RLock()
+        self._save_timer = None
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries or ())
+
+    @property
+    def loaded(self) -> bool:
+        return self.entries is not None
+
+    def load(self) -> bool:
+        """Read the file once; False when there was none to read (the owner may seed it). Blocking."""
+        with self.lock:
+            if self.entries is not None:
+                return True
+            self.entries = OrderedDict()
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries.update(json.load(f).get(self.section, {}))
+                return True
+            except FileNotFoundError:
+                return False
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"[WA] {self.label.capitalize()} unreadable, rebuilding it: {e}")
+                return False
+
+    def put(self, key: str, entry: dict, save: bool = True):
+        """Store ``entry`` as the most recent one, dropping the oldest beyond ``max_entries``."""
+        with self.lock:
+            if self.entries is None:
+                return
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if save:
+            self.changed()
+
+    def pop(self, key: str) -> dict | None:
+        with self.lock:
+            removed = (self.entries or {}).pop(key, None)
+        if removed is not None:
+            self.changed()
+        return removed
+
+    def changed(self):
+        """Schedule a save."""
+        with self.lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        with self.lock:
+            self._save_timer = None
+            if self.entries is None:
+                return
+            data = {self.section: dict(self.entries)}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            logger.warning(f"[WA] Could not save {self.label}: {e}")
+
+    def close(self):
+        """Write pending changes now (agent stopping)."""
+        with self.lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
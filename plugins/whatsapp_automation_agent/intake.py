@@ -0,0 +1,229 @@
+import time
+import asyncio
+import threading
+import concurrent.futures
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+# Files the host has accepted but not reported on are forgotten after this long
+# (a host that never emits completed/duplicate/failed must not stall intake for good).
+IN_HOST_TIMEOUT_SECONDS = 900
+# How often a throttled flush re-checks for expired in-host files.
+THROTTLE_RECHECK_SECONDS = 5.0
+
+
+class IntakeItem:
+    """One received file waiting to be handed to the host."""
+
+    __slots__ = ("file_path", "source", "metadata", "future", "submitted_at")
+
+    def __init__(self, file_path: str, source: str, metadata: dict, future):
+        self.file_path = file_path
+        self.source = source
+        self.metadata = metadata
+        self.future = future
+        self.submitted_at = time.monotonic()
+
+
+class HostHandoff:
+    """
+    Hands received files to the host processing queue without blocking the agent loop.
+
+    ``submit`` returns at once with a future for the host's answer. Files that arrive
+    within ``batch_window`` of each other (up to ``max_batch``) go to the host in one
+    round on a single executor thread. Files the host accepted count as "in the host"
+    until ``settle`` reports them done; while ``max_in_host`` are, new rounds wait.
+    """
+
+    def __init__(self, import_fn, max_batch: int = 8, batch_window: float = 0.25,
+                 max_in_host: int = 20, metrics=None):
+        self.import_fn = import_fn
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_in_host = max_in_host
+        self.metrics = metrics
+        self.batches_total = 0
+        self.handed_total = 0
+        self.rejected_total = 0
+        self.throttled_total = 0
+        self.last_batch_size = 0
+        self._pending = []
+        self._in_host = {}
+        self._in_host_lock = threading.Lock()
+        self._executor = None
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._room = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    @property
+    def in_host_count(self) -> int:
+        with self._in_host_lock:
+            return len(self._in_host)
+
+    def submit(self, file_path: str, source: str, metadata: dict) -> asyncio.Future:
+        """Queue a file for the host; call on the agent loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self._task is None or self._task.done():
+            self._bind(loop)
+        future = loop.create_future()
+        self._pending.append(IntakeItem(file_path, source, metadata, future))
+        self._wakeup.set()
+        return future
+
+    def settle(self, message_key: str):
+        """The host finished with a file (completed, duplicate or failed); any thread."""
+        with self._in_host_lock:
+            if self._in_host.pop(message_key, None) is None:
+                return
+        loop, room = self._loop, self._room
+        if loop is not None and room is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(room.set)
+            except RuntimeError:
+                pass
+
+    def close(self):
+        """
+        Stop the flusher and hand the files still waiting to the host before returning.
+
+        Blocking (runs on the stopping agent thread, after its loop is gone): the round in
+        flight finishes first, then the rest go over regardless of ``max_in_host``. Their
+        chat acknowledgement is lost, but the host's completed/failed notices still follow.
+        """
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+        self._loop = None
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        pending, self._pending = self._pending, []
+        if pending:
+            logger.info(f"[WA] Handing {len(pending)} waiting file(s) to the host before stopping.")
+            self._hand_over(pending)
+        for item in pending:
+            if not item.future.done() and not item.future.get_loop().is_closed():
+                item.future.cancel()
+
+    def _bind(self, loop):
+        """(Re)start the flusher on ``loop``, e.g. after a restart replaced the event loop."""
+        if self._pending and self._loop is not loop:
+            # The old loop's callers are gone; still hand their files over, just unacknowledged.
+            for item in self._pending:
+                item.future = loop.create_future()
+            logger.info(f"[WA] Carrying {len(self._pending)} file(s) over to the restarted agent for the host queue.")
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="WhatsAppIntake")
+        self._task = loop.create_task(self._run())
+        if self._pending:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            if len(self._pending) < self.max_batch and self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)  # let a burst of files gather into one round
+            room = await self._wait_for_room()
+            batch = self._pending[:max(1, min(self.max_batch, room))]
+            del self._pending[:len(batch)]
+            self.batches_total += 1
+            self.last_batch_size = len(batch)
+            if self.metrics is not None:
+                self.metrics.inc("inbound.handoff_batches")
+                self.metrics.gauge("inbound.handoff_pending").set(len(self._pending))
+            try:
+                results = await loop.run_in_executor(self._executor, self._hand_over, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            for item, result in zip(batch, results):
+                if item.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    item.future.set_exception(result)
+                else:
+                    item.future.set_result(result)
+            if self._pending:
+                self._wakeup.set()
+
+    async def _wait_for_room(self) -> int:
+        """Free in-host slots, waiting (with the loop free) while the host is backed up."""
+        if self.max_in_host <= 0:
+            return self.max_batch
+        throttled = False
+        while True:
+            self._expire_in_host()
+            room = self.max_in_host - self.in_host_count
+            if room > 0:
+                return room
+            if not throttled:
+                throttled = True
+                self.throttled_total += 1
+                if self.metrics is not None:
+                    self.metrics.inc("inbound.handoff_throttled")
+                logger.info(f"[WA] Host queue has {self.max_in_host} unfinished WhatsApp file(s); "
+                            f"holding {len(self._pending)} until it catches up.")
+            self._room.clear()
+            try:
+                await asyncio.wait_for(self._room.wait(), THROTTLE_RECHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _expire_in_host(self):
+        cutoff = time.monotonic() - IN_HOST_TIMEOUT_SECONDS
+        with self._in_host_lock:
+            for key in [k for k, at in self._in_host.items() if at < cutoff]:
+                del self._in_host[key]
+
+    def _hand_over(self, batch) -> list:
+        """One round of host calls, on the executor thread."""
+        results = []
+        for item in batch:
+            key = item.metadata.get("whatsapp_message_key")
+            if key:
+                # Counted before the call: the host may report a duplicate before it returns.
+                with self._in_host_lock:
+                    self._in_host[key] = time.monotonic()
+            waited = time.monotonic() - item.submitted_at
+            started = time.perf_counter()
+            try:
+                accepted = bool(self.import_fn(item.file_path, item.source, item.metadata))
+            except Exception as e:
+                logger.warning(f"[WA] Host rejected {item.file_path}: {e}")
+                accepted = e
+            if self.metrics is not None:
+                self.metrics.observe("inbound.import_file_to_queue", time.perf_counter() - started)
+                self.metrics.observe("inbound.handoff_wait", waited)
+            if accepted is True:
+                self.handed_total += 1
+            else:
+                self.rejected_total += 1
+                if key:
+                    with self._in_host_lock:
+                        self._in_host.pop(key, None)
+            results.append(accepted)
+        return results
+
+    def status(self) -> dict:
+        return {
+            "pending": self.pending_count,
+            "in_host": self.in_host_count,
+            "max_in_host": self.max_in_host,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "handed_total": self.handed_total,
+            "rejected_total": self.rejected_total,
+            "throttled_total": self.throttled_total,
+        }
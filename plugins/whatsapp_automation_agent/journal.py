@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import queue
+import socket
+import threading
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+JOURNAL_NAME = "wa_journal.jsonl"
+
+
+class EventJournal:
+    """
+    Structured JSONL journal of intake, reply and outbound events.
+
+    ``emit`` only builds a dict and puts it on a queue, so it is safe on the agent loop;
+    a writer thread appends the records through a buffered file, flushes every
+    ``flush_interval`` seconds and rotates ``wa_journal.jsonl`` to ``wa_journal.1.jsonl``
+    ... once it exceeds ``max_bytes``, keeping ``backups`` old files.
+    """
+
+    def __init__(self, journal_dir: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        self.journal_dir = journal_dir
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.active = False
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.host = socket.gethostname()
+        self.session = time.strftime("%Y%m%d_%H%M%S")
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.journal_dir, JOURNAL_NAME)
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._thread = threading.Thread(target=self._writer, name="WhatsAppJournal", daemon=True)
+        self._thread.start()
+        logger.info(f"[WA] Event journal writing to {self.path}")
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what is queued and stop the writer."""
+        if not self.active:
+            return
+        self.active = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def emit(self, event: str, stage: str, **fields):
+        """Queue one record; never blocks. Fields with a None value are left out."""
+        if not self.active:
+            return
+        record = {"ts": round(time.time(), 3), "event": event, "stage": stage, "host": self.host, "session": self.session}
+        record.update({k: v for k, v in fields.items() if v is not None})
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        f = None
+        size = 0
+        last_flush = time.monotonic()
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            f = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+            size = f.tell()
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    record = False
+                if record is None:
+                    break
+                if record:
+                    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                    f.write(line)
+                    size += len(line.encode("utf-8"))
+                    self.written += 1
+                if size >= self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+                    size = 0
+                elif time.monotonic() - last_flush >= self.flush_interval:
+                    f.flush()
+                    last_flush = time.monotonic()
+        except Exception as e:
+            logger.warning(f"[WA] Event journal writer stopped: {e}")
+            self.active = False
+        finally:
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+
+    def _rotate(self):
+        base, ext = os.path.splitext(self.path)
+        try:
+            oldest = f"{base}.{self.backups}{ext}"
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{base}.{index}{ext}"
+                if os.path.exists(source):
+                    os.replace(source, f"{base}.{index + 1}{ext}")
+            if self.backups > 0:
+                os.replace(self.path, f"{base}.1{ext}")
+            else:
+                os.remove(self.path)
+            self.rotations += 1
+        except OSError as e:
+            logger.warning(f"[WA] Event journal rotation failed: {e}")
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "path": self.path,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
@@ -0,0 +1,142 @@
+import os
+import glob
+import json
+import time
+from core.plugins.sdk import get_logger
+from .downloads import default_downloads_dir
+from .index_file import IndexFile
+
+logger = get_logger(__name__)
+
+INDEX_NAME = "known_invoices.json"
+# What a duplicate reply shows; everything else the host sends is left out to keep the index small.
+SUMMARY_FIELDS = ("vendor_name", "invoice_number", "date", "invoice_total", "currency")
+
+
+def default_index_path() -> str:
+    """Next to the download store's default folder, so it survives clearing the downloads."""
+    return os.path.join(os.path.dirname(default_downloads_dir()), INDEX_NAME)
+
+
+def invoice_summary(data: dict | None) -> dict:
+    """The fields of a host invoice dict a duplicate reply needs."""
+    return {k: data[k] for k in SUMMARY_FIELDS if (data or {}).get(k) not in (None, "")}
+
+
+def invoice_in_host(db, summary: dict | None) -> bool | None:
+    """
+    Whether the host database still has the invoice ``summary`` describes: True, False
+    (deleted in the app since), or None when it cannot tell. Blocking; call off the loop.
+    """
+    number = (summary or {}).get("invoice_number")
+    if db is None or not number:
+        return None
+    sql = "SELECT 1 FROM extracted_data WHERE invoice_number = ?"
+    params = [str(number)]
+    if summary.get("vendor_name"):
+        sql += " AND vendor_name = ?"
+        params.append(str(summary["vendor_name"]))
+    try:
+        rows = db.query(sql + " LIMIT 1", tuple(params))
+    except Exception as e:
+        logger.warning(f"[WA] Could not check invoice {number} with the app: {e}")
+        return None
+    return bool(rows)
+
+
+class KnownInvoiceIndex:
+    """
+    SHA-256 of every file the host has processed (or reported as a duplicate), with the
+    invoice's summary, so an exact re-send can be answered without the host.
+
+    Kept current from the host's completed and duplicate events. When no index file
+    exists yet it is seeded from the agent's own history: the journal (which has the
+    summaries) and the download store (hashes only). At most ``max_entries`` are kept,
+    least recently seen dropped first; entries older than ``max_age_days`` are ignored.
+    The host sends no event when an invoice is deleted, so a hit is only answered after
+    ``invoice_in_host`` confirms it; an entry whose invoice is gone is ``forget``-ed.
+    """
+
+    def __init__(self, path: str = "", max_entries: int = 20000, max_age_days: float = 365):
+        self.file = IndexFile(path or default_index_path(), "hashes", max_entries, label="known-invoice index")
+        self.max_age_days = max_age_days
+        self.hits_total = 0
+
+    def __len__(self):
+        return len(self.file)
+
+    def load(self, journal_dir: str = "", store=None):
+        """Read the index (seeding it on first use); blocking, call off the agent loop."""
+        if self.file.load():
+            return
+        seeded = self._seed(journal_dir, store)
+        if seeded:
+            logger.info(f"[WA] Seeded the known-invoice index with {seeded} hash(es) from earlier sessions.")
+            self.file.save()
+
+    def _seed(self, journal_dir: str, store) -> int:
+        if store is not None:
+            for sha256, seen in store.known_digests().items():
+                self.remember(sha256, None, seen=seen, save=False)
+        if journal_dir:
+            # Oldest file first, so later outcomes win.
+            paths = sorted(glob.glob(os.path.join(journal_dir, "wa_journal*.jsonl")),
+                           key=lambda p: os.path.getmtime(p))
+            for path in paths:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            if '"sha256"' not in line:
+                                continue
+                            try:
+                                record = json.loads(line)
+                            except ValueError:
+                                continue
+                            if record.get("event") == "intake" and record.get("stage") in ("processed", "duplicate") \
+                                    and record.get("sha256") and record.get("outcome") != "failed":
+                                self.remember(record["sha256"], record.get("invoice"), seen=record.get("ts"), save=False)
+                except OSError:
+                    continue
+        return len(self.file)
+
+    def lookup(self, sha256: str) -> dict | None:
+        """The known entry for ``sha256`` (``summary``, ``first_seen``...), or None."""
+        if not sha256:
+            return None
+        with self.file.lock:
+            entry = (self.file.entries or {}).get(sha256)
+            if entry is None:
+                return None
+            if self.max_age_days > 0 and entry["last_seen"] < time.time() - self.max_age_days * 86400:
+                return None
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.hits_total += 1
+            self.file.put(sha256, entry)
+        return dict(entry)
+
+    def remember(self, sha256: str, data: dict | None, seen: float | None = None, save: bool = True):
+        """Record a processed file; ``data`` is the host's invoice dict (only the summary is kept)."""
+        if not sha256:
+            return
+        now = round(seen or time.time(), 3)
+        summary = invoice_summary(data)
+        with self.file.lock:
+            if not self.file.loaded:
+                return  # not loaded (agent never started); the next load seeds from history
+            entry = self.file.entries.get(sha256) or {"first_seen": now, "hits": 0}
+            if summary:
+                entry["summary"] = summary
+            entry.setdefault("summary", {})
+            entry["last_seen"] = max(now, entry.get("last_seen", 0))
+            self.file.put(sha256, entry, save=save)
+
+    def forget(self, sha256: str):
+        """The invoice behind ``sha256`` is no longer in the host."""
+        self.file.pop(sha256)
+
+    def close(self):
+        """Write pending changes now (agent stopping)."""
+        self.file.close()
+
+    def status(self) -> dict:
+        return {"hashes": len(self), "hits_total": self.hits_total, "max_age_days": self.max_age_days}
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBS_DIR = os.path.join(PLUGIN_DIR, "libs")
+
+
+def _agent_frame(frames: list):
+    """Innermost frame in the plugin's own code (not bundled libs), else the innermost one, or None."""
+    for frame in reversed(frames):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(PLUGIN_DIR) and not path.startswith(LIBS_DIR):
+            return frame
+    return frames[-1] if frames else None
+
+
+def _agent_location(frames: list) -> str:
+    """Where the loop was held, e.g. 'whatsapp_client.py:1198 in poll_messages'."""
+    frame = _agent_frame(frames)
+    if frame is None:
+        return "unknown"
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """
+    Event-loop lag monitor and blocking-call detector for the agent loop.
+
+    A probe coroutine sleeps ``interval`` seconds at a time and records how late it
+    wakes up (``loop.lag``). A watchdog thread notices when the probe has not run for
+    ``block_threshold`` beyond its interval, i.e. something is holding the loop, and
+    samples the loop thread's stack right then. When the loop frees up, the stall is
+    recorded with its duration and that stack (``loop.blocked``), logged, and kept in
+    a short history for the status endpoint.
+    """
+
+    def __init__(self, metrics=None, interval: float = 0.25, block_threshold: float = 0.2,
+                 check_interval: float = 0.05, history: int = 50):
+        self.metrics = metrics
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.check_interval = check_interval
+        self.active = False
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.slow_callbacks = deque(maxlen=history)
+        self._loop = None
+        self._loop_thread_id = None
+        self._probe_task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._last_beat = 0.0
+        self._stall = None  # (detected_at, stack frames) while the loop is held
+
+    def start(self, loop=None):
+        """Start probing; call from the agent loop."""
+        if self.active:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self.active = True
+        self._probe_task = self._loop.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="WhatsAppLoopWatchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"[WA] Loop monitor active (stall threshold {int(self.block_threshold * 1000)}ms).")
+
+    def stop(self):
+        self.active = False
+        self._stop.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        self._watchdog = None
+
+    async def _probe(self):
+        # Deliberately real asyncio.sleep, not the agent clock: this measures real scheduling delay.
+        while self.active:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - started - self.interval)
+            self._last_beat = now
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if self.metrics is not None:
+                self.metrics.observe("loop.lag", lag)
+            stall, self._stall = self._stall, None
+            if stall is not None:
+                self._record_block(lag, stall)
+
+    def _watch(self):
+        limit = self.interval + self.block_threshold
+        while not self._stop.wait(self.check_interval):
+            if self._stall is not None:
+                continue
+            if time.perf_counter() - self._last_beat < limit:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            frames = traceback.extract_stack(frame) if frame is not None else []
+            self._stall = (time.time(), frames)
+
+    def _record_block(self, lag: float, stall):
+        detected_at, frames = stall
+        where = _agent_location(frames)
+        record = {
+            "at": round(detected_at, 3),
+            "duration_seconds": round(lag, 3),
+            "where": where,
+            "stack": [f"{os.path.basename(f.filename)}:{f.lineno} in {f.name}: {f.line or ''}".strip()
+                      for f in frames[-12:]],
+        }
+        self.slow_callbacks.append(record)
+        self.blocks += 1
+        if self.metrics is not None:
+            # Function only: a label per source line would grow a new series with every edit.
+            frame = _agent_frame(frames)
+            self.metrics.inc("loop.blocked", where=frame.name if frame is not None else "unknown")
+            self.metrics.observe("loop.blocked_duration", lag)
+        logger.warning(f"[WA] Agent loop blocked for {lag * 1000:.0f}ms at {where}")
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "interval_seconds": self.interval,
+            "block_threshold_seconds": self.block_threshold,
+            "max_lag_seconds": round(self.max_lag, 4),
+            "blocks": self.blocks,
+            "recent_blocks": list(self.slow_callbacks)[-10:],
+        }
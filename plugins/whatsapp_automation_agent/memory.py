@@ -0,0 +1,243 @@
+import gc
+import os
+import json
+import time
+import threading
+import tracemalloc
+from collections import Counter, deque
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBS_DIR = os.path.join(PLUGIN_DIR, "libs")
+
+# Noise from the measurement itself.
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    tracemalloc.Filter(False, __file__, all_frames=True),
+)
+
+
+def _site_label(traceback) -> str:
+    """Allocating line, plus the innermost plugin frame when the allocation happened in a library."""
+    frames = list(reversed(traceback))  # most recent call first
+    if not frames:
+        return "unknown"
+    where = f"{os.path.basename(frames[0].filename)}:{frames[0].lineno}"
+    for frame in frames:
+        path = os.path.abspath(frame.filename)
+        if path.startswith(PLUGIN_DIR) and not path.startswith(LIBS_DIR):
+            if frame is not frames[0]:
+                where += f" <- {os.path.basename(path)}:{frame.lineno}"
+            break
+    return where
+
+
+class MemoryMonitor:
+    """
+    tracemalloc snapshots of the agent process, diffed against the previous snapshot.
+
+    Each snapshot reports the allocation sites that grew the most since the last one,
+    the Python object types whose counts grew (e.g. Playwright ``Locator``s, closures,
+    coroutines) and the sizes of the client's own long-lived state from ``state_probe``.
+    Snapshots run in a worker thread, on request or every ``interval`` seconds, and each
+    report is written to ``output_dir`` as JSON. Tracing starts with the first request;
+    allocations made before that are not attributed. Requests are refused while
+    ``is_agent_running`` says the agent is idle, so the host never traces on its own.
+    """
+
+    def __init__(self, output_dir: str, state_probe=None, top: int = 20, nframes: int = 8, keep: int = 50,
+                 is_agent_running=None):
+        self.output_dir = output_dir
+        self.state_probe = state_probe
+        self.is_agent_running = is_agent_running
+        self.top = top
+        self.nframes = nframes
+        self.keep = keep
+        self.interval = 0.0
+        self.active = False
+        self.snapshots = 0
+        self.last_report = None
+        self.last_report_path = ""
+        self.reports = deque(maxlen=24)
+        self._started_tracing = False
+        self._previous = None
+        self._previous_types = None
+        self._previous_state = None
+        self._requested = deque()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, interval: float = 0.0):
+        """Start tracing and the worker; ``interval`` > 0 also snapshots on a schedule."""
+        self.interval = max(0.0, float(interval))
+        if self.active:
+            self._wakeup.set()  # pick up the new interval
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started_tracing = True
+        self.active = True
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, args=(self._stop,), name="WhatsAppMemoryMonitor", daemon=True)
+        self._thread.start()
+        schedule = f"every {self.interval / 60:.0f} min" if self.interval else "on demand"
+        logger.info(f"[WA] Memory snapshots active ({schedule}).")
+        # Baseline for the first diff.
+        self._requested.append("baseline")
+        self._wakeup.set()
+
+    def stop(self):
+        """Stop the worker; tracing is stopped too if this monitor started it."""
+        if not self.active:
+            return
+        self.active = False
+        self._stop.set()
+        self._wakeup.set()
+        self._thread = None
+        self._previous = None
+        self._previous_types = None
+        self._previous_state = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def request_snapshot(self, label: str = "manual") -> tuple[bool, str]:
+        """Queue a snapshot; callable from any thread."""
+        if not self.active and self.is_agent_running is not None and not self.is_agent_running():
+            # Tracing would stay on (and slow the whole app) until the agent next stops.
+            return False, "WhatsApp Agent is not running."
+        if not self.active:
+            self.start(self.interval)
+            return True, "Memory tracing started; this first snapshot is the baseline for later diffs."
+        if len(self._requested) >= 4:
+            return False, "Memory snapshots are already queued."
+        self._requested.append(label)
+        self._wakeup.set()
+        return True, "Memory snapshot queued."
+
+    def _worker(self, stop_event):
+        next_scheduled = None
+        while not stop_event.is_set():
+            timeout = max(0.0, next_scheduled - time.monotonic()) if next_scheduled is not None else None
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            if stop_event.is_set():
+                break
+            if not self.interval:
+                next_scheduled = None
+            elif next_scheduled is None:
+                next_scheduled = time.monotonic() + self.interval
+            labels = []
+            while self._requested:
+                labels.append(self._requested.popleft())
+            if next_scheduled is not None and time.monotonic() >= next_scheduled:
+                labels.append("scheduled")
+                next_scheduled = time.monotonic() + self.interval
+            if labels:
+                # Requests that piled up would only diff against each other; take one.
+                self._snapshot(labels[0])
+
+    def _snapshot(self, label: str):
+        try:
+            started = time.perf_counter()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+            traced, peak = tracemalloc.get_traced_memory()
+            types = Counter(type(obj).__name__ for obj in gc.get_objects())
+            state = self._probe_state()
+            report = {
+                "at": round(time.time(), 3),
+                "label": label,
+                "snapshot": self.snapshots + 1,
+                "traced_mb": round(traced / 1024 / 1024, 2),
+                "peak_mb": round(peak / 1024 / 1024, 2),
+                "growing_sites": self._growing_sites(snapshot),
+                "object_types": dict(types.most_common(self.top)),
+                "growing_types": self._growing(types, self._previous_types),
+                "state": state,
+                "state_growth": self._growing(state, self._previous_state),
+            }
+            self._previous, self._previous_types, self._previous_state = snapshot, types, state
+            report["duration_seconds"] = round(time.perf_counter() - started, 3)
+            self.snapshots += 1
+            self.last_report = report
+            self.reports.append({key: report[key] for key in ("at", "label", "traced_mb", "state")})
+            self._write(report)
+            growth = sum(site["size_diff_kb"] for site in report["growing_sites"])
+            top_site = report["growing_sites"][0]["where"] if report["growing_sites"] else "-"
+            logger.info(
+                f"[WA] Memory snapshot #{report['snapshot']} ({label}): {report['traced_mb']:.1f} MB traced, "
+                f"+{growth:.0f} KB in top sites (largest: {top_site})"
+            )
+        except Exception as e:
+            logger.warning(f"[WA] Memory snapshot failed: {e}")
+
+    def _probe_state(self) -> dict:
+        if self.state_probe is None:
+            return {}
+        try:
+            return dict(self.state_probe())
+        except Exception as e:
+            logger.warning(f"[WA] Could not read client state sizes: {e}")
+            return {}
+
+    def _growing_sites(self, snapshot) -> list:
+        if self._previous is None:
+            return []
+        sites = []
+        for stat in snapshot.compare_to(self._previous, "traceback"):
+            if stat.size_diff <= 0:
+                continue
+            sites.append({
+                "where": _site_label(stat.traceback),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff,
+                "size_kb": round(stat.size / 1024, 1),
+                "stack": [f"{os.path.basename(f.filename)}:{f.lineno}" for f in reversed(stat.traceback)],
+            })
+            if len(sites) >= self.top:
+                break
+        return sites
+
+    def _growing(self, current, previous) -> dict:
+        if previous is None:
+            return {}
+        growth = {key: current[key] - previous.get(key, 0) for key in current}
+        ordered = sorted(((k, v) for k, v in growth.items() if v > 0), key=lambda item: item[1], reverse=True)
+        return dict(ordered[:self.top])
+
+    def _write(self, report: dict):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"memory_{time.strftime('%Y%m%d_%H%M%S')}_{report['snapshot']}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1, default=str)
+            self.last_report_path = path
+            reports = sorted(name for name in os.listdir(self.output_dir) if name.startswith("memory_"))
+            for name in reports[:-self.keep]:
+                os.remove(os.path.join(self.output_dir, name))
+        except OSError as e:
+            logger.warning(f"[WA] Could not write memory report: {e}")
+
+    def status(self) -> dict:
+        last = self.last_report or {}
+        return {
+            "active": self.active,
+            "tracing": tracemalloc.is_tracing(),
+            "interval_seconds": self.interval,
+            "snapshots": self.snapshots,
+            "last_report_path": self.last_report_path,
+            "traced_mb": last.get("traced_mb"),
+            "growing_sites": [
+                {key: site[key] for key in ("where", "size_diff_kb", "count_diff")}
+                for site in last.get("growing_sites", [])[:5]
+            ],
+            "growing_types": dict(list(last.get("growing_types", {}).items())[:5]),
+            "state": last.get("state", {}),
+            "history": list(self.reports),
+        }
@@ -0,0 +1,271 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the last implicit bucket is +Inf.
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 45.0, 90.0,
+)
+
+
+def _label_key(labels: dict) -> tuple:
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    __slots__ = ("name", "labels", "value", "_lock")
+
+    def __init__(self, name: str, labels: tuple):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    __slots__ = ("name", "labels", "value", "_lock")
+
+    def __init__(self, name: str, labels: tuple):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+
+class Histogram:
+    """Fixed-bucket histogram: O(log buckets) observe, no per-sample storage."""
+
+    __slots__ = ("name", "labels", "buckets", "counts", "count", "sum", "max", "_lock")
+
+    def __init__(self, name: str, labels: tuple, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def read(self) -> tuple:
+        """Consistent (counts, sum, max) copy."""
+        with self._lock:
+            return list(self.counts), self.sum, self.max
+
+    def percentile(self, q: float, counts=None) -> float:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        counts = counts if counts is not None else list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for idx, bucket_count in enumerate(counts):
+            upper = self.buckets[idx] if idx < len(self.buckets) else max(self.max, lower)
+            if bucket_count and seen + bucket_count >= rank:
+                fraction = (rank - seen) / bucket_count
+                return lower + (upper - lower) * fraction
+            seen += bucket_count
+            lower = upper
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and latency histograms for the agent pipeline.
+
+    Recording is a dict lookup plus a locked increment, cheap enough to stay on in
+    production. Metrics are written from the agent loop and from helper threads (host
+    callbacks, intake, downloads), so every update takes the metric's lock; ``snapshot``
+    may be called from any thread and works on copies.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._metrics = {}
+        self._budgets = {}
+        self._budget_handler = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def set_budgets(self, budgets: dict, handler):
+        """Call handler(name, seconds, labels) whenever a stage exceeds its latency budget."""
+        self._budgets = dict(budgets or {})
+        self._budget_handler = handler if self._budgets else None
+
+    def _get(self, cls, name: str, labels: dict, **kwargs):
+        key = (name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, key[1], **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name: str, buckets=None, **labels) -> Histogram:
+        if buckets is None:
+            return self._get(Histogram, name, labels)
+        return self._get(Histogram, name, labels, buckets=buckets)
+
+    def inc(self, name: str, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def observe(self, name: str, seconds: float, **labels):
+        self.histogram(name, **labels).observe(seconds)
+        if self._budget_handler is not None:
+            self._check_budget(name, seconds, labels)
+
+    def _check_budget(self, name: str, seconds: float, labels: dict):
+        budget = self._budgets.get(name)
+        if budget is not None and seconds > budget:
+            try:
+                self._budget_handler(name, seconds, labels)
+            except Exception:
+                pass
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block (including awaits inside it) into a latency histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        """Point-in-time view with p50/p95/p99 and throughput for every histogram."""
+        uptime = max(time.time() - self.started_at, 1e-6)
+        counters = []
+        gauges = []
+        histograms = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            labels = dict(metric.labels)
+            if isinstance(metric, Counter):
+                counters.append({
+                    "name": metric.name,
+                    "labels": labels,
+                    "value": metric.value,
+                    "rate_per_minute": round(metric.value / uptime * 60, 3),
+                })
+            elif isinstance(metric, Gauge):
+                gauges.append({"name": metric.name, "labels": labels, "value": metric.value})
+            else:
+                counts, total_sum, peak = metric.read()
+                total = sum(counts)
+                histograms.append({
+                    "name": metric.name,
+                    "labels": labels,
+                    "count": total,
+                    "sum": round(total_sum, 6),
+                    "max": round(peak, 6),
+                    "p50": round(metric.percentile(0.50, counts), 6),
+                    "p95": round(metric.percentile(0.95, counts), 6),
+                    "p99": round(metric.percentile(0.99, counts), 6),
+                    "throughput_per_minute": round(total / uptime * 60, 3),
+                    "buckets": list(metric.buckets),
+                    "bucket_counts": counts,
+                })
+        return {
+            "uptime_seconds": round(uptime, 3),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+
+def _prometheus_name(prefix: str, name: str) -> str:
+    return f"{prefix}_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+
+def _prometheus_labels(labels: dict, extra: dict | None = None) -> str:
+    merged = dict(labels or {})
+    if extra:
+        merged.update(extra)
+    if not merged:
+        return ""
+    parts = []
+    for key, value in sorted(merged.items()):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def format_prometheus(snapshot: dict, prefix: str = "whatsapp_agent") -> str:
+    """Render a registry snapshot in the Prometheus text exposition format."""
+    lines = [
+        f"# TYPE {prefix}_uptime_seconds gauge",
+        f"{prefix}_uptime_seconds {snapshot.get('uptime_seconds', 0)}",
+    ]
+    # Families must be contiguous, hence the sort by name below.
+    declared = set()
+
+    for item in sorted(snapshot.get("counters", []), key=lambda entry: entry["name"]):
+        name = _prometheus_name(prefix, item["name"]) + "_total"
+        if name not in declared:
+            lines.append(f"# TYPE {name} counter")
+            declared.add(name)
+        lines.append(f"{name}{_prometheus_labels(item['labels'])} {item['value']}")
+
+    for item in sorted(snapshot.get("gauges", []), key=lambda entry: entry["name"]):
+        name = _prometheus_name(prefix, item["name"])
+        if name not in declared:
+            lines.append(f"# TYPE {name} gauge")
+            declared.add(name)
+        lines.append(f"{name}{_prometheus_labels(item['labels'])} {item['value']}")
+
+    for item in sorted(snapshot.get("histograms", []), key=lambda entry: entry["name"]):
+        name = _prometheus_name(prefix, item["name"]) + "_seconds"
+        if name not in declared:
+            lines.append(f"# TYPE {name} histogram")
+            declared.add(name)
+        cumulative = 0
+        counts = item["bucket_counts"]
+        for bound, bucket_count in zip(item["buckets"], counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_prometheus_labels(item['labels'], {'le': bound})} {cumulative}")
+        cumulative += counts[-1]
+        lines.append(f"{name}_bucket{_prometheus_labels(item['labels'], {'le': '+Inf'})} {cumulative}")
+        lines.append(f"{name}_sum{_prometheus_labels(item['labels'])} {item['sum']}")
+        lines.append(f"{name}_count{_prometheus_labels(item['labels'])} {item['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,13 @@
+import os
+import sys
+
+
+def data_dir(*parts: str) -> str:
+    """Per-user data directory, outside the plugin folder (which the registry script walks and publishes)."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "InvoicesReader", "whatsapp_agent", *parts)
@@ -0,0 +1,165 @@
+import os
+import time
+import importlib.util
+from core.plugins.sdk import get_logger
+from .downloads import default_downloads_dir
+from .index_file import IndexFile
+from .known_hashes import invoice_summary
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = get_logger(__name__)
+
+INDEX_NAME = "perceptual_index.json"
+MODE_OFF = "off"
+MODE_FLAG = "flag"  # queue it, with the likely original in the metadata
+MODE_HOLD = "hold"  # do not queue it; the sender is told which invoice it looks like
+# 16x16 difference hash: 256 bits, fine enough that two invoices on one supplier's template
+# still differ by far more than two photos of the same sheet.
+DEFAULT_HASH_SIZE = 16
+DEFAULT_THRESHOLD = 20
+
+
+def backend() -> str:
+    """Which image library the hash uses here ('' when there is none)."""
+    if Image is not None:
+        return "PIL"
+    try:
+        if importlib.util.find_spec("PyQt5") is not None:
+            return "QImage"
+    except (ImportError, ValueError):
+        pass  # ValueError: a stand-in module without a spec
+    return ""
+
+
+def _gray_pixels(path: str, width: int, height: int) -> list | None:
+    """``path`` scaled to ``width`` x ``height``, grayscale, row by row."""
+    if Image is not None:
+        with Image.open(path) as img:
+            img.draft("L", (width * 8, height * 8))  # JPEG: decode at reduced size
+            small = img.convert("L").resize((width, height), Image.BILINEAR)
+            return list(small.getdata())
+    if backend() == "QImage":
+        # Imported on first use, so loading this module does not pull in Qt.
+        from PyQt5.QtGui import QImage
+        from PyQt5.QtCore import Qt
+        img = QImage(path)
+        if img.isNull():
+            return None
+        small = img.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        small = small.convertToFormat(QImage.Format_Grayscale8)
+        stride = small.bytesPerLine()
+        bits = small.constBits()
+        bits.setsize(stride * height)
+        raw = bytes(bits)
+        return [raw[y * stride + x] for y in range(height) for x in range(width)]
+    return None
+
+
+def image_dhash(path: str, hash_size: int = DEFAULT_HASH_SIZE) -> int | None:
+    """Difference hash of an image (one bit per horizontally adjacent pixel pair), or None."""
+    try:
+        pixels = _gray_pixels(path, hash_size + 1, hash_size)
+    except Exception as e:
+        logger.warning(f"[WA] Could not hash {os.path.basename(path)}: {e}")
+        return None
+    if not pixels:
+        return None
+    value = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            value = (value << 1) | (row[x] < row[x + 1])
+    return value
+
+
+class PerceptualIndex:
+    """
+    Difference hashes of the images the agent has queued, keyed by file SHA-256, so a new
+    photo of the same paper invoice can be recognised although its bytes differ.
+
+    ``nearest`` is a linear Hamming-distance scan; at the default 5000 entries that is a
+    few milliseconds. Entries get the invoice summary from the host's completed events
+    and are dropped when processing fails.
+    """
+
+    def __init__(self, path: str = "", max_entries: int = 5000, max_age_days: float = 90,
+                 mode: str = MODE_OFF, threshold: int = DEFAULT_THRESHOLD, hash_size: int = DEFAULT_HASH_SIZE):
+        self.file = IndexFile(path or os.path.join(os.path.dirname(default_downloads_dir()), INDEX_NAME),
+                              "hashes", max_entries, label="perceptual index")
+        self.max_age_days = max_age_days
+        self.mode = mode
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.checked_total = 0
+        self.flagged_total = 0
+        self.held_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in (MODE_FLAG, MODE_HOLD) and bool(backend())
+
+    def __len__(self):
+        return len(self.file)
+
+    def load(self):
+        """Read the index; blocking. The journal has no image hashes, so a new one starts empty."""
+        self.file.load()
+
+    def close(self):
+        self.file.close()
+
+    def nearest(self, dhash: int, exclude: str = ""):
+        """(sha256, entry, distance) of the closest indexed image within ``threshold``, or None."""
+        self.checked_total += 1
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else 0
+        best = None
+        with self.file.lock:
+            for sha256, entry in (self.file.entries or {}).items():
+                if sha256 == exclude or entry["last_seen"] < cutoff or entry.get("size") != self.hash_size:
+                    continue
+                distance = bin(dhash ^ int(entry["dhash"], 16)).count("1")
+                if distance <= self.threshold and (best is None or distance < best[2]):
+                    best = (sha256, dict(entry), distance)
+        return best
+
+    def add(self, sha256: str, dhash: int, message_key: str = ""):
+        """Index a queued image (its summary follows once the host has processed it)."""
+        now = round(time.time(), 3)
+        self.file.put(sha256, {
+            "dhash": f"{dhash:x}", "size": self.hash_size, "message_key": message_key,
+            "summary": {}, "first_seen": now, "last_seen": now, "hits": 0,
+        })
+
+    def remember(self, sha256: str, data: dict | None):
+        """Attach the host's invoice summary to an indexed image; other files are ignored."""
+        summary = invoice_summary(data)
+        with self.file.lock:
+            entry = (self.file.entries or {}).get(sha256)
+            if entry is None:
+                return
+            if summary:
+                entry["summary"] = summary
+            entry["last_seen"] = max(round(time.time(), 3), entry.get("last_seen", 0))
+            self.file.put(sha256, entry)
+
+    def forget(self, sha256: str):
+        """Processing failed: the image must not stand in for the invoice."""
+        self.file.pop(sha256)
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "backend": backend() or None,
+            "images": len(self),
+            "threshold_bits": self.threshold,
+            "hash_bits": self.hash_size * self.hash_size,
+            "checked_total": self.checked_total,
+            "flagged_total": self.flagged_total,
+            "held_total": self.held_total,
+            # Every held photo is one AI extraction the host did not have to run.
+            "extraction_runs_saved": self.held_total,
+        }
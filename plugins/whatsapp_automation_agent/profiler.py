@@ -0,0 +1,177 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_MODES = ("sampling", "cprofile")
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class AgentProfiler:
+    """
+    On-demand CPU profiler for the agent thread only.
+
+    ``sampling`` (default) reads the agent thread's stack from a separate thread every
+    ``interval`` seconds and writes collapsed stacks (``a;b;c count``, loadable by
+    flamegraph.pl / speedscope). ``cprofile`` enables ``cProfile`` on the agent loop's own
+    thread and writes a ``.pstats`` file. Both stop after the requested duration and
+    write a ``.txt`` top-N summary next to the profile; no work runs on the UI thread.
+    Sampling is preferred on customer machines: it installs no hooks in any thread.
+    It only sees the agent thread when the GIL changes hands, so CPU bursts shorter
+    than the switch interval (5 ms) are under-sampled; ``cprofile`` counts every call.
+    """
+
+    def __init__(self, output_dir: str, interval: float = 0.005, top: int = 25):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top = top
+        self.active = False
+        self.mode = ""
+        self.started_at = 0.0
+        self.duration = 0.0
+        self.last_profile_path = ""
+        self.last_summary = ""
+        self._stop = threading.Event()
+        self._thread = None
+        self._cprofile = None
+        self._loop = None
+        self._stop_handle = None
+
+    def start(self, loop, thread_id: int, seconds: float = 30, mode: str = "sampling") -> tuple[bool, str]:
+        """Profile the agent for ``seconds``; ``loop``/``thread_id`` identify the agent thread."""
+        if self.active:
+            return False, "A profile is already running."
+        if mode not in PROFILE_MODES:
+            return False, f"Unknown profiling mode '{mode}'."
+        if loop is None or not loop.is_running() or not thread_id:
+            return False, "Agent loop is not running."
+        self.mode = mode
+        self.duration = max(1.0, float(seconds))
+        self.started_at = time.time()
+        self._loop = loop
+        self._stop.clear()
+        self.active = True
+        if mode == "sampling":
+            self._thread = threading.Thread(
+                target=self._sample, args=(thread_id,), name="WhatsAppProfiler", daemon=True
+            )
+            self._thread.start()
+        else:
+            # cProfile hooks the thread that enables it, so enable/disable on the agent loop.
+            self._cprofile = cProfile.Profile()
+            loop.call_soon_threadsafe(self._cprofile_begin)
+        logger.info(f"[WA] Profiling agent thread ({mode}) for {self.duration:.0f}s.")
+        return True, f"Profiling agent for {self.duration:.0f}s ({mode})."
+
+    def stop(self):
+        """Stop early; the profile collected so far is still written."""
+        if not self.active:
+            return
+        if self.mode == "sampling":
+            self._stop.set()
+        elif self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._cprofile_end)
+        else:
+            self._cprofile = None
+            self.active = False
+
+    def _output_base(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{self.mode}")
+
+    def _sample(self, thread_id: int):
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + self.duration
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break  # agent thread exited
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stacks[";".join(reversed(labels))] += 1
+                samples += 1
+                self._stop.wait(self.interval)
+            self._write_collapsed(stacks, samples)
+        except Exception as e:
+            logger.warning(f"[WA] Sampling profiler failed: {e}")
+        finally:
+            self.active = False
+
+    def _write_collapsed(self, stacks: Counter, samples: int):
+        base = self._output_base()
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self_counts = Counter()
+        inclusive = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+        lines = [f"Sampling profile of the agent thread: {samples} samples every {self.interval * 1000:.0f}ms", ""]
+        for title, counter in (("Self time (leaf frames)", self_counts), ("Inclusive time", inclusive)):
+            lines.append(title)
+            for label, count in counter.most_common(self.top):
+                lines.append(f"  {count / max(samples, 1):7.1%}  {count:>7}  {label}")
+            lines.append("")
+        self._finish(f"{base}.collapsed", f"{base}.txt", "\n".join(lines))
+
+    def _cprofile_begin(self):
+        self._cprofile.enable()
+        self._stop_handle = self._loop.call_later(self.duration, self._cprofile_end)
+
+    def _cprofile_end(self):
+        if self._cprofile is None:
+            return
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+        profile, self._cprofile = self._cprofile, None
+        profile.disable()
+        # Writing stats is file I/O; keep it off the agent loop.
+        threading.Thread(target=self._write_pstats, args=(profile,), name="WhatsAppProfilerWriter", daemon=True).start()
+
+    def _write_pstats(self, profile):
+        try:
+            base = self._output_base()
+            profile.dump_stats(f"{base}.pstats")
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(self.top)
+            stats.sort_stats("tottime").print_stats(self.top)
+            self._finish(f"{base}.pstats", f"{base}.txt", text.getvalue())
+        except Exception as e:
+            logger.warning(f"[WA] Could not write cProfile output: {e}")
+        finally:
+            self.active = False
+
+    def _finish(self, profile_path: str, summary_path: str, summary: str):
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        self.last_profile_path = profile_path
+        self.last_summary = summary
+        logger.info(f"[WA] Agent profile written: {profile_path} (summary {summary_path})")
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "mode": self.mode,
+            "started_at": self.started_at or None,
+            "duration_seconds": self.duration,
+            "last_profile_path": self.last_profile_path,
+        }
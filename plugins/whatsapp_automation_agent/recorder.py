@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+# Hosts served by WhatsApp Web; HAR recording and replay are limited to these.
+WHATSAPP_HOSTS = re.compile(r"^https?://([^/]*\.)?(whatsapp\.com|whatsapp\.net|wa\.me)(:\d+)?/")
+
+# Serializes the DOM regions the agent works on. Blob images are inlined as data URLs
+# (blob URLs die with the page) so a replay can turn them back into blobs.
+_SNAPSHOT_SCRIPT = """
+(opts) => {
+    const inline = (node) => {
+        if (!node) return "";
+        const clone = node.cloneNode(true);
+        const originals = node.querySelectorAll("img");
+        const copies = clone.querySelectorAll("img");
+        originals.forEach((img, idx) => {
+            const src = img.getAttribute("src") || "";
+            if (!src.startsWith("blob:") || !img.complete || !img.naturalWidth) return;
+            try {
+                const canvas = document.createElement("canvas");
+                canvas.width = img.naturalWidth;
+                canvas.height = img.naturalHeight;
+                canvas.getContext("2d").drawImage(img, 0, 0);
+                copies[idx].setAttribute("src", canvas.toDataURL("image/jpeg", 0.8));
+                copies[idx].setAttribute("data-recorded-blob", "1");
+            } catch (e) {}
+        });
+        clone.querySelectorAll("script").forEach((s) => s.remove());
+        return clone.outerHTML;
+    };
+    const result = {
+        url: location.href,
+        pane_side: opts.pane ? inline(document.querySelector("#pane-side")) : "",
+        main: opts.main ? inline(document.querySelector("#main")) : "",
+        body: opts.body ? inline(document.body) : "",
+    };
+    if (opts.head) {
+        result.head = {
+            stylesheets: Array.from(document.querySelectorAll("link[rel='stylesheet']")).map((l) => l.href),
+            styles: Array.from(document.querySelectorAll("style")).map((s) => s.textContent),
+            lang: document.documentElement.lang || "",
+            dir: document.documentElement.dir || "",
+        };
+    }
+    return result;
+}
+"""
+
+
+class SessionRecorder:
+    """
+    Captures real WhatsApp Web sessions for offline replay.
+
+    A recording directory holds ``snapshots.jsonl`` (DOM of the chat list, the open chat
+    and, for overlay stages, the whole body, taken at the pipeline's stage boundaries),
+    ``network.har`` (WhatsApp-hosted requests via ``route_from_har(update=True)``; the
+    HAR is written when the browser context closes), ``media/`` (files the agent
+    downloaded, keyed by message) and ``meta.json``. Recordings contain message content
+    and stay on this machine.
+    """
+
+    def __init__(self, recordings_dir: str, max_bytes: int = 100 * 1024 * 1024, min_interval: float = 2.0):
+        self.recordings_dir = recordings_dir
+        self.max_bytes = max_bytes
+        self.min_interval = min_interval
+        self.active = False
+        self.session_dir = ""
+        self.snapshots_written = 0
+        self.bytes_written = 0
+        self.media_recorded = 0
+        self._started = 0.0
+        self._seq = 0
+        self._head_written = False
+        self._last_hash = {}
+        self._last_capture = {}
+        self._full_logged = False
+        self._media_index = {}
+
+    async def start(self, context) -> bool:
+        """Open a new recording and start capturing WhatsApp network traffic as HAR."""
+        if self.active:
+            return True
+        self.session_dir = os.path.join(self.recordings_dir, time.strftime("%Y%m%d_%H%M%S"))
+        try:
+            os.makedirs(os.path.join(self.session_dir, "media"), exist_ok=True)
+            await context.route_from_har(
+                os.path.join(self.session_dir, "network.har"),
+                url=WHATSAPP_HOSTS,
+                update=True,
+                update_content="embed",
+                update_mode="minimal",
+            )
+        except Exception as e:
+            logger.warning(f"[WA] Could not start session recorder: {e}")
+            return False
+        self.active = True
+        self._started = time.monotonic()
+        self._seq = 0
+        self.snapshots_written = 0
+        self.bytes_written = 0
+        self.media_recorded = 0
+        self._head_written = False
+        self._full_logged = False
+        self._last_hash = {}
+        self._last_capture = {}
+        self._media_index = {}
+        self._write_meta(finished=False)
+        logger.info(f"[WA] Recording session to {self.session_dir}")
+        return True
+
+    async def stop(self):
+        """Finish the recording (close the browser context first so the HAR is flushed)."""
+        if not self.active:
+            return
+        self.active = False
+        try:
+            await asyncio.to_thread(self._write_meta, True)
+        except Exception:
+            pass
+        logger.info(f"[WA] Session recording finished: {self.snapshots_written} snapshots, {self.media_recorded} media files.")
+
+    async def capture(self, page, label: str, full_body: bool = False, **meta):
+        """Snapshot the chat list and open chat (or the whole body for overlay stages)."""
+        if not self.active or page is None:
+            return
+        if self.bytes_written >= self.max_bytes:
+            if not self._full_logged:
+                self._full_logged = True
+                logger.warning(f"[WA] Session recording reached {self.max_bytes // (1024 * 1024)}MB; snapshots paused.")
+            return
+        now = time.monotonic()
+        if label == "chat_list" and now - self._last_capture.get(label, 0.0) < self.min_interval:
+            return
+        try:
+            snapshot = await page.evaluate(_SNAPSHOT_SCRIPT, {
+                "pane": label == "chat_list" or not full_body,
+                "main": not full_body,
+                "body": full_body,
+                "head": not self._head_written,
+            })
+        except Exception as e:
+            logger.debug(f"[WA] Recorder snapshot '{label}' failed: {e}")
+            return
+        self._last_capture[label] = now
+
+        head = snapshot.pop("head", None)
+        digest = hashlib.sha1(
+            (snapshot.get("pane_side", "") + snapshot.get("main", "") + snapshot.get("body", "")).encode("utf-8", "ignore")
+        ).hexdigest()
+        dedup_key = (label, meta.get("message_key") or meta.get("phone") or "")
+        if self._last_hash.get(dedup_key) == digest:
+            return
+        self._last_hash[dedup_key] = digest
+
+        self._seq += 1
+        record = {"seq": self._seq, "t": round(now - self._started, 3), "label": label, "meta": meta}
+        record.update(snapshot)
+        try:
+            await asyncio.to_thread(self._append, record, head)
+        except Exception as e:
+            logger.debug(f"[WA] Recorder write failed: {e}")
+
+    async def record_media(self, message_key: str, file_path: str):
+        """Keep a copy of a downloaded file so replays can serve it for the same message."""
+        if not self.active or not message_key or not file_path:
+            return
+        if message_key in self._media_index or self.bytes_written >= self.max_bytes:
+            return
+        name = hashlib.sha1(message_key.encode("utf-8")).hexdigest()[:16] + "_" + os.path.basename(file_path)
+        self._media_index[message_key] = name  # claimed now, so a concurrent call does not copy it twice
+        await asyncio.to_thread(self._copy_media, message_key, file_path, name)
+
+    def _copy_media(self, message_key: str, file_path: str, name: str):
+        try:
+            shutil.copy2(file_path, os.path.join(self.session_dir, "media", name))
+        except Exception as e:
+            self._media_index.pop(message_key, None)
+            logger.debug(f"[WA] Recorder could not copy media: {e}")
+            return
+        self.media_recorded += 1
+        self.bytes_written += os.path.getsize(file_path)
+        try:
+            self._write_meta(finished=False)
+        except Exception:
+            pass
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "session_dir": self.session_dir,
+            "snapshots": self.snapshots_written,
+            "media": self.media_recorded,
+            "bytes": self.bytes_written,
+        }
+
+    def _append(self, record: dict, head):
+        if head is not None and not self._head_written:
+            with open(os.path.join(self.session_dir, "head.json"), "w", encoding="utf-8") as f:
+                json.dump(head, f)
+            self._head_written = True
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with open(os.path.join(self.session_dir, "snapshots.jsonl"), "a", encoding="utf-8") as f:
+            f.write(line)
+        self.snapshots_written += 1
+        self.bytes_written += len(line)
+
+    def _write_meta(self, finished: bool):
+        meta = {
+            "format": 1,
+            "recorded_at": os.path.basename(self.session_dir),
+            "finished": finished,
+            "duration_seconds": round(time.monotonic() - self._started, 3) if self._started else 0,
+            "snapshots": self.snapshots_written,
+            "media": dict(self._media_index),
+        }
+        with open(os.path.join(self.session_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
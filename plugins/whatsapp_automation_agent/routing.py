@@ -0,0 +1,89 @@
+import re
+import time
+from collections import OrderedDict
+
+
+def chat_key(value) -> str:
+    """
+    Normalize a phone number or chat title into a comparable chat identity.
+
+    Names keep their letters in any script (``\\w``), so Arabic titles do not collapse to "".
+    """
+    text = str(value or "").lower().strip()
+    if not text:
+        return ""
+    digits = re.sub(r"\D", "", text)
+    if len(digits) >= 7:
+        # Country codes and leading zeros vary between sources; the tail is stable.
+        return digits[-9:]
+    return re.sub(r"[^\w]", "", text)
+
+
+class ChatRoute:
+    """Where an incoming message was seen: its chat row, sender phone and list position."""
+
+    __slots__ = ("message_key", "chat", "row_id", "phone", "title", "offset", "seen_at")
+
+    def __init__(self, message_key: str, chat: str, row_id: str = "", phone: str = "",
+                 title: str = "", offset=None, seen_at: float = 0.0):
+        self.message_key = message_key
+        self.chat = chat
+        self.row_id = row_id
+        self.phone = phone
+        self.title = title
+        self.offset = offset
+        self.seen_at = seen_at
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ChatRoutingIndex:
+    """
+    Bounded index from ``whatsapp_message_key`` to the chat the message arrived in.
+
+    Filled at intake, while the chat is open, so late source-processing notices can go
+    straight back to the right chat instead of guessing a phone number from titles.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._routes = OrderedDict()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def record(self, message_key: str, row_id: str = "", phone: str = "", title: str = "",
+               offset=None) -> ChatRoute | None:
+        """Remember the chat for a message key, evicting the oldest entries past the bound."""
+        if not message_key:
+            return None
+
+        normalized_phone = re.sub(r"\D", "", str(phone or ""))
+        if not 9 <= len(normalized_phone) <= 15:
+            normalized_phone = ""
+        clean_title = str(title or "").strip()
+
+        route = ChatRoute(
+            message_key=message_key,
+            chat=chat_key(normalized_phone or clean_title),
+            row_id=str(row_id or ""),
+            phone=normalized_phone,
+            title=clean_title,
+            offset=offset,
+            seen_at=time.time(),
+        )
+        self._routes[message_key] = route
+        self._routes.move_to_end(message_key)
+        while len(self._routes) > self.max_entries:
+            self._routes.popitem(last=False)
+        return route
+
+    def lookup(self, message_key: str) -> ChatRoute | None:
+        if not message_key:
+            return None
+        return self._routes.get(message_key)
+
+    def lookup_metadata(self, metadata: dict | None = None) -> ChatRoute | None:
+        """Route for the message referenced by source-processing metadata."""
+        return self.lookup(str((metadata or {}).get("whatsapp_message_key") or ""))
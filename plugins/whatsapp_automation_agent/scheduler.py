@@ -0,0 +1,239 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from core.plugins.sdk import get_logger
+from .routing import chat_key
+
+logger = get_logger(__name__)
+
+# Lower value = more urgent. A lease holder only yields to strictly more urgent jobs.
+PRIORITY_USER = 0
+PRIORITY_NOTICE = 1
+PRIORITY_INBOUND = 2
+
+
+class PageJob:
+    """A unit of page work targeting one chat (empty chat = no affinity)."""
+
+    __slots__ = ("seq", "priority", "chat", "label", "factory", "future", "submitted_at")
+
+    def __init__(self, seq: int, priority: int, chat: str, label: str, factory, future):
+        self.seq = seq
+        self.priority = priority
+        self.chat = chat
+        self.label = label
+        self.factory = factory
+        self.future = future
+        self.submitted_at = time.perf_counter()
+
+
+class PageScheduler:
+    """
+    Cooperative owner of the single WhatsApp Web page.
+
+    Every page action runs either as a queued job (executed by ``serve``) or inside a
+    ``lease`` held by a long-running routine such as the inbound sweep. Ready jobs are
+    ordered by priority, then by affinity to the currently open chat, then FIFO, so
+    replies for an open chat are flushed before the page moves elsewhere. Lease holders
+    call ``checkpoint`` between chats to let more urgent work run without waiting for
+    the whole sweep.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.current_chat = ""
+        self._jobs = []
+        self._seq = itertools.count()
+        self._owner_task = None
+        self._owner_priority = None
+        self._page_lock = None
+        self._wakeup = None
+        self._resumed = None
+        self._paused = False
+        self._stopped = False
+        self.jobs_run = 0
+        self.chat_switches = 0
+
+    def _ensure_primitives(self):
+        if self._page_lock is None:
+            self._page_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._resumed = asyncio.Event()
+            if not self._paused:
+                self._resumed.set()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._jobs)
+
+    def pending_by_priority(self) -> dict:
+        counts = {}
+        for job in self._jobs:
+            counts[job.priority] = counts.get(job.priority, 0) + 1
+        return counts
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pause(self):
+        """Hold queued jobs (e.g. while WhatsApp is disconnected); they stay queued."""
+        self._paused = True
+        if self._resumed is not None:
+            self._resumed.clear()
+
+    def resume(self):
+        self._paused = False
+        if self._resumed is not None:
+            self._resumed.set()
+
+    def note_chat(self, chat: str):
+        """Record which chat the page currently shows."""
+        chat = chat or ""
+        if chat and chat != self.current_chat:
+            if self.current_chat:
+                self.chat_switches += 1
+                if self.metrics is not None:
+                    self.metrics.inc("scheduler.chat_switches")
+            self.current_chat = chat
+
+    def submit(self, factory, chat: str = "", priority: int = PRIORITY_NOTICE, label: str = ""):
+        """Queue a coroutine factory and return a future for its result."""
+        self._ensure_primitives()
+        future = asyncio.get_running_loop().create_future()
+        job = PageJob(next(self._seq), priority, chat or "", label or "job", factory, future)
+        self._jobs.append(job)
+        self._wakeup.set()
+        return future
+
+    async def run(self, factory, chat: str = "", priority: int = PRIORITY_NOTICE, label: str = ""):
+        """Run page work under scheduler ownership and return its result."""
+        if self._owner_task is not None and self._owner_task is asyncio.current_task():
+            # Already owning the page (nested call from a job or lease): run inline.
+            result = await factory()
+            self.note_chat(chat)
+            return result
+        return await self.submit(factory, chat=chat, priority=priority, label=label)
+
+    def _pick(self, preempting_for=None):
+        """Pop the best ready job; with preempting_for, only jobs allowed to interrupt that priority."""
+        best = None
+        best_rank = None
+        for job in self._jobs:
+            affinity = bool(job.chat) and job.chat == self.current_chat
+            if preempting_for is not None:
+                if job.priority >= preempting_for:
+                    continue
+                # User sends always preempt; other work only while its chat is already open.
+                if job.priority != PRIORITY_USER and not affinity:
+                    continue
+            rank = (job.priority, 0 if affinity else 1, job.seq)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = job, rank
+        if best is not None:
+            self._jobs.remove(best)
+        return best
+
+    async def _execute(self, job: PageJob):
+        if job.future.cancelled():
+            return
+        if self.metrics is not None:
+            self.metrics.observe("scheduler.queue_wait", time.perf_counter() - job.submitted_at, job=job.label)
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            logger.warning(f"[WA] Page job '{job.label}' failed: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        self.jobs_run += 1
+        self.note_chat(job.chat)
+        if not job.future.done():
+            job.future.set_result(result)
+
+    async def serve(self):
+        """Worker loop: run queued jobs whenever no lease holds the page."""
+        self._ensure_primitives()
+        self._stopped = False
+        while not self._stopped:
+            if not self._jobs:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self._paused:
+                await self._resumed.wait()
+                continue
+            async with self._page_lock:
+                self._owner_task = asyncio.current_task()
+                self._owner_priority = None
+                try:
+                    while self._jobs and not self._stopped and not self._paused:
+                        job = self._pick()
+                        if job is not None:
+                            await self._execute(job)
+                finally:
+                    self._owner_task = None
+            # Let waiting lease holders grab the page between bursts.
+            await asyncio.sleep(0)
+
+    @asynccontextmanager
+    async def lease(self, priority: int = PRIORITY_INBOUND):
+        """Hold the page for a long-running routine; queued work waits for checkpoints."""
+        self._ensure_primitives()
+        async with self._page_lock:
+            self._owner_task = asyncio.current_task()
+            self._owner_priority = priority
+            try:
+                await self.checkpoint()
+                yield self
+            finally:
+                self._owner_task = None
+                self._owner_priority = None
+                if self._jobs:
+                    self._wakeup.set()
+
+    async def checkpoint(self) -> bool:
+        """
+        Preemption point for lease holders.
+
+        Runs queued user sends, plus more urgent jobs that target the chat that is open
+        right now. Returns True when any of them moved the page to another chat, so
+        the caller knows its own view (locators, open chat) is stale.
+        """
+        if self._owner_task is None or self._owner_task is not asyncio.current_task() or self._paused:
+            return False
+        start_chat = self.current_chat
+        while True:
+            job = self._pick(preempting_for=self._owner_priority)
+            if job is None:
+                break
+            await self._execute(job)
+        return self.current_chat != start_chat
+
+    def reset(self):
+        """Forget loop-bound state before the scheduler is used on a new event loop."""
+        # Jobs left here belonged to tasks of the closed loop; nothing awaits them any more.
+        self._jobs = []
+        self._stopped = False
+        self._paused = False
+        self._resumed = None
+        self.current_chat = ""
+        self._owner_task = None
+        self._owner_priority = None
+        self._page_lock = None
+        self._wakeup = None
+
+    def stop(self):
+        """Stop the worker and fail any queued jobs."""
+        self._stopped = True
+        pending, self._jobs = self._jobs, []
+        for job in pending:
+            if not job.future.done():
+                job.future.cancel()
+        if self._wakeup is not None:
+            self._wakeup.set()
@@ -42,6 +42,11 @@ class WhatsAppSettingsWidget(QWidget):
         status_layout.addStretch()
         
         layout.addWidget(self.status_container)
+
+        self.startup_label = QLabel()
+        self.startup_label.setWordWrap(True)
+        self.startup_label.setStyleSheet("color: #6b7280; font-size: 11px; padding: 0 5px;")
+        layout.addWidget(self.startup_label)
         
         # QR Code / Info Area
         self.qr_area = QFrame()
@@ -64,7 +69,7 @@ class WhatsAppSettingsWidget(QWidget):
         
         layout.addWidget(self.qr_area)
         
-        from PyQt5.QtWidgets import QCheckBox, QLineEdit, QTextEdit
+        from PyQt5.QtWidgets import QCheckBox, QLineEdit, QTextEdit, QSpinBox, QComboBox
         
         # Configuration Fields
         self.config_area = QFrame()
@@ -90,6 +95,182 @@ class WhatsAppSettingsWidget(QWidget):
         config_layout.addWidget(sender_lbl)
         config_layout.addWidget(self.allowed_sender_edit)
         
+        self.supervisor_chk = QCheckBox("Restart the agent automatically after browser crashes or stalls (next start)")
+        self.supervisor_chk.setChecked(self.plugin.get_setting('supervisor_enabled', True, type=bool))
+        self.supervisor_chk.stateChanged.connect(lambda s: self.plugin.set_setting('supervisor_enabled', bool(s)))
+        config_layout.addWidget(self.supervisor_chk)
+
+        self.use_here_chk = QCheckBox("Click \"Use here\" automatically when WhatsApp Web is opened in another window (next start)")
+        self.use_here_chk.setChecked(self.plugin.get_setting('connection_use_here', False, type=bool))
+        self.use_here_chk.stateChanged.connect(lambda s: self.plugin.set_setting('connection_use_here', bool(s)))
+        config_layout.addWidget(self.use_here_chk)
+
+        self.warm_standby_chk = QCheckBox("Stop to warm standby: keep the browser running so Start resumes in about a second")
+        self.warm_standby_chk.setChecked(self.plugin.get_setting('warm_standby', False, type=bool))
+        self.warm_standby_chk.stateChanged.connect(lambda s: self.plugin.set_setting('warm_standby', bool(s)))
+        config_layout.addWidget(self.warm_standby_chk)
+
+        self.standby_keep_context_chk = QCheckBox("Keep WhatsApp Web open during standby (uses more memory, resumes fastest)")
+        self.standby_keep_context_chk.setChecked(self.plugin.get_setting('standby_keep_context', True, type=bool))
+        self.standby_keep_context_chk.stateChanged.connect(lambda s: self.plugin.set_setting('standby_keep_context', bool(s)))
+        config_layout.addWidget(self.standby_keep_context_chk)
+
+        process_row = QHBoxLayout()
+        self.agent_process_chk = QCheckBox("Run the agent in a separate process; restart it above (next start):")
+        self.agent_process_chk.setChecked(self.plugin.get_setting('agent_process', False, type=bool))
+        self.agent_process_chk.stateChanged.connect(lambda s: self.plugin.set_setting('agent_process', bool(s)))
+        process_row.addWidget(self.agent_process_chk)
+        self.agent_process_limit_spin = QSpinBox()
+        self.agent_process_limit_spin.setRange(0, 16384)
+        self.agent_process_limit_spin.setSingleStep(256)
+        self.agent_process_limit_spin.setSuffix(" MB")
+        self.agent_process_limit_spin.setSpecialValueText("no limit")
+        self.agent_process_limit_spin.setValue(self.plugin.get_setting('agent_process_memory_limit_mb', 2048, type=int))
+        self.agent_process_limit_spin.valueChanged.connect(lambda v: self.plugin.set_setting('agent_process_memory_limit_mb', int(v)))
+        process_row.addWidget(self.agent_process_limit_spin)
+        self.agent_process_label = QLabel("")
+        self.agent_process_label.setStyleSheet("color: #6b7280; font-size: 11px;")
+        process_row.addWidget(self.agent_process_label, 1)
+        config_layout.addLayout(process_row)
+
+        self.diagnostics_chk = QCheckBox("Diagnostics: keep a rolling browser trace and save it on failures (next start)")
+        self.diagnostics_chk.setChecked(self.plugin.get_setting('diagnostics_trace', False, type=bool))
+        self.diagnostics_chk.stateChanged.connect(lambda s: self.plugin.set_setting('diagnostics_trace', bool(s)))
+        config_layout.addWidget(self.diagnostics_chk)
+
+        self.recorder_chk = QCheckBox("Record sessions (page snapshots + network HAR) for offline replay; includes message content (next start)")
+        self.recorder_chk.setChecked(self.plugin.get_setting('session_recorder', False, type=bool))
+        self.recorder_chk.stateChanged.connect(lambda s: self.plugin.set_setting('session_recorder', bool(s)))
+        config_layout.addWidget(self.recorder_chk)
+
+        self.loop_monitor_chk = QCheckBox("Diagnostics: detect agent loop stalls and log where they happen (next start)")
+        self.loop_monitor_chk.setChecked(self.plugin.get_setting('loop_monitor', True, type=bool))
+        self.loop_monitor_chk.stateChanged.connect(lambda s: self.plugin.set_setting('loop_monitor', bool(s)))
+        config_layout.addWidget(self.loop_monitor_chk)
+
+        self.journal_chk = QCheckBox("Write an event journal (wa_journal.jsonl in the agent data folder) for latency analysis (next start)")
+        self.journal_chk.setChecked(self.plugin.get_setting('event_journal', True, type=bool))
+        self.journal_chk.stateChanged.connect(lambda s: self.plugin.set_setting('event_journal', bool(s)))
+        config_layout.addWidget(self.journal_chk)
+        
+        status_row = QHBoxLayout()
+        self.status_server_chk = QCheckBox("Expose local status/metrics endpoint on 127.0.0.1, port:")
+        self.status_server_chk.setChecked(self.plugin.get_setting('status_server_enabled', False, type=bool))
+        self.status_server_chk.stateChanged.connect(self.on_status_server_toggled)
+        status_row.addWidget(self.status_server_chk)
+        self.status_port_spin = QSpinBox()
+        self.status_port_spin.setRange(1024, 65535)
+        self.status_port_spin.setValue(self.plugin.get_setting('status_server_port', 8765, type=int))
+        self.status_port_spin.valueChanged.connect(lambda v: self.plugin.set_setting('status_server_port', int(v)))
+        status_row.addWidget(self.status_port_spin)
+        status_row.addStretch()
+        config_layout.addLayout(status_row)
+        
+        profile_row = QHBoxLayout()
+        self.profile_btn = QPushButton("Profile agent CPU for")
+        self.profile_btn.clicked.connect(self.on_profile_clicked)
+        profile_row.addWidget(self.profile_btn)
+        self.profile_seconds_spin = QSpinBox()
+        self.profile_seconds_spin.setRange(5, 600)
+        self.profile_seconds_spin.setSuffix(" s")
+        self.profile_seconds_spin.setValue(self.plugin.get_setting('profiler_seconds', 30, type=int))
+        self.profile_seconds_spin.valueChanged.connect(lambda v: self.plugin.set_setting('profiler_seconds', int(v)))
+        profile_row.addWidget(self.profile_seconds_spin)
+        self.profile_mode_combo = QComboBox()
+        self.profile_mode_combo.addItems(["sampling", "cprofile"])
+        self.profile_mode_combo.setCurrentText(self.plugin.get_setting('profiler_mode', 'sampling', type=str))
+        self.profile_mode_combo.currentTextChanged.connect(lambda t: self.plugin.set_setting('profiler_mode', t))
+        profile_row.addWidget(self.profile_mode_combo)
+        self.profile_label = QLabel("")
+        self.profile_label.setStyleSheet("color: #6b7280; font-size: 11px;")
+        profile_row.addWidget(self.profile_label, 1)
+        config_layout.addLayout(profile_row)
+
+        downloads_row = QHBoxLayout()
+        downloads_row.addWidget(QLabel("Received files: keep at most"))
+        self.download_quota_spin = QSpinBox()
+        self.download_quota_spin.setRange(0, 102400)
+        self.download_quota_spin.setSingleStep(256)
+        self.download_quota_spin.setSuffix(" MB")
+        self.download_quota_spin.setSpecialValueText("no limit")
+        self.download_quota_spin.setValue(self.plugin.get_setting('download_quota_mb', 1024, type=int))
+        self.download_quota_spin.valueChanged.connect(lambda v: self.plugin.set_setting('download_quota_mb', int(v)))
+        downloads_row.addWidget(self.download_quota_spin)
+        downloads_row.addWidget(QLabel("for"))
+        self.download_retention_spin = QSpinBox()
+        self.download_retention_spin.setRange(0, 3650)
+        self.download_retention_spin.setSuffix(" days")
+        self.download_retention_spin.setSpecialValueText("ever")
+        self.download_retention_spin.setValue(self.plugin.get_setting('download_retention_days', 30, type=int))
+        self.download_retention_spin.valueChanged.connect(lambda v: self.plugin.set_setting('download_retention_days', int(v)))
+        downloads_row.addWidget(self.download_retention_spin)
+        self.download_compress_chk = QCheckBox("gzip processed files (next start)")
+        self.download_compress_chk.setChecked(self.plugin.get_setting('download_compress', False, type=bool))
+        self.download_compress_chk.stateChanged.connect(lambda s: self.plugin.set_setting('download_compress', bool(s)))
+        downloads_row.addWidget(self.download_compress_chk)
+        downloads_row.addStretch()
+        config_layout.addLayout(downloads_row)
+
+        media_row = QHBoxLayout()
+        media_row.addWidget(QLabel("Reject files over"))
+        self.media_max_spin = QSpinBox()
+        self.media_max_spin.setRange(0, 1024)
+        self.media_max_spin.setSuffix(" MB")
+        self.media_max_spin.setSpecialValueText("no limit")
+        self.media_max_spin.setValue(self.plugin.get_setting('media_max_mb', 25, type=int))
+        self.media_max_spin.valueChanged.connect(lambda v: self.plugin.set_setting('media_max_mb', int(v)))
+        media_row.addWidget(self.media_max_spin)
+        media_row.addWidget(QLabel("or"))
+        self.media_pages_spin = QSpinBox()
+        self.media_pages_spin.setRange(0, 10000)
+        self.media_pages_spin.setSuffix(" PDF pages")
+        self.media_pages_spin.setSpecialValueText("any page count")
+        self.media_pages_spin.setValue(self.plugin.get_setting('media_max_pages', 50, type=int))
+        self.media_pages_spin.valueChanged.connect(lambda v: self.plugin.set_setting('media_max_pages', int(v)))
+        media_row.addWidget(self.media_pages_spin)
+        media_row.addWidget(QLabel("(next start)"))
+        self.known_hash_chk = QCheckBox("Answer exact re-sends of processed invoices directly")
+        self.known_hash_chk.setChecked(self.plugin.get_setting('known_hash_shortcut', True, type=bool))
+        self.known_hash_chk.stateChanged.connect(lambda s: self.plugin.set_setting('known_hash_shortcut', bool(s)))
+        media_row.addWidget(self.known_hash_chk)
+        media_row.addStretch()
+        config_layout.addLayout(media_row)
+
+        near_row = QHBoxLayout()
+        near_row.addWidget(QLabel("Photos that look like an earlier invoice:"))
+        self.perceptual_mode_combo = QComboBox()
+        self.perceptual_mode_combo.addItems(["off", "flag", "hold"])
+        self.perceptual_mode_combo.setCurrentText(self.plugin.get_setting('perceptual_mode', 'off', type=str))
+        self.perceptual_mode_combo.currentTextChanged.connect(lambda t: self.plugin.set_setting('perceptual_mode', t))
+        near_row.addWidget(self.perceptual_mode_combo)
+        near_row.addWidget(QLabel("within"))
+        self.perceptual_threshold_spin = QSpinBox()
+        self.perceptual_threshold_spin.setRange(0, 64)
+        self.perceptual_threshold_spin.setSuffix(" of 256 bits")
+        self.perceptual_threshold_spin.setValue(self.plugin.get_setting('perceptual_threshold', 20, type=int))
+        self.perceptual_threshold_spin.valueChanged.connect(lambda v: self.plugin.set_setting('perceptual_threshold', int(v)))
+        near_row.addWidget(self.perceptual_threshold_spin)
+        near_row.addWidget(QLabel("(next start)"))
+        near_row.addStretch()
+        config_layout.addLayout(near_row)
+
+        memory_row = QHBoxLayout()
+        self.memory_btn = QPushButton("Snapshot memory")
+        self.memory_btn.clicked.connect(self.on_memory_snapshot_clicked)
+        memory_row.addWidget(self.memory_btn)
+        memory_row.addWidget(QLabel("Scheduled every"))
+        self.memory_interval_spin = QSpinBox()
+        self.memory_interval_spin.setRange(0, 1440)
+        self.memory_interval_spin.setSuffix(" min")
+        self.memory_interval_spin.setSpecialValueText("off")
+        self.memory_interval_spin.setValue(self.plugin.get_setting('memory_snapshot_interval_min', 0, type=int))
+        self.memory_interval_spin.valueChanged.connect(lambda v: self.plugin.set_setting('memory_snapshot_interval_min', int(v)))
+        memory_row.addWidget(self.memory_interval_spin)
+        self.memory_label = QLabel("")
+        self.memory_label.setStyleSheet("color: #6b7280; font-size: 11px;")
+        memory_row.addWidget(self.memory_label, 1)
+        config_layout.addLayout(memory_row)
+        
         template_lbl = QLabel("Outgoing Message Template (for 'Send WhatsApp' action):")
         self.template_edit = QTextEdit()
         self.template_edit.setMaximumHeight(100)
@@ -150,8 +331,18 @@ Thanks!"""
         status_text = "Stopped"
         color = "#9ca3af" # Gray
         
-        if client.is_running:
-            if client.is_logged_in:
+        if client.standby:
+            status_text = "Standby"
+            color = "#6366f1" # Indigo
+        elif client.is_running:
+            if client.is_logged_in and client.connection.degraded:
+                status_text = {
+                    "phone_offline": "Phone Not Connected",
+                    "reconnecting": "Reconnecting",
+                    "conflict": "Open in Another Window",
+                }.get(client.connection.state, "Disconnected")
+                color = "#ea580c" # Orange
+            elif client.is_logged_in:
                 status_text = "Connected"
                 color = "#059669" # Green
             elif "qr" in self.plugin._status_message.lower():
@@ -162,6 +353,7 @@ Thanks!"""
                 color = "#3b82f6" # Blue
         
         self.status_label.setText(f"Status: {status_text}")
+        self.startup_label.setText(client.startup.describe())
         self.status_indicator.setStyleSheet(f"background-color: {color}; border-radius: 6px;")
         
         # Update QR Code
@@ -181,15 +373,56 @@ Thanks!"""
         else:
             self.qr_image.clear()
             self.qr_image.setStyleSheet("border: 1px dashed #d1d5db;")
-            if not client.is_running:
+            if client.standby:
+                self.qr_label.setText("Agent in standby; Start resumes it.")
+            elif not client.is_running:
                 self.qr_label.setText("Agent is not running.")
             else:
                 self.qr_label.setText("Initializing browser...")
 
+        profiler = client.profiler
+        self.profile_btn.setEnabled(client.is_running and not profiler.active)
+        if profiler.active:
+            self.profile_label.setText(f"Profiling ({profiler.mode})...")
+        elif profiler.last_profile_path:
+            self.profile_label.setText(f"Last: {os.path.basename(profiler.last_profile_path)}")
+
+        report = client.memory.last_report
+        if report:
+            sites = report["growing_sites"]
+            growth = f", top growth +{sites[0]['size_diff_kb']:.0f} KB at {sites[0]['where']}" if sites else ""
+            self.memory_label.setText(f"#{report['snapshot']}: {report['traced_mb']:.1f} MB traced{growth}")
+
+        if getattr(client, "out_of_process", False) and client.pid:
+            worker = client.worker_status()
+            rss = f", {worker['rss_mb']:.0f} MB" if worker["rss_mb"] is not None else ""
+            restarts = f", {worker['restarts']} restarts" if worker["restarts"] else ""
+            self.agent_process_label.setText(f"pid {worker['pid']}{rss}{restarts}")
+        else:
+            self.agent_process_label.setText("")
+
         # Update Buttons
         self.start_btn.setEnabled(not client.is_running)
-        self.stop_btn.setEnabled(client.is_running)
-        self.logout_btn.setEnabled(client.is_running or os.path.exists(client.session_dir))
+        self.stop_btn.setEnabled(client.is_running or client.standby)
+        self.logout_btn.setEnabled(not client.stopped or os.path.exists(client.session_dir))
+
+    def on_status_server_toggled(self, state):
+        enabled = bool(state)
+        self.plugin.set_setting('status_server_enabled', enabled)
+        # Restart so a changed port takes effect.
+        self.plugin.stop_status_server()
+        if enabled and not self.plugin.start_status_server():
+            logger.warning("Status endpoint could not be started; check that the port is free.")
+
+    def on_profile_clicked(self):
+        ok, message = self.plugin.start_profiling()
+        self.profile_label.setText(message)
+        if not ok:
+            logger.warning(f"Profiler not started: {message}")
+
+    def on_memory_snapshot_clicked(self):
+        ok, message = self.plugin.take_memory_snapshot()
+        self.memory_label.setText(message)
 
     def on_start_clicked(self):
         self.plugin.start_agent()
@@ -206,13 +439,17 @@ Thanks!"""
                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            self.plugin.stop_agent()
-            client = self.plugin.wa_client
-            if os.path.exists(client.session_dir):
-                import shutil
-                try:
-                    shutil.rmtree(client.session_dir)
-                    logger.info("Session directory cleared.")
-                except Exception as e:
-                    logger.error(f"Failed to clear session dir: {e}")
+            # Chromium must have released the profile before it can be deleted; no standby here.
+            self.plugin.stop_agent_async(standby=False).add_done_callback(self._clear_session)
             self.refresh_ui()
+
+    def _clear_session(self, future):
+        """Runs once the browser has closed (on the agent thread if it was still running)."""
+        client = self.plugin.wa_client
+        if os.path.exists(client.session_dir):
+            import shutil
+            try:
+                shutil.rmtree(client.session_dir)
+                logger.info("Session directory cleared.")
+            except Exception as e:
+                logger.error(f"Failed to clear session dir: {e}")
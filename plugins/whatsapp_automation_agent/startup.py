@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import statistics
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+# In order; each phase ends when the next mark is reached.
+STARTUP_PHASES = (
+    ("thread_start", "Agent thread start"),
+    ("playwright_start", "Playwright driver spawn"),
+    ("browser_launch", "Chromium launch + profile load"),
+    ("page_setup", "Page setup"),
+    ("navigate", "Load web.whatsapp.com"),
+    ("login_wait", "Login / chat sync"),
+    ("first_poll", "First inbox sweep"),
+)
+PHASE_LABELS = dict(STARTUP_PHASES)
+
+
+class StartupTimeline:
+    """
+    Times each phase from "Start Agent" to the first completed inbox sweep.
+
+    ``begin`` starts the clock (on the UI thread, before the agent thread exists);
+    ``mark(phase)`` closes ``phase`` at the current instant. A ``warm`` start resumes
+    from standby and skips the browser phases, so runs are only compared with runs of
+    the same kind. ``finish`` records the run
+    in the metrics (``startup.phase``, ``startup.total``) and appends it to a small JSON
+    history so runs can be compared; a QR scan is flagged because it makes the login
+    phase a human wait rather than a sync.
+    """
+
+    def __init__(self, history_path: str, metrics=None, max_history: int = 20):
+        self.history_path = history_path
+        self.metrics = metrics
+        self.max_history = max_history
+        self.phases = {}
+        self.started_at = None
+        self.started_wall = None
+        self.finished = False
+        self.outcome = ""
+        self.kind = "cold"
+        self.qr_required = False
+        self._last_mark = None
+        self._history = None
+
+    def begin(self, kind: str = "cold"):
+        self.phases = {}
+        self.kind = kind
+        self.started_at = time.perf_counter()
+        self.started_wall = time.time()
+        self.finished = False
+        self.outcome = ""
+        self.qr_required = False
+        self._last_mark = self.started_at
+
+    def ensure_begun(self):
+        """The agent thread was started without ``begin`` (e.g. by a test harness)."""
+        if self.started_at is None or self.finished:
+            self.begin()
+
+    def mark(self, phase: str):
+        if self.started_at is None or self.finished:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last_mark, 3)
+        self._last_mark = now
+        if self.metrics is not None:
+            self.metrics.observe("startup.phase", self.phases[phase], phase=phase)
+
+    def finish(self, outcome: str = "connected"):
+        """Close the run; returns the record appended to the history."""
+        if self.started_at is None or self.finished:
+            return None
+        self.finished = True
+        self.outcome = outcome
+        total = round(time.perf_counter() - self.started_at, 3)
+        if self.metrics is not None:
+            self.metrics.observe("startup.total", total, outcome=outcome)
+        record = {
+            "started_at": round(self.started_wall, 3),
+            "outcome": outcome,
+            "kind": self.kind,
+            "qr_required": self.qr_required,
+            "total": total,
+            "phases": dict(self.phases),
+        }
+        history = self.history()
+        history.append(record)
+        self._history = history[-self.max_history:]
+        breakdown = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.phases.items())
+        logger.info(f"[WA] {self.kind.capitalize()} startup {outcome} in {total:.1f}s ({breakdown})")
+        return record
+
+    def save(self):
+        """Write the history; blocking file I/O, run it off the agent loop."""
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            tmp_path = f"{self.history_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.history(), f, indent=1)
+            os.replace(tmp_path, self.history_path)
+        except Exception as e:
+            logger.warning(f"[WA] Could not save startup history: {e}")
+
+    def history(self) -> list:
+        if self._history is None:
+            try:
+                with open(self.history_path, "r", encoding="utf-8") as f:
+                    self._history = list(json.load(f))[-self.max_history:]
+            except (OSError, ValueError):
+                self._history = []
+        return list(self._history)
+
+    def summary(self) -> dict:
+        """Current (or last) run and each phase against the median of the earlier runs."""
+        history = self.history()
+        if self.started_at is not None and not self.finished:
+            current = {
+                "outcome": "in_progress",
+                "kind": self.kind,
+                "qr_required": self.qr_required,
+                "total": round(time.perf_counter() - self.started_at, 3),
+                "phases": dict(self.phases),
+            }
+            previous = history
+        elif history:
+            current, previous = history[-1], history[:-1]
+        else:
+            return {"current": None, "phases": [], "runs": 0}
+        kind = current.get("kind", "cold")
+        previous = [run for run in previous if run.get("kind", "cold") == kind]
+
+        phases = []
+        for name, label in STARTUP_PHASES:
+            seconds = current["phases"].get(name)
+            earlier = [run["phases"][name] for run in previous if name in run.get("phases", {})]
+            median = round(statistics.median(earlier), 3) if earlier else None
+            phases.append({"phase": name, "label": label, "seconds": seconds, "median_previous": median})
+        return {"current": current, "phases": phases, "runs": len(history)}
+
+    def describe(self) -> str:
+        """One-line breakdown for the settings UI."""
+        summary = self.summary()
+        current = summary["current"]
+        if not current:
+            return "No startup recorded yet."
+        parts = []
+        for item in summary["phases"]:
+            if item["seconds"] is None:
+                continue
+            text = f"{item['label']} {item['seconds']:.1f}s"
+            if item["median_previous"] is not None:
+                text += f" (usually {item['median_previous']:.1f}s)"
+            parts.append(text)
+        state = "so far" if current["outcome"] == "in_progress" else current["outcome"]
+        qr = ", QR scan" if current.get("qr_required") else ""
+        warm = "Warm start" if current.get("kind") == "warm" else "Startup"
+        return f"{warm} {current['total']:.1f}s ({state}{qr}): " + " · ".join(parts)
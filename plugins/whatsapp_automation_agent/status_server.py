@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from core.plugins.sdk import get_logger
+from .metrics import format_prometheus
+
+logger = get_logger(__name__)
+
+DEFAULT_STATUS_PORT = 8765
+# A poll cycle normally completes within seconds; longer gaps mean the loop is stuck.
+STALE_POLL_SECONDS = 120
+
+
+class _StatusRequestHandler(BaseHTTPRequestHandler):
+    server_version = "WhatsAppAgentStatus/1.0"
+
+    def do_GET(self):
+        status_server = self.server.status_server
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        try:
+            if path in ("/", "/status"):
+                self._send_json(200, status_server.status_payload())
+            elif path == "/health":
+                health = status_server.health_payload()
+                self._send_json(200 if health["status"] == "ok" else 503, health)
+            elif path == "/metrics":
+                body = format_prometheus(status_server.plugin.get_metrics_snapshot())
+                self._send(200, body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+            elif path == "/metrics.json":
+                self._send_json(200, status_server.plugin.get_metrics_snapshot())
+            else:
+                self._send_json(404, {"error": "not found"})
+        except Exception as e:
+            logger.warning(f"[WA] Status endpoint error for {path}: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def do_POST(self):
+        self._send_json(405, {"error": "read-only endpoint"})
+
+    do_PUT = do_POST
+    do_DELETE = do_POST
+
+    def _send_json(self, code: int, payload: dict):
+        self._send(code, json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"), "application/json")
+
+    def _send(self, code: int, body: bytes, content_type: str):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapers hit this every few seconds; keep it out of the app log.
+        return
+
+
+class AgentStatusServer:
+    """
+    Optional read-only HTTP endpoint on the loopback interface.
+
+    Serves health, connection state, queue depths and metrics (JSON and Prometheus text)
+    from its own daemon thread, so neither the agent event loop nor the Qt thread is
+    involved in answering scrapes.
+    """
+
+    def __init__(self, plugin, port: int = DEFAULT_STATUS_PORT, host: str = "127.0.0.1"):
+        self.plugin = plugin
+        self.host = host
+        self.port = port
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._httpd is not None
+
+    def start(self) -> bool:
+        if self._httpd is not None:
+            return True
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), _StatusRequestHandler)
+        except OSError as e:
+            logger.error(f"[WA] Could not bind status endpoint on {self.host}:{self.port}: {e}")
+            self._httpd = None
+            return False
+        self._httpd.daemon_threads = True
+        self._httpd.status_server = self
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever,
+            name="WhatsAppAgentStatusServer",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"[WA] Status endpoint listening on http://{self.host}:{self.port}/status")
+        return True
+
+    def stop(self):
+        httpd, self._httpd = self._httpd, None
+        if httpd is None:
+            return
+        try:
+            httpd.shutdown()
+            httpd.server_close()
+        except Exception as e:
+            logger.warning(f"[WA] Failed to stop status endpoint cleanly: {e}")
+        self._thread = None
+
+    def health_payload(self) -> dict:
+        client = self.plugin.wa_client
+        if getattr(client, "out_of_process", False):
+            return client.health_payload()
+        poll_age = None
+        if client.last_poll_at:
+            poll_age = round(time.time() - client.last_poll_at, 3)
+
+        if client.standby:
+            status = "standby"
+        elif not client.is_running:
+            status = "down"
+        elif not client.is_logged_in:
+            status = "recovering" if client.supervisor.recovering else "connecting"
+        elif client.connection.degraded:
+            status = "degraded"
+        elif poll_age is not None and poll_age > STALE_POLL_SECONDS:
+            status = "stalled"
+        else:
+            status = "ok"
+        return {
+            "status": status,
+            "running": client.is_running,
+            "logged_in": client.is_logged_in,
+            "standby": client.standby,
+            "connection_state": client.connection.state,
+            "poll_age_seconds": poll_age,
+        }
+
+    def status_payload(self) -> dict:
+        client = self.plugin.wa_client
+        if getattr(client, "out_of_process", False):
+            # The worker computes this payload itself; only the plugin's fields are local.
+            payload = client.status_payload()
+            payload.update({"plugin_id": self.plugin.id, "version": self.plugin.version,
+                            "status_message": self.plugin._status_message})
+            return payload
+        payload = self.health_payload()
+        payload.update({
+            "plugin_id": self.plugin.id,
+            "version": self.plugin.version,
+            "status_message": self.plugin._status_message,
+            "queues": {
+                "scheduler_pending": client.scheduler.pending_count,
+                "scheduler_pending_by_priority": client.scheduler.pending_by_priority(),
+                "pending_replies": len(client.pending_replies),
+                "intake": client.intake.status(),
+            },
+            "scheduler": {
+                "current_chat": client.scheduler.current_chat,
+                "jobs_run": client.scheduler.jobs_run,
+                "chat_switches": client.scheduler.chat_switches,
+            },
+            "routing_index_size": len(client.routing),
+            "downloads": client.downloads.status(),
+            "known_invoices": client.known.status(),
+            "near_duplicates": client.perceptual.status(),
+            "connection": client.connection.status(),
+            "supervisor": {**client.supervisor.status(), "outbox": client.outbox.labels()},
+            "startup": client.startup.summary(),
+            "diagnostics": {
+                "trace": client.tracer.status(),
+                "recorder": client.recorder.status(),
+                "loop": client.loop_monitor.status(),
+                "journal": client.journal.status(),
+                "profiler": client.profiler.status(),
+                "memory": client.memory.status(),
+            },
+        })
+        return payload
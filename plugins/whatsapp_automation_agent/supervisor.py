@@ -0,0 +1,267 @@
+import time
+import asyncio
+import threading
+import traceback
+import concurrent.futures
+from collections import deque
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+
+class OutboundEntry:
+    """Outbound page work submitted from another thread, waiting for (or running on) the agent loop."""
+
+    __slots__ = ("factory", "label", "replay", "future", "loop")
+
+    def __init__(self, factory, label: str, replay: bool):
+        self.factory = factory
+        self.label = label
+        self.replay = replay
+        self.future = concurrent.futures.Future()
+        self.loop = None
+
+
+class Outbox:
+    """
+    Outbound work (user sends, processing notices) that outlives agent restarts.
+
+    Entries are dispatched to the agent loop once WhatsApp is logged in, and dispatched
+    again on the next login if a restart interrupted them. Entries with ``replay=False``
+    (user sends, which are not idempotent) are only re-dispatched if they had not been
+    handed to the page yet; an interrupted one fails instead of risking a duplicate.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def submit(self, factory, label: str = "outbound", replay: bool = True) -> OutboundEntry:
+        entry = OutboundEntry(factory, label, replay)
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def dispatch(self, loop):
+        """Run every entry not yet running on ``loop``; callable from any thread."""
+        with self._lock:
+            entries = [entry for entry in self._entries if entry.loop is not loop]
+            for entry in entries:
+                entry.loop = loop
+        for entry in entries:
+            try:
+                future = asyncio.run_coroutine_threadsafe(self._run(entry), loop)
+            except RuntimeError:
+                entry.loop = None  # loop is closing; the next login picks it up
+                continue
+            future.add_done_callback(lambda f, entry=entry: self._requeue_if_cancelled(entry, f))
+
+    def _requeue_if_cancelled(self, entry: OutboundEntry, future):
+        """A stop to standby or a logout cancelled the entry; let the same loop dispatch it again."""
+        if not future.cancelled():
+            return
+        with self._lock:
+            if entry in self._entries:
+                entry.loop = None
+
+    async def _run(self, entry: OutboundEntry):
+        try:
+            result = await entry.factory()
+        except asyncio.CancelledError:
+            if not entry.replay:
+                self._settle(entry, error=RuntimeError("Interrupted by an agent restart; not resent to avoid a duplicate."))
+            raise
+        except Exception as e:
+            self._settle(entry, error=e)
+            return
+        self._settle(entry, result=result)
+
+    def _settle(self, entry: OutboundEntry, result=None, error=None):
+        with self._lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+        if entry.future.done():
+            return
+        if error is not None:
+            entry.future.set_exception(error)
+        else:
+            entry.future.set_result(result)
+
+    def fail_pending(self, message: str):
+        """The agent stopped for good: fail sends that are still waiting; notices stay queued."""
+        with self._lock:
+            failed = [entry for entry in self._entries if not entry.replay]
+            self._entries = [entry for entry in self._entries if entry.replay]
+            for entry in self._entries:
+                entry.loop = None
+        for entry in failed:
+            if not entry.future.done():
+                entry.future.set_exception(RuntimeError(message))
+
+    def labels(self) -> list:
+        with self._lock:
+            return [entry.label for entry in self._entries]
+
+
+class AgentSupervisor:
+    """
+    Runs the agent one attempt at a time and decides when to restart it.
+
+    ``watch`` runs ``client.async_run()`` as a task and ends the attempt when it raises,
+    returns while the agent should still be running, the page crashes or its context
+    closes (``report``), or the poll heartbeat is older than ``heartbeat_timeout``
+    once logged in. The caller tears the browser down and asks ``next_delay`` how long
+    to back off: ``backoff_initial`` doubling up to ``backoff_max``, at most
+    ``max_restarts`` within ``budget_window`` seconds, after which it gives up.
+    """
+
+    def __init__(self, metrics=None, backoff_initial: float = 2.0, backoff_max: float = 60.0,
+                 max_restarts: int = 5, budget_window: float = 900.0, heartbeat_timeout: float = 180.0,
+                 check_interval: float = 2.0):
+        self.metrics = metrics
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_restarts = max_restarts
+        self.budget_window = budget_window
+        self.heartbeat_timeout = heartbeat_timeout
+        self.check_interval = check_interval
+        self.restarts = 0
+        self.last_failure = ""
+        self.last_failure_at = None
+        self.last_recovery_seconds = None
+        self.gave_up = False
+        self._recent = deque()
+        self._failure = None
+        self._fatal = ""
+        self._failed_at = None
+        self._task = None
+        self._loop = None
+        self._stop = threading.Event()
+
+    @property
+    def recovering(self) -> bool:
+        return self._failed_at is not None
+
+    def reset(self):
+        """A user (re)started the agent: fresh budget."""
+        self._recent.clear()
+        self._stop.clear()
+        self._failed_at = None
+        self.gave_up = False
+
+    def report(self, reason: str):
+        """Flag a failure seen by an event handler (page crash, context closed); ends the attempt."""
+        if self._task is not None and not self._task.done() and self._failure is None:
+            self._failure = reason
+
+    def fatal(self, reason: str):
+        """The attempt failed in a way a restart cannot fix (e.g. Playwright missing)."""
+        self._fatal = reason
+
+    async def watch(self, client):
+        """Run one attempt; returns why it failed, or None when the agent was stopped."""
+        self._failure = None
+        self._fatal = ""
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(client.async_run())
+        try:
+            while not self._task.done():
+                await asyncio.wait({self._task}, timeout=self.check_interval)
+                if self._task.done():
+                    break
+                reason = self._failure or self._check_heartbeat(client)
+                if reason:
+                    self._task.cancel()
+                    await asyncio.wait({self._task}, timeout=10)
+                    return self._failed(reason)
+        except asyncio.CancelledError:
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=10)
+            raise
+        finally:
+            self._loop = None
+
+        if self._task.cancelled() or not client.is_running:
+            return None
+        error = self._task.exception()
+        if error is not None:
+            logger.error(f"[WA] Agent attempt crashed: {error}")
+            logger.error("".join(traceback.format_exception(type(error), error, error.__traceback__)))
+            return self._failed("crash", str(error))
+        if self._fatal:
+            self.gave_up = True
+            return self._failed("fatal", self._fatal)
+        return self._failed("exited")
+
+    def _check_heartbeat(self, client) -> str:
+        if not client.is_logged_in or not client.last_progress_at or not self.heartbeat_timeout:
+            return ""
+        if time.time() - client.last_progress_at > self.heartbeat_timeout:
+            return "stalled"
+        return ""
+
+    def _failed(self, reason: str, detail: str = "") -> str:
+        self.last_failure = f"{reason}: {detail}" if detail else reason
+        self.last_failure_at = time.time()
+        if self._failed_at is None:
+            self._failed_at = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.inc("supervisor.failures", reason=reason)
+        logger.warning(f"[WA] Agent failure detected ({self.last_failure}).")
+        return reason
+
+    def next_delay(self) -> float | None:
+        """Backoff before the next restart, or None when the restart budget is spent."""
+        if self.gave_up:
+            return None
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > self.budget_window:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_restarts:
+            self.gave_up = True
+            logger.error(f"[WA] {len(self._recent)} restarts within {self.budget_window / 60:.0f} min; giving up.")
+            return None
+        delay = min(self.backoff_max, self.backoff_initial * (2 ** len(self._recent)))
+        self._recent.append(now)
+        self.restarts += 1
+        if self.metrics is not None:
+            self.metrics.inc("supervisor.restarts")
+        return delay
+
+    def recovered(self):
+        """The agent is logged in again; records time to recovery for the last failure."""
+        if self._failed_at is None:
+            return
+        self.last_recovery_seconds = round(time.perf_counter() - self._failed_at, 3)
+        self._failed_at = None
+        if self.metrics is not None:
+            self.metrics.observe("supervisor.recovery", self.last_recovery_seconds)
+        logger.info(f"[WA] Agent recovered in {self.last_recovery_seconds:.1f}s.")
+
+    def wait(self, seconds: float) -> bool:
+        """Back off on the agent thread; True if a stop was requested meanwhile."""
+        return self._stop.wait(seconds)
+
+    def request_stop(self):
+        """Stop from any thread: ends the backoff wait or cancels the running attempt."""
+        self._stop.set()
+        loop, task = self._loop, self._task
+        if loop is not None and task is not None and not task.done():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass
+
+    def status(self) -> dict:
+        return {
+            "restarts": self.restarts,
+            "restarts_in_window": len(self._recent),
+            "max_restarts": self.max_restarts,
+            "gave_up": self.gave_up,
+            "last_failure": self.last_failure,
+            "last_failure_at": self.last_failure_at,
+            "last_recovery_seconds": self.last_recovery_seconds,
+        }
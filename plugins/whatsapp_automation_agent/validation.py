@@ -0,0 +1,214 @@
+import os
+import re
+import struct
+import asyncio
+import concurrent.futures
+from core.plugins.sdk import get_logger
+
+logger = get_logger(__name__)
+
+# What the host's OCR pipeline can read; other types are rejected unless allowed in settings.
+DEFAULT_ALLOWED_TYPES = ("application/pdf", "image/jpeg", "image/png")
+DEFAULT_MAX_MB = 25
+DEFAULT_MAX_PAGES = 50
+DEFAULT_MAX_MEGAPIXELS = 50
+# Stickers and thumbnails are a few hundred pixels at most; no invoice is readable that small.
+DEFAULT_MIN_IMAGE_SIDE = 300
+# %%EOF and the JPEG/PNG end markers sit at the very end, give or take some trailing padding.
+TAIL_BYTES = 2048
+
+REJECT_EMPTY = "empty"
+REJECT_TOO_LARGE = "too_large"
+REJECT_TYPE = "unsupported_type"
+REJECT_CORRUPT = "corrupt"
+REJECT_TOO_MANY_PAGES = "too_many_pages"
+REJECT_TOO_SMALL = "too_small"
+REJECT_TOO_BIG_IMAGE = "too_many_pixels"
+REJECT_UNREADABLE = "unreadable"
+
+REJECT_REPLIES = {
+    REJECT_EMPTY: "❌ The file arrived empty. Please send it again.",
+    REJECT_TOO_LARGE: "❌ The file is too large ({size_mb:.0f} MB, limit {limit_mb:.0f} MB). Please send a smaller scan or PDF.",
+    REJECT_TYPE: "❌ {kind} cannot be processed. Please send the invoice as a PDF or a photo.",
+    REJECT_CORRUPT: "❌ The file looks damaged or incomplete. Please send it again.",
+    REJECT_TOO_MANY_PAGES: "❌ The PDF has {pages} pages (limit {limit}). Please send the invoice pages only.",
+    REJECT_TOO_SMALL: "❌ The image is too small to read ({width}×{height}). Please send a clearer photo.",
+    REJECT_TOO_BIG_IMAGE: "❌ The image is too large ({width}×{height}). Please send a smaller photo.",
+    REJECT_UNREADABLE: "❌ The file could not be read. Please send it again.",
+}
+
+# Types recognised only to say what the user sent.
+_KIND_NAMES = {
+    "audio/ogg": "Voice notes",
+    "video/mp4": "Videos",
+    "image/webp": "Stickers",
+    "image/gif": "GIFs",
+    "text/html": "Web pages",
+    "application/zip": "Archives and Office documents",
+}
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PDF_COUNT = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b", re.S)
+
+
+def sniff_mime(head: bytes) -> str:
+    """MIME type from the first bytes of a file, or '' if unknown."""
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        return "image/heic" if brand in (b"heic", b"heix", b"mif1", b"msf1") else "video/mp4"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"PK\x03\x04"):
+        return "application/zip"
+    if head.lstrip()[:15].lower().startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+    return ""
+
+
+def _jpeg_size(data: bytes):
+    """(width, height) from the first SOF marker, or None."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+class MediaVerdict:
+    """Outcome of validating one received file."""
+
+    __slots__ = ("ok", "mime", "reason", "size", "pages", "width", "height", "detail")
+
+    def __init__(self, ok: bool, mime: str = "", reason: str = "", size: int = 0,
+                 pages=None, width=None, height=None, detail: str = ""):
+        self.ok = ok
+        self.mime = mime
+        self.reason = reason
+        self.size = size
+        self.pages = pages
+        self.width = width
+        self.height = height
+        self.detail = detail
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MediaValidator:
+    """
+    Checks a received file before it is handed to the host.
+
+    Sniffs the type from its magic bytes (the name WhatsApp suggests is not trusted), checks
+    the size, looks for the end marker a truncated PDF/JPEG/PNG lacks, and counts PDF pages
+    or image pixels. Runs on its own small thread pool, so reading a 20 MB PDF never blocks
+    the agent loop.
+    """
+
+    def __init__(self, allowed_types=DEFAULT_ALLOWED_TYPES, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 max_pages: int = DEFAULT_MAX_PAGES, max_pixels: int = DEFAULT_MAX_MEGAPIXELS * 1000000,
+                 min_image_side: int = DEFAULT_MIN_IMAGE_SIDE, workers: int = 2):
+        self.allowed_types = set(allowed_types)
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.max_pixels = max_pixels
+        self.min_image_side = min_image_side
+        self.workers = workers
+        self._executor = None
+
+    async def validate(self, path: str) -> MediaVerdict:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="WhatsAppValidate")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.check, path)
+
+    def close(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def check(self, path: str) -> MediaVerdict:
+        """Validate ``path``; blocking, runs on the pool."""
+        try:
+            size = os.path.getsize(path)
+            if size == 0:
+                return MediaVerdict(False, reason=REJECT_EMPTY)
+            with open(path, "rb") as f:
+                head = f.read(64)
+                mime = sniff_mime(head)
+                if mime not in self.allowed_types:
+                    return MediaVerdict(False, mime, REJECT_TYPE, size, detail=mime or "unknown")
+                if self.max_bytes > 0 and size > self.max_bytes:
+                    return MediaVerdict(False, mime, REJECT_TOO_LARGE, size)
+                f.seek(0)
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"[WA] Could not read {path} for validation: {e}")
+            return MediaVerdict(False, reason=REJECT_UNREADABLE, detail=str(e))
+        if mime == "application/pdf":
+            return self._check_pdf(data, size)
+        if mime in ("image/jpeg", "image/png"):
+            return self._check_image(data, mime, size)
+        return MediaVerdict(True, mime, size=size)  # allowed in settings, no deeper check
+
+    def _check_pdf(self, data: bytes, size: int) -> MediaVerdict:
+        if b"%%EOF" not in data[-TAIL_BYTES:]:
+            return MediaVerdict(False, "application/pdf", REJECT_CORRUPT, size, detail="no %%EOF trailer")
+        pages = len(_PDF_PAGE.findall(data))
+        if not pages:
+            # Pages inside compressed object streams are invisible here; trust the page tree.
+            counts = [int(a or b) for a, b in _PDF_COUNT.findall(data)]
+            pages = max(counts) if counts else None
+        if pages is not None and self.max_pages > 0 and pages > self.max_pages:
+            return MediaVerdict(False, "application/pdf", REJECT_TOO_MANY_PAGES, size, pages=pages)
+        return MediaVerdict(True, "application/pdf", size=size, pages=pages)
+
+    def _check_image(self, data: bytes, mime: str, size: int) -> MediaVerdict:
+        dims = None
+        if mime == "image/jpeg":
+            complete = b"\xff\xd9" in data[-TAIL_BYTES:]
+            dims = _jpeg_size(data)
+        else:
+            complete = b"IEND" in data[-TAIL_BYTES:]
+            if data[12:16] == b"IHDR":
+                dims = struct.unpack(">II", data[16:24])
+        if not complete or dims is None:
+            return MediaVerdict(False, mime, REJECT_CORRUPT, size,
+                                detail="truncated" if not complete else "no image header")
+        width, height = dims
+        if min(width, height) < self.min_image_side:
+            return MediaVerdict(False, mime, REJECT_TOO_SMALL, size, width=width, height=height)
+        if self.max_pixels > 0 and width * height > self.max_pixels:
+            return MediaVerdict(False, mime, REJECT_TOO_BIG_IMAGE, size, width=width, height=height)
+        return MediaVerdict(True, mime, size=size, width=width, height=height)
+
+    def reply_for(self, verdict: MediaVerdict) -> str:
+        """The chat reply explaining a rejection."""
+        template = REJECT_REPLIES.get(verdict.reason, REJECT_REPLIES[REJECT_UNREADABLE])
+        return template.format(
+            size_mb=verdict.size / 1048576, limit_mb=self.max_bytes / 1048576,
+            kind=_KIND_NAMES.get(verdict.mime, "This file type"),
+            pages=verdict.pages, limit=self.max_pages,
+            width=verdict.width, height=verdict.height,
+        )
@@ -7,10 +7,31 @@ import hashlib
 import base64
 import json
 import re
+import threading
+import concurrent.futures
 from urllib.parse import quote
 from collections import deque
 from playwright.async_api import async_playwright
 from core.plugins.sdk import get_logger
+from .scheduler import PageScheduler, PRIORITY_USER, PRIORITY_NOTICE, PRIORITY_INBOUND
+from .routing import ChatRoutingIndex, chat_key
+from .metrics import MetricsRegistry
+from .diagnostics import TraceRingBuffer, DEFAULT_STAGE_BUDGETS
+from .paths import data_dir
+from .recorder import SessionRecorder, WHATSAPP_HOSTS
+from .clock import AgentClock
+from .loop_monitor import LoopMonitor
+from .journal import EventJournal
+from .startup import StartupTimeline
+from .profiler import AgentProfiler
+from .memory import MemoryMonitor
+from .supervisor import AgentSupervisor, Outbox
+from .downloads import DownloadStore, STATE_INGESTED, STATE_FAILED, STATE_REJECTED
+from .validation import MediaValidator, DEFAULT_ALLOWED_TYPES
+from .intake import HostHandoff
+from .known_hashes import KnownInvoiceIndex, invoice_summary, invoice_in_host
+from .perceptual import PerceptualIndex, image_dhash, backend as perceptual_backend, MODE_OFF, MODE_HOLD
+from .connection import ConnectionMonitor, DEGRADED_STATES, STATE_QR_REQUIRED, STATE_LOGGED_OUT, STATE_CONNECTED
 
 logger = get_logger(__name__)
 
@@ -24,14 +45,58 @@ class WhatsAppClient:
         self.context = None
         self.page = None
         self.loop = None
+        self.thread_id = None
+        # Warm standby: stopped, but the Playwright driver (and usually the logged-in page) stays up.
+        self.standby = False
+        self.stopped = True  # no agent thread is running
+        self._standby_requested = False
+        self._resume_event = None
+        self._poll_task = None
+        self._ready_waiters = []
+        self._stopped_waiters = []
+        self._standby_waiters = []
+        self._waiters_lock = threading.Lock()
+        self.last_poll_at = None  # Heartbeat of the inbound poll loop (epoch seconds)
+        self.last_progress_at = None  # Also touched per chat and per download attempt, so long sweeps are not mistaken for stalls
+        # Every sleep and Playwright timeout goes through the clock; tests swap in VirtualClock.
+        self.clock = AgentClock()
         
         plugin_dir = os.path.dirname(os.path.abspath(__file__))
         self.user_data_dir = os.path.join(plugin_dir, "whatsapp_session")
         self.session_dir = self.user_data_dir  # alias for settings_ui
+        # Base URL of WhatsApp Web; the offline benchmark fixture points this at loopback.
+        self.web_url = "https://web.whatsapp.com/"
+        self.tracer = TraceRingBuffer(data_dir("diagnostics", "traces"))
+        self.recorder = SessionRecorder(data_dir("diagnostics", "recordings"))
+        # Offline replay: serve WhatsApp-hosted requests from this recorded HAR only.
+        self.har_replay_path = ""
         self.pending_replies = []  # Thread-safe queue for delayed UI feedback
         self._recent_reply_keys = deque(maxlen=500)
         self._recent_reply_lookup = set()
         self._send_lock = asyncio.Lock()
+        self.metrics = MetricsRegistry()
+        self.scheduler = PageScheduler(metrics=self.metrics)
+        self.routing = ChatRoutingIndex()
+        self.loop_monitor = LoopMonitor(metrics=self.metrics)
+        self.journal = EventJournal(data_dir("journal"))
+        self.startup = StartupTimeline(data_dir("diagnostics", "startup_history.json"), metrics=self.metrics)
+        self.profiler = AgentProfiler(data_dir("diagnostics", "profiles"))
+        self.memory = MemoryMonitor(data_dir("diagnostics", "memory"), state_probe=self.memory_state,
+                                    is_agent_running=lambda: self.is_running)
+        self.supervisor = AgentSupervisor(metrics=self.metrics)
+        # Received files live outside the plugin folder, with a quota and age-based cleanup.
+        self.downloads = DownloadStore(metrics=self.metrics)
+        # Junk (stickers, voice notes, truncated files...) is turned away before the host sees it.
+        self.validator = MediaValidator()
+        # Host calls run on their own thread, batched and throttled, never on the agent loop.
+        self.intake = HostHandoff(self._import_to_host, metrics=self.metrics)
+        # Hashes of files the host already has, so exact re-sends are answered locally.
+        self.known = KnownInvoiceIndex()
+        # Optional: photos that look like an invoice already queued (a second shot of the same sheet).
+        self.perceptual = PerceptualIndex()
+        # Sends and notices survive restarts here; dedup and routing state live on this object anyway.
+        self.outbox = Outbox()
+        self.connection = ConnectionMonitor(metrics=self.metrics, journal=self.journal, on_change=self._on_connection_change)
         self._is_frozen_runtime = (
             getattr(sys, "frozen", False)
             or hasattr(sys, "_MEIPASS")
@@ -39,6 +104,65 @@ class WhatsAppClient:
             or "__compiled__" in globals()
         )
 
+    @property
+    def downloads_dir(self) -> str:
+        return self.downloads.root
+
+    @downloads_dir.setter
+    def downloads_dir(self, path: str):
+        self.downloads.set_root(path)
+
+    def _configure_downloads(self):
+        custom_dir = self.plugin.get_setting('download_dir', '', type=str)
+        if custom_dir:
+            self.downloads.set_root(custom_dir)
+        self.downloads.quota_bytes = self.plugin.get_setting('download_quota_mb', 1024, type=int) * 1024 * 1024
+        self.downloads.max_age_days = self.plugin.get_setting('download_retention_days', 30, type=int)
+        self.downloads.compress = self.plugin.get_setting('download_compress', False, type=bool)
+        self.downloads.start()
+
+    def _configure_validation(self):
+        extra = self.plugin.get_setting('media_allowed_types', '', type=str)
+        self.validator.allowed_types = set(DEFAULT_ALLOWED_TYPES) | {t.strip().lower() for t in extra.split(',') if t.strip()}
+        self.validator.max_bytes = self.plugin.get_setting('media_max_mb', 25, type=int) * 1024 * 1024
+        self.validator.max_pages = self.plugin.get_setting('media_max_pages', 50, type=int)
+        self.validator.max_pixels = self.plugin.get_setting('media_max_megapixels', 50, type=int) * 1000000
+        self.validator.min_image_side = self.plugin.get_setting('media_min_image_side', 300, type=int)
+
+    def _configure_intake(self):
+        self.intake.batch_window = self.plugin.get_setting('intake_batch_window_ms', 250, type=int) / 1000
+        self.intake.max_batch = max(1, self.plugin.get_setting('intake_max_batch', 8, type=int))
+        self.intake.max_in_host = self.plugin.get_setting('intake_max_in_host', 20, type=int)
+
+    def _configure_known_hashes(self):
+        self.known.max_age_days = self.plugin.get_setting('known_hash_days', 365, type=int)
+        if self.plugin.get_setting('known_hash_shortcut', True, type=bool):
+            self.known.load(self.journal.journal_dir, self.downloads)
+        self.perceptual.mode = self.plugin.get_setting('perceptual_mode', MODE_OFF, type=str)
+        self.perceptual.threshold = self.plugin.get_setting('perceptual_threshold', 20, type=int)
+        if self.perceptual.mode != MODE_OFF:
+            if not perceptual_backend():
+                logger.warning("[WA] Near-duplicate detection needs Pillow or PyQt5; it stays off.")
+            self.perceptual.load()
+
+    def _import_to_host(self, file_path: str, source: str, metadata: dict) -> bool:
+        """The host call itself; runs on the intake thread."""
+        return self.plugin.api.processing.import_file_to_queue(file_path, source, metadata=metadata)
+
+    async def _land_download(self, download) -> str:
+        """Move a finished Playwright download into the store; returns its path there."""
+        self.last_progress_at = time.time()  # the download itself may have taken a while
+        filename = self._normalize_download_filename(download.suggested_filename)
+        try:
+            source = await download.path()
+        except Exception:
+            source = None
+        if not source:
+            # Connected to a remote browser: the artifact has to be streamed over.
+            source = self.downloads.staging_path()
+            await download.save_as(source)
+        return await asyncio.to_thread(self.downloads.land, source, filename)
+
     async def _install_playwright_chromium(self) -> bool:
         """Install Playwright Chromium without recursively relaunching frozen app."""
         try:
@@ -88,7 +212,7 @@ class WhatsAppClient:
 
         return name
 
-    async def _download_document_blob_fallback(self, message_element, downloads_dir: str):
+    async def _download_document_blob_fallback(self, message_element):
         """Fallback download path: fetch blob URL bytes from the page context and save locally."""
         blob_url = ""
         filename_hint = ""
@@ -170,10 +294,7 @@ class WhatsAppClient:
                 return None
 
             file_name = self._normalize_download_filename(filename_hint or "invoice.pdf", default_ext=".pdf")
-            file_path = os.path.join(downloads_dir, file_name)
-            with open(file_path, "wb") as f:
-                f.write(base64.b64decode(payload_b64))
-            return file_path
+            return await asyncio.to_thread(self.downloads.land_bytes, base64.b64decode(payload_b64), file_name)
         except Exception as e:
             logger.warning(f"[WA] Blob extraction fallback failed: {e}")
             return None
@@ -234,20 +355,90 @@ class WhatsAppClient:
 
         return ""
 
+    @staticmethod
+    def _normalize_for_match(val: str) -> str:
+        """Comparable form of an allowed-sender setting or chat title (the routing index's ``chat_key``)."""
+        return chat_key(val)
+
+    def _route_for(self, metadata: dict | None = None, key: str = ""):
+        """Indexed chat route for a notice's metadata or a '<message_key>:<suffix>' reply key."""
+        route = self.routing.lookup_metadata(metadata)
+        if route is None and key:
+            route = self.routing.lookup(str(key).rsplit(":", 1)[0])
+        return route
+
+    async def _open_routed_chat(self, route) -> bool:
+        """Open the indexed chat with at most one navigation, preferring an in-page row click."""
+        if not self.page or route is None:
+            return False
+
+        if route.chat and route.chat == self.scheduler.current_chat:
+            if await self.page.locator("#main footer").count() > 0:
+                return True
+
+        row_selectors = []
+        if route.row_id:
+            row_id_value = json.dumps(route.row_id)
+            row_selectors.append(f"div#pane-side div[role='listitem'][data-id={row_id_value}]")
+            row_selectors.append(f"div#pane-side [data-id={row_id_value}]")
+        if route.title:
+            title_value = json.dumps(route.title)
+            row_selectors.append(
+                f"div#pane-side div[role='listitem']:has(span[title={title_value}])"
+            )
+
+        if row_selectors:
+            try:
+                rows = self.page.locator(", ".join(row_selectors)).first
+                if await rows.count() == 0 and route.offset is not None:
+                    # Chat list is virtualized: scroll to where the row was last seen so it renders.
+                    await self.page.locator("div#pane-side").first.evaluate(
+                        "(el, top) => { el.scrollTop = Math.max(0, top - el.clientHeight / 2); }",
+                        route.offset,
+                    )
+                    await self.clock.sleep(0.3)
+                if await rows.count() > 0:
+                    await rows.click(timeout=self.clock.timeout(3000))
+                    await self.page.wait_for_selector("#main footer", state="visible", timeout=self.clock.timeout(8000))
+                    self.scheduler.note_chat(route.chat)
+                    logger.info(f"[WA] Routed to indexed chat row for message_key={route.message_key}")
+                    return True
+            except Exception as e:
+                logger.debug(f"[WA] Indexed chat row not clickable for {route.message_key}: {e}")
+
+        if route.phone:
+            try:
+                url = f"{self.web_url}send/?phone={quote(route.phone)}&text=&type=phone_number&app_absent=0"
+                await self.page.goto(url, timeout=self.clock.timeout(20000))
+                await self.page.wait_for_selector("#main", state="visible", timeout=self.clock.timeout(20000))
+                await self.clock.sleep(0.4)
+                self.scheduler.note_chat(route.chat)
+                logger.info(f"[WA] Routed to indexed phone for message_key={route.message_key}")
+                return True
+            except Exception as e:
+                logger.warning(f"[WA] Failed to route to indexed phone {route.phone}: {e}")
+        return False
+
     async def _restore_reply_context(self, metadata: dict | None = None, key: str = "") -> bool:
         """Try to restore a reply-ready chat view when composer is temporarily unavailable."""
         if not self.page:
             return False
 
+        route = self._route_for(metadata, key)
+        if route is not None:
+            return await self._open_routed_chat(route)
+
+        # Not indexed (e.g. intake happened before an agent restart): fall back to phone hints.
         phone = self._extract_phone_candidate(metadata, key)
         if not phone:
             return False
 
         try:
-            url = f"https://web.whatsapp.com/send/?phone={quote(phone)}&text=&type=phone_number&app_absent=0"
-            await self.page.goto(url, timeout=20000)
-            await self.page.wait_for_selector("#main", state="visible", timeout=20000)
-            await asyncio.sleep(0.4)
+            url = f"{self.web_url}send/?phone={quote(phone)}&text=&type=phone_number&app_absent=0"
+            await self.page.goto(url, timeout=self.clock.timeout(20000))
+            await self.page.wait_for_selector("#main", state="visible", timeout=self.clock.timeout(20000))
+            await self.clock.sleep(0.4)
+            self.scheduler.note_chat(chat_key(phone))
             logger.info(f"[WA] Restored reply context using phone hint: {phone}")
             return True
         except Exception as e:
@@ -255,42 +446,400 @@ class WhatsAppClient:
             return False
 
     def run(self):
-        """Entry point for the background thread."""
+        """Entry point for the background thread; restarts the agent after failures when supervised."""
+        self.startup.ensure_begun()
+        self.startup.mark("thread_start")
+        self.thread_id = threading.get_ident()
         self.is_running = True
+        self.stopped = False
+        self._standby_requested = False
+        supervised = self.plugin.get_setting('supervisor_enabled', True, type=bool)
+        self.supervisor.max_restarts = self.plugin.get_setting('supervisor_max_restarts', 5, type=int)
+        self.supervisor.heartbeat_timeout = self.plugin.get_setting('supervisor_heartbeat_seconds', 180, type=int)
+        self.supervisor.reset()
+        self._configure_downloads()
+        self._configure_validation()
+        self._configure_intake()
+        self._configure_known_hashes()
+
+        try:
+            while True:
+                reason = self._run_attempt()
+                if not self.startup.finished:
+                    self.startup.finish("stopped" if not self.is_running else "failed")
+                    self.startup.save()
+                if reason is None or not self.is_running:
+                    break
+                delay = self.supervisor.next_delay() if supervised else None
+                if delay is None:
+                    self.plugin.update_status(f"Agent stopped after failure: {self.supervisor.last_failure}")
+                    break
+                self.plugin.update_status(f"Recovering from {reason}; restarting in {delay:.0f}s...")
+                logger.warning(f"[WA] Restarting agent in {delay:.0f}s (restart {self.supervisor.restarts}).")
+                if self.supervisor.wait(delay):
+                    break
+                self.startup.begin()
+        finally:
+            self.is_running = False
+            self.is_logged_in = False
+            self.standby = False
+            self.outbox.fail_pending("WhatsApp Agent stopped.")
+            self.memory.stop()
+            self.journal.stop()
+            self.downloads.stop()
+            self.validator.close()
+            self.intake.close()
+            self.known.close()
+            self.perceptual.close()
+            self._settle_waiters(self._ready_waiters, error=RuntimeError("WhatsApp Agent stopped."), stopped=True)
+            self._settle_waiters(self._stopped_waiters, result="stopped")
+            self._settle_waiters(self._standby_waiters, result="stopped")
+
+    def _run_attempt(self):
+        """One agent attempt on a fresh event loop; returns the failure reason, or None once stopped."""
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
-        
+        # Loop-bound primitives from a previous attempt cannot be reused.
+        self._send_lock = asyncio.Lock()
+        self.scheduler.reset()
         try:
-            self.loop.run_until_complete(self.async_run())
+            return self.loop.run_until_complete(self.supervisor.watch(self))
         except Exception as e:
             logger.error(f"WhatsApp Agent crashed: {e}")
             logger.error(traceback.format_exc())
             self.plugin.update_status(f"Error: {e}")
+            return "crash"
         finally:
-            self.is_running = False
             self.is_logged_in = False
-            if self.loop.is_running():
-                self.loop.close()
+            try:
+                self.loop.run_until_complete(asyncio.wait_for(self._close_browser(), timeout=30))
+            except Exception as e:
+                logger.warning(f"[WA] Browser teardown did not finish cleanly: {e}")
+            self._close_loop()
+
+    def _close_loop(self):
+        """Cancel what is left on the attempt's loop and close it."""
+        try:
+            pending = [task for task in asyncio.all_tasks(self.loop) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.wait(pending, timeout=5))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        except Exception as e:
+            logger.warning(f"[WA] Could not drain agent loop: {e}")
+        finally:
+            self.loop.close()
+
+    def start_profiling(self, seconds: float = 30, mode: str = "sampling") -> tuple[bool, str]:
+        """Profile the agent thread for ``seconds``; callable from any thread."""
+        if not self.is_running:
+            return False, "WhatsApp Agent is not running."
+        return self.profiler.start(self.loop, self.thread_id, seconds=seconds, mode=mode)
 
     def stop(self):
-        """Signal the background thread to stop."""
+        """Signal the background thread to stop; it tears the browser down itself."""
+        self.is_running = False
+        self._standby_requested = False
+        self.profiler.stop()
+        self.supervisor.request_stop()
+
+    def enter_standby(self) -> bool:
+        """Stop working but keep the browser warm for ``resume``; callable from any thread."""
+        loop = self.loop
+        if not self.is_running or not self.is_logged_in or loop is None or not loop.is_running():
+            return False
+        self.profiler.stop()
+        self._standby_requested = True  # set here so that an immediate resume() sees it
+        try:
+            loop.call_soon_threadsafe(self._begin_standby)
+        except RuntimeError:
+            self._standby_requested = False
+            return False
+        return True
+
+    def resume(self) -> bool:
+        """Leave standby (or a pending standby request); callable from any thread."""
+        loop = self.loop
+        if not (self.standby or self._standby_requested) or loop is None or not loop.is_running():
+            return False
+        try:
+            loop.call_soon_threadsafe(self._end_standby)
+        except RuntimeError:
+            return False
+        return True
+
+    def enter_standby_async(self) -> concurrent.futures.Future:
+        """``enter_standby`` as a settled future, the shape the worker proxy answers in."""
+        future = concurrent.futures.Future()
+        future.set_result(self.enter_standby())
+        return future
+
+    def resume_async(self) -> concurrent.futures.Future:
+        """``resume`` as a settled future, the shape the worker proxy answers in."""
+        future = concurrent.futures.Future()
+        future.set_result(self.resume())
+        return future
+
+    def _begin_standby(self):
+        if not self._standby_requested or not self.is_running:
+            return
         self.is_running = False
-        if self.loop and self.loop.is_running():
-            asyncio.run_coroutine_threadsafe(self.async_stop(), self.loop)
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+
+    def _end_standby(self):
+        if not self._standby_requested and not self.standby:
+            return
+        self._standby_requested = False
+        self.is_running = True
+        self.startup.begin(kind="warm")
+        self.startup.mark("thread_start")
+        if self._resume_event is not None:
+            self._resume_event.set()
+
+    def when_ready(self) -> concurrent.futures.Future:
+        """Future resolved once the agent is logged in and polling (failed if it stops first)."""
+        return self._waiter(self._ready_waiters, lambda: self.is_logged_in and self.is_running)
+
+    def when_stopped(self, standby: bool = False) -> concurrent.futures.Future:
+        """Future resolved with "stopped" once the agent thread exits; with ``standby`` also with "standby" once parked."""
+        if not standby:
+            return self._waiter(self._stopped_waiters, lambda: "stopped" if self.stopped else None)
+        return self._waiter(
+            self._standby_waiters,
+            lambda: "stopped" if self.stopped else ("standby" if self.standby else None),
+        )
+
+    def _waiter(self, waiters: list, current) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._waiters_lock:
+            result = current()
+            if result:
+                future.set_result(result)
+            elif self.stopped and waiters is self._ready_waiters:
+                future.set_exception(RuntimeError("WhatsApp Agent is not running."))
+            else:
+                waiters.append(future)
+        return future
+
+    def _settle_waiters(self, waiters: list, result=True, error=None, stopped: bool = False):
+        with self._waiters_lock:
+            if stopped:
+                self.stopped = True
+            pending = list(waiters)
+            waiters.clear()
+        for future in pending:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def submit_outbound(self, factory, label: str = "outbound", replay: bool = True):
+        """
+        Run ``factory()`` on the agent loop from any thread; returns a concurrent future.
+
+        Work submitted while the agent is restarting waits for the next login.
+        ``replay=False`` marks work that must not run twice (user sends).
+        """
+        entry = self.outbox.submit(factory, label=label, replay=replay)
+        loop = self.loop
+        if self.is_logged_in and loop is not None and loop.is_running():
+            self.outbox.dispatch(loop)
+        return entry.future
+
+    def _on_connection_change(self, old: str, new: str):
+        """Hold queued page work while WhatsApp cannot send; release it as soon as it can."""
+        if new in DEGRADED_STATES or new == STATE_LOGGED_OUT:
+            self.scheduler.pause()
+        elif new == STATE_CONNECTED:
+            self.scheduler.resume()
+
+    async def _wait_while_degraded(self):
+        """Pause intake until the connection is back; counts as progress for the supervisor."""
+        labels = {
+            "phone_offline": "phone not connected",
+            "reconnecting": "reconnecting",
+            "conflict": "WhatsApp is open in another window",
+        }
+        self.plugin.update_status(f"Paused: {labels.get(self.connection.state, self.connection.state)}.")
+        while self.is_running and self.connection.degraded:
+            self.last_progress_at = time.time()
+            await self.connection.wait_change(5)
+        if self.is_running and self.connection.connected:
+            self.plugin.update_status("Connected and Listening.")
+
+    def _on_page_crash(self, *args):
+        if self.standby:
+            self.page = None  # the browser is relaunched on resume
+            return
+        self.supervisor.report("page_crashed")
 
-    async def async_stop(self):
-        """Cleanup playwright resources."""
+    def _on_context_close(self, *args):
+        if self.standby:
+            self.context = None
+            self.page = None
+            return
+        self.supervisor.report("context_closed")
+
+    async def _standby(self) -> bool:
+        """Park the agent until ``resume``; returns False if the browser could not be reopened."""
+        self.standby = True
+        self._resume_event = asyncio.Event()
+        if not self.startup.finished:
+            self.startup.finish("standby")
+            await asyncio.to_thread(self.startup.save)
+        self._settle_waiters(self._standby_waiters, result="standby")
+        keep_context = self.plugin.get_setting('standby_keep_context', True, type=bool)
+        logger.info(f"[WA] Agent in warm standby ({'page kept' if keep_context else 'driver kept'}).")
+        try:
+            if not keep_context:
+                await self._close_context()
+            self.plugin.update_status("Standby (browser kept warm).")
+            while self._standby_requested:
+                await self._resume_event.wait()
+                self._resume_event.clear()
+        finally:
+            self.standby = False
+            self._resume_event = None
+        self.plugin.update_status("Resuming...")
+        if self.page is None and self.context is not None:
+            await self._close_context()
+        if self.context is None:
+            return await self._open_whatsapp()
+        return True
+
+    async def _close_context(self):
+        """Close the browser context and its page; the Playwright driver stays up."""
+        await self.tracer.stop()
+        context, self.context, self.page = self.context, None, None
+        if context:
+            # route_from_har(update=True) only writes the HAR when the context closes.
+            try:
+                await context.close()
+            except Exception:
+                pass
+        await self.recorder.stop()
+
+    async def _close_browser(self):
+        """Close the browser and everything bound to this attempt's loop."""
+        await self._close_context()
+        self.clock.stop()
+        self.loop_monitor.stop()
         if self.browser:
-            await self.browser.close()
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
             self.browser = None
         if self.playwright:
-            await self.playwright.stop()
+            try:
+                await self.playwright.stop()
+            except Exception:
+                pass
             self.playwright = None
 
+    async def _start_diagnostics_trace(self):
+        """Keep a rolling trace and dump it when a stage fails or blows its latency budget."""
+        self.tracer.window_seconds = self.plugin.get_setting('diagnostics_trace_window', 180, type=int)
+        self.tracer.quota_bytes = self.plugin.get_setting('diagnostics_trace_quota_mb', 200, type=int) * 1024 * 1024
+        if await self.tracer.start(self.context):
+            self.metrics.set_budgets(DEFAULT_STAGE_BUDGETS, self._on_stage_over_budget)
+
+    def _on_stage_over_budget(self, name: str, seconds: float, labels: dict):
+        logger.warning(f"[WA] Stage '{name}' {labels or ''} took {seconds:.1f}s (budget {DEFAULT_STAGE_BUDGETS.get(name)}s)")
+        self.metrics.inc("diagnostics.over_budget", stage=name)
+        self.tracer.request_dump(f"slow_{name}")
+
     async def async_run(self):
         """The main async loop running the playwright browser."""
         self.plugin.update_status("Starting browser...")
+        if self.plugin.get_setting('loop_monitor', True, type=bool):
+            self.loop_monitor.block_threshold = self.plugin.get_setting('loop_block_threshold_ms', 200, type=int) / 1000
+            self.loop_monitor.start()
+        if self.plugin.get_setting('event_journal', True, type=bool):
+            self.journal.max_bytes = self.plugin.get_setting('event_journal_max_mb', 10, type=int) * 1024 * 1024
+            self.journal.start()
+        memory_interval = self.plugin.get_setting('memory_snapshot_interval_min', 0, type=int)
+        if memory_interval > 0:
+            self.memory.start(memory_interval * 60)
         
+        if not await self._start_playwright():
+            return
+        if not await self._open_whatsapp():
+            return
+
+        # Wait for either QR code or successful login
+        self.plugin.update_status("Checking login status...")
+        
+        while self.is_running:
+            try:
+                if not self.connection.observed:
+                    await self.connection.refresh()
+
+                # Logged in (chats pane is visible); a degraded connection is paused inside the poll loop.
+                if self.connection.connected or self.connection.degraded:
+                    self.startup.mark("login_wait")
+                    self.is_logged_in = True
+                    self.last_progress_at = time.time()
+                    self.supervisor.recovered()
+                    self.plugin.update_status("Connected and Listening.")
+                    # Page work outside the inbound sweep (sends, notices) runs through the scheduler.
+                    scheduler_task = asyncio.create_task(self.scheduler.serve())
+                    self.outbox.dispatch(self.loop)
+                    self._settle_waiters(self._ready_waiters)
+                    # Start polling for new messages; a task so that standby can cancel just the poll.
+                    poll_task = self._poll_task = asyncio.create_task(self.poll_messages())
+                    try:
+                        await asyncio.wait({poll_task})
+                    finally:
+                        poll_task.cancel()
+                        self._poll_task = None
+                        self.scheduler.stop()
+                        scheduler_task.cancel()
+                    if self._standby_requested:
+                        self.is_logged_in = False
+                        if not await self._standby():
+                            return
+                        self.plugin.update_status("Checking login status...")
+                        continue
+                    if not poll_task.cancelled():
+                        poll_task.result()  # re-raise a crash of the poll loop
+                    if not self.is_running:
+                        break
+                    if poll_task.cancelled():
+                        continue  # standby was requested and withdrawn before the poll loop noticed
+                    # poll_messages returned because the session was logged out: wait for a new scan.
+                    self.is_logged_in = False
+                    self.plugin.update_status("Logged out of WhatsApp Web. Scan the QR code again.")
+                    continue
+
+                # Check for QR code
+                if self.connection.state in (STATE_QR_REQUIRED, STATE_LOGGED_OUT):
+                    qr_canvas = self.page.locator("canvas")
+                    self.startup.qr_required = True
+                    self.plugin.update_status("Please scan QR code to connect...")
+                    
+                    # You could optionally screenshot the QR and show it in the UI, 
+                    # but WhatsApp updates the QR frequently. 
+                    # A better way is to show the screenshot in the UI dynamically.
+                    # For now, we just tell the user to wait or we take a screenshot 
+                    # and save it to the plugin folder for the UI to load.
+                    qr_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qr.png")
+                    await qr_canvas.first.screenshot(path=qr_path)
+                    self.plugin.update_status(f"QR Ready. Open {qr_path} to scan.")
+
+                # Wake up on the next state change; the timeout keeps the QR screenshot fresh.
+                await self.connection.wait_change(2)
+                
+            except Exception as e:
+                logger.warning(f"Error during login check loop: {e}")
+                await self.clock.sleep(5)
+
+    async def _start_playwright(self) -> bool:
+        """Start the Playwright driver (kept across warm standby)."""
         # Ensure playwright is installed
         try:
             self.playwright = await async_playwright().start()
@@ -301,16 +850,23 @@ class WhatsAppClient:
                     "[WA] Playwright dependency missing in frozen runtime. "
                     "Bundle plugin dependencies instead of runtime pip install."
                 )
-                return
+                self.supervisor.fatal("Playwright missing")
+                return False
             self.plugin.update_status("Playwright package missing. Please wait...")
             import subprocess
             subprocess.run([sys.executable, "-m", "pip", "install", "playwright"], check=True)
             self.playwright = await async_playwright().start()
+        self.startup.mark("playwright_start")
+        return True
 
+    async def _open_whatsapp(self) -> bool:
+        """Launch the persistent Chromium context and load WhatsApp Web."""
+        self.plugin.update_status("Launching browser...")
         # Launch Chromium with persistent context to save login session
         try:
             self.context = await self.playwright.chromium.launch_persistent_context(
                 user_data_dir=self.user_data_dir,
+                downloads_path=self.downloads.incoming_dir(),
                 headless=True,
                 args=[
                     '--disable-blink-features=AutomationControlled', # Avoid bot detection
@@ -325,10 +881,12 @@ class WhatsAppClient:
                 if not await self._install_playwright_chromium():
                     self.plugin.update_status("Failed to install Playwright browser binaries.")
                     logger.error("[WA] Playwright browser installation failed.")
-                    return
+                    self.supervisor.fatal("Chromium install failed")
+                    return False
                 # Retry launch
                 self.context = await self.playwright.chromium.launch_persistent_context(
                     user_data_dir=self.user_data_dir,
+                    downloads_path=self.downloads.incoming_dir(),
                     headless=True,
                     args=[
                         '--disable-blink-features=AutomationControlled',
@@ -339,695 +897,863 @@ class WhatsAppClient:
                 )
             else:
                 raise e
+        self.startup.mark("browser_launch")
         
         self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+        self.page.on("crash", self._on_page_crash)
+        self.context.on("close", self._on_context_close)
+        await self.clock.attach(self.page)
+        self.connection.clock = self.clock
+        self.connection.use_here = self.plugin.get_setting('connection_use_here', False, type=bool)
+        await self.connection.attach(self.page)
+
+        if self.plugin.get_setting('diagnostics_trace', False, type=bool):
+            await self._start_diagnostics_trace()
+
+        if self.har_replay_path:
+            await self.context.route_from_har(self.har_replay_path, url=WHATSAPP_HOSTS, not_found="abort")
+        elif self.plugin.get_setting('session_recorder', False, type=bool):
+            await self.recorder.start(self.context)
         
         # Set a realistic user agent
         await self.page.set_extra_http_headers({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"})
         
+        self.startup.mark("page_setup")
         self.plugin.update_status("Navigating to WhatsApp Web...")
         try:
-            await self.page.goto("https://web.whatsapp.com/", timeout=60000)
+            await self.page.goto(self.web_url, timeout=self.clock.timeout(60000))
         except Exception as e:
             self.plugin.update_status("Failed to load WhatsApp Web. Check connection.")
-            return
-
-        # Wait for either QR code or successful login
-        self.plugin.update_status("Checking login status...")
-        
-        while self.is_running:
-            try:
-                # Check if we are logged in (chats pane is visible)
-                logged_in = await self.page.locator("div#pane-side").count() > 0
-                
-                if logged_in:
-                    self.is_logged_in = True
-                    self.plugin.update_status("Connected and Listening.")
-                    # Start polling for new messages
-                    await self.poll_messages()
-                    break
-                    
-                # Check for QR code
-                qr_canvas = self.page.locator("canvas")
-                if await qr_canvas.count() > 0:
-                    self.plugin.update_status("Please scan QR code to connect...")
-                    
-                    # You could optionally screenshot the QR and show it in the UI, 
-                    # but WhatsApp updates the QR frequently. 
-                    # A better way is to show the screenshot in the UI dynamically.
-                    # For now, we just tell the user to wait or we take a screenshot 
-                    # and save it to the plugin folder for the UI to load.
-                    qr_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qr.png")
-                    await qr_canvas.first.screenshot(path=qr_path)
-                    self.plugin.update_status(f"QR Ready. Open {qr_path} to scan.")
-
-                # Wait before checking again
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                logger.warning(f"Error during login check loop: {e}")
-                await asyncio.sleep(5)
+            return False
+        self.startup.mark("navigate")
+        return True
 
     async def poll_messages(self):
         """Polls for new unread messages in the chat list."""
         logger.info("WhatsApp Agent ready for messages.")
         
-        # Temporary directory to save downloads
-        plugin_dir = os.path.dirname(os.path.abspath(__file__))
-        downloads_dir = os.path.join(plugin_dir, "downloads")
-        os.makedirs(downloads_dir, exist_ok=True)
+        os.makedirs(self.downloads_dir, exist_ok=True)
         
         while self.is_running:
+            self.last_poll_at = time.time()
+            self.last_progress_at = self.last_poll_at
+            if self.connection.state in (STATE_QR_REQUIRED, STATE_LOGGED_OUT):
+                return
+            if self.connection.degraded:
+                await self._wait_while_degraded()
+                continue
             try:
-                unread_chats = await self._collect_unread_badges()
+                await self.tracer.maybe_rotate()
+                # Hold the page for the sweep; queued sends/notices run at checkpoints or after it.
+                async with self.scheduler.lease(PRIORITY_INBOUND):
+                    with self.metrics.timer("inbound.badge_detection"):
+                        unread_chats = await self._collect_unread_badges()
+                    self.metrics.gauge("inbound.unread_chats").set(len(unread_chats))
+                    if unread_chats:
+                        await self.recorder.capture(self.page, "chat_list")
                 
-                # Use a set to avoid processing the same chat multiple times if selectors overlap
-                # (Playwright locators are unhashable though, so just process them and they'll be read)
-                processed_in_this_loop = False
+                    # Use a set to avoid processing the same chat multiple times if selectors overlap
+                    # (Playwright locators are unhashable though, so just process them and they'll be read)
+                    processed_in_this_loop = False
                 
-                for chat in unread_chats:
-                    try:
-                        # Open the unread chat by clicking its row (not the unread badge itself).
-                        if not await self._open_chat_from_badge(chat):
-                            continue
+                    for chat, row_info in unread_chats:
+                        # Preemption point: user sends, and replies for the chat still open, go first.
+                        if await self.scheduler.checkpoint():
+                            # A preempting job moved the page; badge locators are stale now.
+                            break
+                        if self.connection.degraded or self.connection.state in (STATE_QR_REQUIRED, STATE_LOGGED_OUT):
+                            break  # disconnected mid-sweep; handled before the next sweep
+                        self.last_progress_at = time.time()
+                        try:
+                            # Open the unread chat by clicking its row (not the unread badge itself).
+                            with self.metrics.timer("inbound.chat_open"):
+                                opened = await self._open_chat_from_badge(chat)
+                            if not opened:
+                                self.metrics.inc("inbound.chat_open_failed")
+                                continue
                             
-                        await asyncio.sleep(1.5) # wait for messages to load and read state to update
-                        processed_in_this_loop = True
+                            await self.clock.sleep(1.5) # wait for messages to load and read state to update
+                            processed_in_this_loop = True
                         
-                        # Apply Sender Filtering & Extract Chat Header unconditionally
-                        header_title = ""
-                        allowed_sender = self.plugin.get_setting('allowed_sender', "")
+                            # Apply Sender Filtering & Extract Chat Header unconditionally
+                            header_started = time.perf_counter()
+                            header_title = ""
+                            display_title = ""
+                            chat_phone = ""
+                            allowed_sender = self.plugin.get_setting('allowed_sender', "")
                         
-                        try:
-                            # Look for chat title in the open chat header
-                            header_element = self.page.locator("#main header").first
-                            if await header_element.count() > 0:
-                                # Strategy 1: The standard span[dir='auto'] usually strictly holds the name/number
-                                span_auto = header_element.locator("span[dir='auto']").first
-                                if await span_auto.count() > 0:
-                                    header_title = await span_auto.inner_text()
-                                    logger.info(f"[WA] Strategy 1 extracted: '{header_title}'")
+                            try:
+                                # Look for chat title in the open chat header
+                                header_element = self.page.locator("#main header").first
+                                if await header_element.count() > 0:
+                                    # Strategy 1: The standard span[dir='auto'] usually strictly holds the name/number
+                                    span_auto = header_element.locator("span[dir='auto']").first
+                                    if await span_auto.count() > 0:
+                                        header_title = await span_auto.inner_text()
+                                        logger.info(f"[WA] Strategy 1 extracted: '{header_title}'")
                                     
-                                # Strategy 2: Look for elements with a title attribute, discarding "profile details"
-                                if not header_title or header_title.lower().strip() == "profile details":
-                                    elements_with_title = await header_element.locator("[title]").all()
-                                    for el in elements_with_title:
-                                        t = await el.get_attribute("title")
-                                        logger.info(f"[WA] Strategy 2 inspecting title attribute: '{t}'")
-                                        if t and t.strip() and t.lower().strip() != "profile details" and not t.lower().strip().startswith("profile"):
-                                            header_title = t
-                                            break
-                                            
-                                # Strategy 3: Raw text extraction, taking the first valid line
-                                if not header_title or header_title.lower().strip() == "profile details":
-                                    full_text = await header_element.inner_text()
-                                    logger.info(f"[WA] Strategy 3 raw header inner_text: '{full_text}'")
-                                    if full_text:
-                                        for line in full_text.split('\n'):
-                                            line = line.strip()
-                                            if line and line.lower() != "profile details" and not line.lower().startswith("profile"):
-                                                header_title = line
+                                    # Strategy 2: Look for elements with a title attribute, discarding "profile details"
+                                    if not header_title or header_title.lower().strip() == "profile details":
+                                        elements_with_title = await header_element.locator("[title]").all()
+                                        for el in elements_with_title:
+                                            t = await el.get_attribute("title")
+                                            logger.info(f"[WA] Strategy 2 inspecting title attribute: '{t}'")
+                                            if t and t.strip() and t.lower().strip() != "profile details" and not t.lower().strip().startswith("profile"):
+                                                header_title = t
                                                 break
-                                                
-                                # Strategy 4 (OpenClaw style): Extract actual raw phone number from incoming message data-ids, bypassing contact names
-                                try:
-                                    # Wait a moment for messages to load in the pane
-                                    msg_locator = self.page.locator("div.message-in, div[data-id*='false_']")
-                                    msg_count = await msg_locator.count()
-                                    logger.info(f"[WA] Strategy 4 found {msg_count} incoming messages in pane.")
-                                    
-                                    if msg_count > 0:
-                                        # Check the last few messages to find a valid data-id
-                                        for i in range(msg_count - 1, max(-1, msg_count - 5), -1):
-                                            msg_element = msg_locator.nth(i)
-                                            data_id = await msg_element.get_attribute("data-id")
-                                            if data_id:
-                                                import re
-                                                # Pattern usually looks like "false_966592328502@c.us_..."
-                                                number_match = re.search(r'false_(\d+)(?:@c\.us|@s\.whatsapp\.net|@g\.us)', data_id)
-                                                if number_match:
-                                                    extracted_number = number_match.group(1)
-                                                    logger.info(f"[WA] Strategy 4 successfully extracted raw phone number: '{extracted_number}' from '{data_id}'")
-                                                    # We append this raw number to the header title to guarantee a match against the user's settings!
-                                                    header_title += " " + extracted_number
+                                            
+                                    # Strategy 3: Raw text extraction, taking the first valid line
+                                    if not header_title or header_title.lower().strip() == "profile details":
+                                        full_text = await header_element.inner_text()
+                                        logger.info(f"[WA] Strategy 3 raw header inner_text: '{full_text}'")
+                                        if full_text:
+                                            for line in full_text.split('\n'):
+                                                line = line.strip()
+                                                if line and line.lower() != "profile details" and not line.lower().startswith("profile"):
+                                                    header_title = line
                                                     break
-                                except Exception as e:
-                                    logger.warning(f"[WA] Strategy 4 failed to extract raw number: {e}")
-                        except Exception as e:
-                            logger.warning(f"Could not read chat header: {e}")
+                                                
+                                    display_title = header_title
 
-                        # Continue with sender filtering if setting exists
-                        if allowed_sender and allowed_sender.strip():
-                            if not header_title:
-                                logger.info(f"Skipping messages: empty chat title extracted (matched against allowed '{allowed_sender}')")
-                                continue
-                                
-                            import re
-                            
-                            def normalize_for_match(val):
-                                val = val.lower().strip()
-                                digits = re.sub(r'\D', '', val)
-                                if len(digits) >= 7:
-                                    # It's likely a phone number. 
-                                    # Discard country codes and leading zeros by taking the last 9 digits.
-                                    # If it's shorter than 9, just take as many as we confidently have.
-                                    return digits[-9:]
-                                else:
-                                    # It's a contact name, strip spaces and symbols
-                                    return re.sub(r'[^a-z0-9]', '', val)
+                                    # Strategy 4 (OpenClaw style): Extract actual raw phone number from incoming message data-ids, bypassing contact names
+                                    try:
+                                        # Wait a moment for messages to load in the pane
+                                        msg_locator = self.page.locator("div.message-in, div[data-id*='false_']")
+                                        msg_count = await msg_locator.count()
+                                        logger.info(f"[WA] Strategy 4 found {msg_count} incoming messages in pane.")
                                     
-                            normalized_allowed = normalize_for_match(allowed_sender)
-                            normalized_header = normalize_for_match(header_title)
+                                        if msg_count > 0:
+                                            # Check the last few messages to find a valid data-id
+                                            for i in range(msg_count - 1, max(-1, msg_count - 5), -1):
+                                                msg_element = msg_locator.nth(i)
+                                                data_id = await msg_element.get_attribute("data-id")
+                                                if data_id:
+                                                    import re
+                                                    # Pattern usually looks like "false_966592328502@c.us_..."
+                                                    number_match = re.search(r'false_(\d+)(?:@c\.us|@s\.whatsapp\.net|@g\.us)', data_id)
+                                                    if number_match:
+                                                        extracted_number = number_match.group(1)
+                                                        logger.info(f"[WA] Strategy 4 successfully extracted raw phone number: '{extracted_number}' from '{data_id}'")
+                                                        # We append this raw number to the header title to guarantee a match against the user's settings!
+                                                        header_title += " " + extracted_number
+                                                        chat_phone = extracted_number
+                                                        break
+                                    except Exception as e:
+                                        logger.warning(f"[WA] Strategy 4 failed to extract raw number: {e}")
+                            except Exception as e:
+                                logger.warning(f"Could not read chat header: {e}")
+
+                            self.metrics.observe("inbound.header_resolution", time.perf_counter() - header_started)
+                            self.scheduler.note_chat(chat_key(
+                                chat_phone
+                                or self._extract_phone_candidate({'whatsapp_chat_title': header_title or ""})
+                                or header_title
+                            ))
+
+                            # Continue with sender filtering if setting exists
+                            if allowed_sender and allowed_sender.strip():
+                                if not header_title:
+                                    logger.info(f"Skipping messages: empty chat title extracted (matched against allowed '{allowed_sender}')")
+                                    continue
+
+                                normalized_allowed = self._normalize_for_match(allowed_sender)
+                                normalized_header = self._normalize_for_match(header_title)
                             
-                            if normalized_allowed not in normalized_header and normalized_header not in normalized_allowed:
-                                logger.info(f"Skipping messages: chat '{header_title}' doesn't match allowed sender '{allowed_sender}'")
-                                continue
+                                if normalized_allowed not in normalized_header and normalized_header not in normalized_allowed:
+                                    logger.info(f"Skipping messages: chat '{header_title}' doesn't match allowed sender '{allowed_sender}'")
+                                    continue
                                 
-                        # Get incoming messages from the active chat only.
-                        incoming_messages = self.page.locator("div.message-in")
-                        incoming_count = await incoming_messages.count()
-                        if incoming_count > 0:
-                            last_message = incoming_messages.nth(incoming_count - 1)
-                            message_data_id = (await last_message.get_attribute("data-id")) or ""
-                            message_target = await self._resolve_incoming_message(message_data_id)
-                            if not message_target:
-                                logger.warning("[WA] Incoming message disappeared before processing; skipping this cycle.")
-                                continue
-
-                            has_downloaded = False
-                            message_key = await self._get_message_key(message_target, header_title)
+                            # Get incoming messages from the active chat only.
+                            incoming_messages = self.page.locator("div.message-in")
+                            incoming_count = await incoming_messages.count()
+                            if incoming_count > 0:
+                                last_message = incoming_messages.nth(incoming_count - 1)
+                                message_data_id = (await last_message.get_attribute("data-id")) or ""
+                                message_target = await self._resolve_incoming_message(message_data_id)
+                                if not message_target:
+                                    logger.warning("[WA] Incoming message disappeared before processing; skipping this cycle.")
+                                    continue
+
+                                has_downloaded = False
+                                message_key = await self._get_message_key(message_target, header_title)
+                                # Remember where this message lives so late notices can route back here.
+                                self.routing.record(
+                                    message_key,
+                                    row_id=row_info.get("row_id"),
+                                    phone=chat_phone or self._extract_phone_candidate(
+                                        {'whatsapp_chat_title': header_title or ""},
+                                        message_key
+                                    ),
+                                    title=display_title or header_title,
+                                    offset=row_info.get("offset"),
+                                )
+                                await self.recorder.capture(
+                                    self.page,
+                                    "chat",
+                                    message_key=message_key,
+                                    row_id=row_info.get("row_id") or "",
+                                    title=display_title or header_title,
+                                )
+                                self.journal.emit("intake", "detected", message_key=message_key,
+                                                  chat=display_title or header_title)
                             
-                            # 1. Check for documents/files with robust selectors.
-                            # WhatsApp often hides document download buttons until message hover.
-                            try:
-                                await message_target.hover(timeout=1200)
-                            except Exception:
-                                pass
-
-                            document_download_selectors = [
-                                "span[data-icon='down']",
-                                "span[data-icon='arrow-down']",
-                                "span[data-icon='download']",
-                                "span[data-icon='ic-download']",
-                                "div[role='button'][aria-label='Download']",
-                                "div[role='button'][aria-label='تنزيل']",
-                                "button[aria-label='Download']",
-                                "button[aria-label='تنزيل']",
-                            ]
-                            download_btn = None
-                            for selector in document_download_selectors:
-                                candidate = message_target.locator(selector).first
-                                if await candidate.count() > 0:
-                                    download_btn = candidate
-                                    break
+                                # 1. Check for documents/files with robust selectors.
+                                # WhatsApp often hides document download buttons until message hover.
+                                try:
+                                    await message_target.hover(timeout=self.clock.timeout(1200))
+                                except Exception:
+                                    pass
+
+                                document_download_selectors = [
+                                    "span[data-icon='down']",
+                                    "span[data-icon='arrow-down']",
+                                    "span[data-icon='download']",
+                                    "span[data-icon='ic-download']",
+                                    "div[role='button'][aria-label='Download']",
+                                    "div[role='button'][aria-label='تنزيل']",
+                                    "button[aria-label='Download']",
+                                    "button[aria-label='تنزيل']",
+                                ]
+                                download_btn = None
+                                for selector in document_download_selectors:
+                                    candidate = message_target.locator(selector).first
+                                    if await candidate.count() > 0:
+                                        download_btn = candidate
+                                        break
 
-                            document_indicators = [
-                                "span[data-icon='document']",
-                                "span[data-icon='doc']",
-                                "div[aria-label*='Document']",
-                                "div[aria-label*='مستند']",
-                                "span:has-text('.pdf')",
-                            ]
-                            is_document_like = False
-                            for selector in document_indicators:
-                                indicator = message_target.locator(selector).first
-                                if await indicator.count() > 0:
-                                    is_document_like = True
-                                    break
+                                document_indicators = [
+                                    "span[data-icon='document']",
+                                    "span[data-icon='doc']",
+                                    "div[aria-label*='Document']",
+                                    "div[aria-label*='مستند']",
+                                    "span:has-text('.pdf')",
+                                ]
+                                is_document_like = False
+                                for selector in document_indicators:
+                                    indicator = message_target.locator(selector).first
+                                    if await indicator.count() > 0:
+                                        is_document_like = True
+                                        break
 
-                            if download_btn or is_document_like:
-                                logger.info("Found downloadable media attachment.")
-                                # Avoid typing a reply before document download. Sending UI actions here can
-                                # trigger list rerenders and make the document bubble disappear from DOM.
+                                if download_btn or is_document_like:
+                                    logger.info("Found downloadable media attachment.")
+                                    # Avoid typing a reply before document download. Sending UI actions here can
+                                    # trigger list rerenders and make the document bubble disappear from DOM.
 
-                                file_path = None
-                                last_download_error = None
-                                try:
-                                    if download_btn:
-                                        for force_click in (False, True):
-                                            try:
-                                                async with self.page.expect_download(timeout=15000) as download_info:
-                                                    await download_btn.click(timeout=4000, force=force_click)
-                                                download = await download_info.value
-                                                file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                await download.save_as(file_path)
-                                                break
-                                            except Exception as click_error:
-                                                last_download_error = click_error
-                                                mode = "force-click" if force_click else "normal click"
-                                                logger.warning(f"[WA] Direct document download via {mode} failed: {click_error}")
-
-                                    # Fallback: open message menu and click Download for document bubbles.
-                                    if not file_path and is_document_like:
-                                        logger.info("[WA] Trying document download fallback via message menu.")
-                                        menu_openers = [
-                                            "span[data-icon='ic-chevron-down-menu']",
-                                            "span[data-icon='down-context']",
-                                            "div[role='button'][aria-label='Menu']",
-                                            "div[role='button'][aria-label='القائمة']",
-                                        ]
-                                        menu_opened = False
-                                        for opener_selector in menu_openers:
-                                            opener = message_target.locator(opener_selector).first
-                                            if await opener.count() == 0:
-                                                continue
-                                            try:
-                                                await opener.click(timeout=2500)
-                                                menu_opened = True
-                                                break
-                                            except Exception:
+                                    file_path = None
+                                    last_download_error = None
+                                    download_strategy = ""
+                                    download_started = time.perf_counter()
+                                    try:
+                                        if download_btn:
+                                            for force_click in (False, True):
+                                                self.last_progress_at = time.time()
                                                 try:
-                                                    await opener.click(timeout=2500, force=True)
-                                                    menu_opened = True
+                                                    async with self.page.expect_download(timeout=self.clock.timeout(15000)) as download_info:
+                                                        await download_btn.click(timeout=self.clock.timeout(4000), force=force_click)
+                                                    download = await download_info.value
+                                                    file_path = await self._land_download(download)
+                                                    download_strategy = "direct"
                                                     break
-                                                except Exception:
-                                                    continue
-
-                                        if menu_opened:
-                                            menu_download_selectors = [
-                                                "div[role='button']:has-text('Download')",
-                                                "div[role='button']:has-text('تنزيل')",
-                                                "li:has-text('Download')",
-                                                "li:has-text('تنزيل')",
+                                                except Exception as click_error:
+                                                    last_download_error = click_error
+                                                    mode = "force-click" if force_click else "normal click"
+                                                    logger.warning(f"[WA] Direct document download via {mode} failed: {click_error}")
+
+                                        # Fallback: open message menu and click Download for document bubbles.
+                                        if not file_path and is_document_like:
+                                            logger.info("[WA] Trying document download fallback via message menu.")
+                                            self.last_progress_at = time.time()
+                                            menu_openers = [
+                                                "span[data-icon='ic-chevron-down-menu']",
+                                                "span[data-icon='down-context']",
+                                                "div[role='button'][aria-label='Menu']",
+                                                "div[role='button'][aria-label='القائمة']",
                                             ]
-                                            for menu_selector in menu_download_selectors:
-                                                menu_item = self.page.locator(menu_selector).first
-                                                if await menu_item.count() == 0:
+                                            menu_opened = False
+                                            for opener_selector in menu_openers:
+                                                opener = message_target.locator(opener_selector).first
+                                                if await opener.count() == 0:
                                                     continue
                                                 try:
-                                                    async with self.page.expect_download(timeout=15000) as download_info:
-                                                        await menu_item.click(timeout=3000)
-                                                    download = await download_info.value
-                                                    file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                    await download.save_as(file_path)
+                                                    await opener.click(timeout=self.clock.timeout(2500))
+                                                    menu_opened = True
                                                     break
-                                                except Exception as menu_error:
-                                                    last_download_error = menu_error
-                                                    logger.warning(f"[WA] Menu download attempt failed via '{menu_selector}': {menu_error}")
-                                                    continue
+                                                except Exception:
+                                                    try:
+                                                        await opener.click(timeout=self.clock.timeout(2500), force=True)
+                                                        menu_opened = True
+                                                        break
+                                                    except Exception:
+                                                        continue
+
+                                            if menu_opened:
+                                                menu_download_selectors = [
+                                                    "div[role='button']:has-text('Download')",
+                                                    "div[role='button']:has-text('تنزيل')",
+                                                    "li:has-text('Download')",
+                                                    "li:has-text('تنزيل')",
+                                                ]
+                                                for menu_selector in menu_download_selectors:
+                                                    menu_item = self.page.locator(menu_selector).first
+                                                    if await menu_item.count() == 0:
+                                                        continue
+                                                    self.last_progress_at = time.time()
+                                                    try:
+                                                        async with self.page.expect_download(timeout=self.clock.timeout(15000)) as download_info:
+                                                            await menu_item.click(timeout=self.clock.timeout(3000))
+                                                        download = await download_info.value
+                                                        file_path = await self._land_download(download)
+                                                        download_strategy = "menu"
+                                                        break
+                                                    except Exception as menu_error:
+                                                        last_download_error = menu_error
+                                                        logger.warning(f"[WA] Menu download attempt failed via '{menu_selector}': {menu_error}")
+                                                        continue
 
-                                        try:
-                                            await self.page.keyboard.press("Escape")
-                                            await asyncio.sleep(0.2)
-                                        except Exception:
-                                            pass
-
-                                    # Final fallback: open document bubble viewer and click top-bar download.
-                                    if not file_path and is_document_like:
-                                        logger.info("[WA] Trying document download fallback via viewer open.")
-                                        opened_viewer = False
-                                        viewer_targets = [
-                                            message_target.locator("span[data-icon='document']").first,
-                                            message_target.locator("div[aria-label*='Document']").first,
-                                            message_target.locator("div[aria-label*='مستند']").first,
-                                            message_target.locator("div[role='button']").first,
-                                            message_target,
-                                        ]
-                                        for target in viewer_targets:
                                             try:
-                                                if await target.count() == 0:
-                                                    continue
-                                                await target.click(timeout=3000)
-                                                opened_viewer = True
-                                                break
+                                                await self.page.keyboard.press("Escape")
+                                                await self.clock.sleep(0.2)
                                             except Exception:
+                                                pass
+
+                                        # Final fallback: open document bubble viewer and click top-bar download.
+                                        if not file_path and is_document_like:
+                                            logger.info("[WA] Trying document download fallback via viewer open.")
+                                            self.last_progress_at = time.time()
+                                            opened_viewer = False
+                                            viewer_targets = [
+                                                message_target.locator("span[data-icon='document']").first,
+                                                message_target.locator("div[aria-label*='Document']").first,
+                                                message_target.locator("div[aria-label*='مستند']").first,
+                                                message_target.locator("div[role='button']").first,
+                                                message_target,
+                                            ]
+                                            for target in viewer_targets:
                                                 try:
-                                                    await target.click(timeout=3000, force=True)
+                                                    if await target.count() == 0:
+                                                        continue
+                                                    await target.click(timeout=self.clock.timeout(3000))
                                                     opened_viewer = True
                                                     break
                                                 except Exception:
-                                                    continue
+                                                    try:
+                                                        await target.click(timeout=self.clock.timeout(3000), force=True)
+                                                        opened_viewer = True
+                                                        break
+                                                    except Exception:
+                                                        continue
+
+                                            if opened_viewer:
+                                                await self.clock.sleep(1.2)
+                                                viewer_download_selectors = [
+                                                    "div[role='button'][aria-label='Download']",
+                                                    "div[role='button'][aria-label='تنزيل']",
+                                                    "span[data-icon='download']",
+                                                    "span[data-icon='ic-download']",
+                                                    "button[title='Download']",
+                                                    "div[title='Download']",
+                                                    "div[title='تنزيل']",
+                                                ]
+                                                for selector in viewer_download_selectors:
+                                                    viewer_btn = self.page.locator(selector).first
+                                                    if await viewer_btn.count() == 0:
+                                                        continue
+                                                    self.last_progress_at = time.time()
+                                                    try:
+                                                        async with self.page.expect_download(timeout=self.clock.timeout(15000)) as download_info:
+                                                            await viewer_btn.click(timeout=self.clock.timeout(3000))
+                                                        download = await download_info.value
+                                                        file_path = await self._land_download(download)
+                                                        download_strategy = "viewer"
+                                                        break
+                                                    except Exception as viewer_error:
+                                                        last_download_error = viewer_error
+                                                        logger.warning(f"[WA] Viewer download attempt failed via '{selector}': {viewer_error}")
+                                                        continue
 
-                                        if opened_viewer:
-                                            await asyncio.sleep(1.2)
-                                            viewer_download_selectors = [
-                                                "div[role='button'][aria-label='Download']",
-                                                "div[role='button'][aria-label='تنزيل']",
-                                                "span[data-icon='download']",
-                                                "span[data-icon='ic-download']",
-                                                "button[title='Download']",
-                                                "div[title='Download']",
-                                                "div[title='تنزيل']",
-                                            ]
-                                            for selector in viewer_download_selectors:
-                                                viewer_btn = self.page.locator(selector).first
-                                                if await viewer_btn.count() == 0:
-                                                    continue
+                                            try:
+                                                await self.page.keyboard.press("Escape")
+                                                await self.clock.sleep(0.2)
+                                            except Exception:
+                                                pass
+
+                                        # Additional fallback: some builds trigger download by clicking document bubble itself.
+                                        if not file_path and is_document_like:
+                                            logger.info("[WA] Trying direct document bubble download fallback.")
+                                            self.last_progress_at = time.time()
+                                            for force_click in (False, True):
+                                                self.last_progress_at = time.time()
                                                 try:
-                                                    async with self.page.expect_download(timeout=15000) as download_info:
-                                                        await viewer_btn.click(timeout=3000)
+                                                    live_target = await self._resolve_incoming_message(message_data_id)
+                                                    if not live_target:
+                                                        try:
+                                                            await self.page.keyboard.press("Escape")
+                                                            await self.clock.sleep(0.15)
+                                                        except Exception:
+                                                            pass
+                                                        await self._restore_reply_context(
+                                                            {"whatsapp_chat_title": header_title or ""},
+                                                            message_key
+                                                        )
+                                                        live_target = await self._resolve_incoming_message(message_data_id)
+                                                    if not live_target:
+                                                        live_target = await self._resolve_incoming_message("")
+                                                    if not live_target:
+                                                        raise RuntimeError("Incoming message target is no longer available")
+                                                    async with self.page.expect_download(timeout=self.clock.timeout(12000)) as download_info:
+                                                        await live_target.click(timeout=self.clock.timeout(3000), force=force_click)
                                                     download = await download_info.value
-                                                    file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                    await download.save_as(file_path)
+                                                    file_path = await self._land_download(download)
+                                                    download_strategy = "bubble"
                                                     break
-                                                except Exception as viewer_error:
-                                                    last_download_error = viewer_error
-                                                    logger.warning(f"[WA] Viewer download attempt failed via '{selector}': {viewer_error}")
-                                                    continue
+                                                except Exception as bubble_error:
+                                                    last_download_error = bubble_error
+                                                    mode = "force-click" if force_click else "normal click"
+                                                    logger.warning(f"[WA] Direct bubble download via {mode} failed: {bubble_error}")
 
-                                        try:
-                                            await self.page.keyboard.press("Escape")
-                                            await asyncio.sleep(0.2)
-                                        except Exception:
-                                            pass
-
-                                    # Additional fallback: some builds trigger download by clicking document bubble itself.
-                                    if not file_path and is_document_like:
-                                        logger.info("[WA] Trying direct document bubble download fallback.")
-                                        for force_click in (False, True):
-                                            try:
-                                                live_target = await self._resolve_incoming_message(message_data_id)
-                                                if not live_target:
-                                                    try:
-                                                        await self.page.keyboard.press("Escape")
-                                                        await asyncio.sleep(0.15)
-                                                    except Exception:
-                                                        pass
-                                                    await self._restore_reply_context(
-                                                        {"whatsapp_chat_title": header_title or ""},
-                                                        message_key
-                                                    )
-                                                    live_target = await self._resolve_incoming_message(message_data_id)
-                                                if not live_target:
-                                                    live_target = await self._resolve_incoming_message("")
-                                                if not live_target:
-                                                    raise RuntimeError("Incoming message target is no longer available")
-                                                async with self.page.expect_download(timeout=12000) as download_info:
-                                                    await live_target.click(timeout=3000, force=force_click)
-                                                download = await download_info.value
-                                                file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                await download.save_as(file_path)
-                                                break
-                                            except Exception as bubble_error:
-                                                last_download_error = bubble_error
-                                                mode = "force-click" if force_click else "normal click"
-                                                logger.warning(f"[WA] Direct bubble download via {mode} failed: {bubble_error}")
+                                        # Event-based fallback: capture any download regardless of exact trigger selector.
+                                        if not file_path and is_document_like:
+                                            logger.info("[WA] Trying event-based download fallback.")
+                                            self.last_progress_at = time.time()
+                                            download_state = {"download": None}
 
-                                    # Event-based fallback: capture any download regardless of exact trigger selector.
-                                    if not file_path and is_document_like:
-                                        logger.info("[WA] Trying event-based download fallback.")
-                                        download_state = {"download": None}
+                                            def _on_download(download):
+                                                if download_state["download"] is None:
+                                                    download_state["download"] = download
 
-                                        def _on_download(download):
-                                            if download_state["download"] is None:
-                                                download_state["download"] = download
-
-                                        try:
-                                            self.page.on("download", _on_download)
-                                        except Exception:
-                                            _on_download = None
-
-                                        trigger_selectors = [
-                                            "div[role='button'][aria-label='Download']",
-                                            "div[role='button'][aria-label='تنزيل']",
-                                            "span[data-icon='download']",
-                                            "span[data-icon='ic-download']",
-                                            "#main a[download]",
-                                            "a[download]",
-                                        ]
-
-                                        for trigger_selector in trigger_selectors:
-                                            if file_path:
-                                                break
                                             try:
-                                                trigger = self.page.locator(trigger_selector).first
-                                                if await trigger.count() == 0:
-                                                    continue
-                                                await trigger.click(timeout=2500, force=True)
-                                            except Exception as trigger_error:
-                                                last_download_error = trigger_error
-                                                continue
+                                                self.page.on("download", _on_download)
+                                            except Exception:
+                                                _on_download = None
 
-                                            for _ in range(15):
-                                                if download_state["download"] is not None:
-                                                    break
-                                                await asyncio.sleep(0.2)
+                                            trigger_selectors = [
+                                                "div[role='button'][aria-label='Download']",
+                                                "div[role='button'][aria-label='تنزيل']",
+                                                "span[data-icon='download']",
+                                                "span[data-icon='ic-download']",
+                                                "#main a[download]",
+                                                "a[download]",
+                                            ]
 
-                                            if download_state["download"] is not None:
-                                                try:
-                                                    download = download_state["download"]
-                                                    file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                    await download.save_as(file_path)
+                                            for trigger_selector in trigger_selectors:
+                                                if file_path:
                                                     break
-                                                except Exception as save_error:
-                                                    last_download_error = save_error
-                                                    file_path = None
+                                                self.last_progress_at = time.time()
+                                                try:
+                                                    trigger = self.page.locator(trigger_selector).first
+                                                    if await trigger.count() == 0:
+                                                        continue
+                                                    await trigger.click(timeout=self.clock.timeout(2500), force=True)
+                                                except Exception as trigger_error:
+                                                    last_download_error = trigger_error
                                                     continue
 
-                                        if _on_download is not None:
-                                            try:
-                                                self.page.remove_listener("download", _on_download)
-                                            except Exception:
-                                                pass
+                                                for _ in range(15):
+                                                    if download_state["download"] is not None:
+                                                        break
+                                                    await self.clock.sleep(0.2)
 
-                                    # Last-resort fallback: pull blob bytes directly from the DOM/page.
-                                    if not file_path and is_document_like:
-                                        logger.info("[WA] Trying document download fallback via blob extraction.")
-                                        live_target = await self._resolve_incoming_message(message_data_id)
-                                        if live_target:
-                                            message_target = live_target
-                                        elif message_target is None:
-                                            await self._restore_reply_context(
-                                                {"whatsapp_chat_title": header_title or ""},
-                                                message_key
-                                            )
-                                            message_target = await self._resolve_incoming_message("")
-                                        file_path = await self._download_document_blob_fallback(
-                                            message_target,
-                                            downloads_dir
-                                        )
+                                                if download_state["download"] is not None:
+                                                    try:
+                                                        download = download_state["download"]
+                                                        file_path = await self._land_download(download)
+                                                        download_strategy = "event"
+                                                        break
+                                                    except Exception as save_error:
+                                                        last_download_error = save_error
+                                                        file_path = None
+                                                        continue
+
+                                            if _on_download is not None:
+                                                try:
+                                                    self.page.remove_listener("download", _on_download)
+                                                except Exception:
+                                                    pass
 
-                                    if file_path:
-                                        logger.info(f"Downloaded media document: {file_path}")
-                                        has_downloaded = True
-
-                                        # Forward to main app via API
-                                        if hasattr(self.plugin.api, 'processing'):
-                                            wa_metadata = {
-                                                'whatsapp_message_key': message_key,
-                                                'whatsapp_chat_title': header_title or "",
-                                                'whatsapp_sender_phone': self._extract_phone_candidate(
-                                                    {'whatsapp_chat_title': header_title or ""},
+                                        # Last-resort fallback: pull blob bytes directly from the DOM/page.
+                                        if not file_path and is_document_like:
+                                            logger.info("[WA] Trying document download fallback via blob extraction.")
+                                            self.last_progress_at = time.time()
+                                            live_target = await self._resolve_incoming_message(message_data_id)
+                                            if live_target:
+                                                message_target = live_target
+                                            elif message_target is None:
+                                                await self._restore_reply_context(
+                                                    {"whatsapp_chat_title": header_title or ""},
                                                     message_key
                                                 )
-                                            }
-                                            enqueued = self.plugin.api.processing.import_file_to_queue(
-                                                file_path,
-                                                "WhatsApp",
-                                                metadata=wa_metadata
-                                            )
-                                            if enqueued:
-                                                await self._reply_once(
-                                                    f"{message_key}:queued",
-                                                    "📥 Invoice received and added to processing queue."
-                                                )
-                                            else:
-                                                await self._reply_once(
-                                                    f"{message_key}:queue_failed",
-                                                    "❌ Failed to add invoice to queue."
-                                                )
+                                                message_target = await self._resolve_incoming_message("")
+                                            file_path = await self._download_document_blob_fallback(message_target)
+                                            if file_path:
+                                                download_strategy = "blob"
+
+                                        self.metrics.observe(
+                                            "inbound.media_download",
+                                            time.perf_counter() - download_started,
+                                            strategy=download_strategy or "failed"
+                                        )
+                                        self.journal.emit(
+                                            "intake", "download", message_key=message_key, chat=header_title,
+                                            kind="document", strategy=download_strategy or "failed",
+                                            duration=round(time.perf_counter() - download_started, 3),
+                                            outcome="ok" if file_path else "failed",
+                                            error=str(last_download_error) if not file_path and last_download_error else None,
+                                        )
+                                        if file_path:
+                                            logger.info(f"Downloaded media document: {file_path}")
+                                            has_downloaded = True
+
+                                            # Forward to main app via API
+                                            await self._enqueue_downloaded_file(file_path, message_key, header_title)
                                         else:
+                                            self.metrics.inc("inbound.download_failed", kind="document")
+                                            self.tracer.request_dump("document_download_failed")
+                                            if last_download_error:
+                                                logger.warning(f"[WA] Document download failed after all fallbacks: {last_download_error}")
                                             await self._reply_once(
-                                                f"{message_key}:queue_failed",
-                                                "❌ Failed to add invoice to queue."
+                                                f"{message_key}:download_failed",
+                                                "❌ Download failed."
                                             )
-                                    else:
-                                        if last_download_error:
-                                            logger.warning(f"[WA] Document download failed after all fallbacks: {last_download_error}")
+                                    except Exception as e:
+                                        logger.error(f"Error downloading media document: {e}")
+                                # 2. Check for displayed images (WhatsApp strips direct download buttons from displayed images)
+                                if not has_downloaded:
+                                    img_element = message_target.locator("img[src^='blob:']").first
+                                    if await img_element.count() > 0 and await img_element.is_visible():
+                                        logger.info("Found image message.")
+                                        image_started = time.perf_counter()
                                         await self._reply_once(
-                                            f"{message_key}:download_failed",
-                                            "❌ Download failed."
+                                            f"{message_key}:downloading",
+                                            "⏳ Downloading invoice..."
                                         )
-                                except Exception as e:
-                                    logger.error(f"Error downloading media document: {e}")
-                            # 2. Check for displayed images (WhatsApp strips direct download buttons from displayed images)
-                            if not has_downloaded:
-                                img_element = message_target.locator("img[src^='blob:']").first
-                                if await img_element.count() > 0 and await img_element.is_visible():
-                                    logger.info("Found image message.")
-                                    await self._reply_once(
-                                        f"{message_key}:downloading",
-                                        "⏳ Downloading invoice..."
-                                    )
-                                    try:
-                                        # Click image to open the media viewer.
-                                        # WhatsApp DOM is dynamic; image nodes can detach between locate and click.
-                                        opened_viewer = False
-                                        click_targets = [
-                                            img_element,
-                                            self.page.locator("#main div.message-in img[src^='blob:']").last
-                                        ]
-                                        for idx, target in enumerate(click_targets, start=1):
-                                            try:
-                                                if await target.count() == 0:
-                                                    continue
+                                        try:
+                                            # Click image to open the media viewer.
+                                            # WhatsApp DOM is dynamic; image nodes can detach between locate and click.
+                                            opened_viewer = False
+                                            click_targets = [
+                                                img_element,
+                                                self.page.locator("#main div.message-in img[src^='blob:']").last
+                                            ]
+                                            for idx, target in enumerate(click_targets, start=1):
                                                 try:
-                                                    await target.scroll_into_view_if_needed()
-                                                except Exception:
-                                                    pass
+                                                    if await target.count() == 0:
+                                                        continue
+                                                    try:
+                                                        await target.scroll_into_view_if_needed()
+                                                    except Exception:
+                                                        pass
 
-                                                try:
-                                                    await target.click(timeout=4000)
-                                                except Exception as click_error:
-                                                    logger.warning(
-                                                        f"[WA] Image click attempt {idx} failed, retrying force-click: {click_error}"
-                                                    )
-                                                    await target.click(timeout=4000, force=True)
+                                                    try:
+                                                        await target.click(timeout=self.clock.timeout(4000))
+                                                    except Exception as click_error:
+                                                        logger.warning(
+                                                            f"[WA] Image click attempt {idx} failed, retrying force-click: {click_error}"
+                                                        )
+                                                        await target.click(timeout=self.clock.timeout(4000), force=True)
 
-                                                opened_viewer = True
-                                                break
-                                            except Exception as e:
-                                                logger.warning(f"[WA] Image click attempt {idx} failed: {e}")
+                                                    opened_viewer = True
+                                                    break
+                                                except Exception as e:
+                                                    logger.warning(f"[WA] Image click attempt {idx} failed: {e}")
 
-                                        if not opened_viewer:
-                                            raise RuntimeError("Could not open image viewer from incoming message")
+                                            if not opened_viewer:
+                                                raise RuntimeError("Could not open image viewer from incoming message")
 
-                                        await asyncio.sleep(1.5)  # Allow viewer overlay to settle.
+                                            await self.clock.sleep(1.5)  # Allow viewer overlay to settle.
+                                            await self.recorder.capture(self.page, "viewer", full_body=True, message_key=message_key)
                                         
-                                        # Locate the download button in the viewer using multiple robust strategies
-                                        btn_selectors = [
-                                            "div[role='button'][aria-label='Download']",
-                                            "div[role='button'][aria-label='تنزيل']",
-                                            "span[data-icon='download']",
-                                            "span[data-icon='ic-download']",
-                                            "button[title='Download']",
-                                            "div[title='Download']",
-                                            "div[title='تنزيل']"
-                                        ]
+                                            # Locate the download button in the viewer using multiple robust strategies
+                                            btn_selectors = [
+                                                "div[role='button'][aria-label='Download']",
+                                                "div[role='button'][aria-label='تنزيل']",
+                                                "span[data-icon='download']",
+                                                "span[data-icon='ic-download']",
+                                                "button[title='Download']",
+                                                "div[title='Download']",
+                                                "div[title='تنزيل']"
+                                            ]
                                         
-                                        viewer_download_btn = None
-                                        for selector in btn_selectors:
-                                            btn = self.page.locator(selector).first
-                                            if await btn.count() > 0:
-                                                logger.info(f"[WA] Found potential download button in viewer: '{selector}'")
-                                                viewer_download_btn = btn
-                                                break
+                                            viewer_download_btn = None
+                                            for selector in btn_selectors:
+                                                btn = self.page.locator(selector).first
+                                                if await btn.count() > 0:
+                                                    logger.info(f"[WA] Found potential download button in viewer: '{selector}'")
+                                                    viewer_download_btn = btn
+                                                    break
                                                 
-                                        if viewer_download_btn and await viewer_download_btn.is_visible():
-                                            try:
-                                                async with self.page.expect_download(timeout=15000) as download_info:
-                                                    await viewer_download_btn.click()
-                                                download = await download_info.value
+                                            if viewer_download_btn and await viewer_download_btn.is_visible():
+                                                try:
+                                                    async with self.page.expect_download(timeout=self.clock.timeout(15000)) as download_info:
+                                                        await viewer_download_btn.click(timeout=self.clock.timeout(3000))
+                                                    download = await download_info.value
                                                 
-                                                file_path = os.path.join(downloads_dir, download.suggested_filename)
-                                                await download.save_as(file_path)
-                                                logger.info(f"Downloaded image: {file_path}")
-                                                has_downloaded = True
+                                                    file_path = await self._land_download(download)
+                                                    self.metrics.observe(
+                                                        "inbound.media_download",
+                                                        time.perf_counter() - image_started,
+                                                        strategy="image_viewer"
+                                                    )
+                                                    self.journal.emit(
+                                                        "intake", "download", message_key=message_key, chat=header_title,
+                                                        kind="image", strategy="image_viewer", outcome="ok",
+                                                        duration=round(time.perf_counter() - image_started, 3),
+                                                    )
+                                                    logger.info(f"Downloaded image: {file_path}")
+                                                    has_downloaded = True
                                                 
-                                                # Close viewer before sending acknowledgements.
-                                                try:
-                                                    await self.page.keyboard.press("Escape")
-                                                    await asyncio.sleep(0.3)
-                                                except Exception:
-                                                    pass
+                                                    # Close viewer before sending acknowledgements.
+                                                    try:
+                                                        await self.page.keyboard.press("Escape")
+                                                        await self.clock.sleep(0.3)
+                                                    except Exception:
+                                                        pass
 
-                                                # Queue for processing
-                                                if hasattr(self.plugin.api, 'processing'):
-                                                    wa_metadata = {
-                                                        'whatsapp_message_key': message_key,
-                                                        'whatsapp_chat_title': header_title or "",
-                                                        'whatsapp_sender_phone': self._extract_phone_candidate(
-                                                            {'whatsapp_chat_title': header_title or ""},
-                                                            message_key
-                                                        )
-                                                    }
-                                                    enqueued = self.plugin.api.processing.import_file_to_queue(
-                                                        file_path,
-                                                        "WhatsApp",
-                                                        metadata=wa_metadata
+                                                    # Queue for processing
+                                                    await self._enqueue_downloaded_file(file_path, message_key, header_title)
+                                                except Exception as e:
+                                                    logger.error(f"Failed during download trigger in viewer: {e}")
+                                                    self.metrics.inc("inbound.download_failed", kind="image")
+                                                    self.journal.emit(
+                                                        "intake", "download", message_key=message_key, chat=header_title,
+                                                        kind="image", strategy="image_viewer", outcome="failed", error=str(e),
+                                                        duration=round(time.perf_counter() - image_started, 3),
                                                     )
-                                                    if enqueued:
-                                                        await self._reply_once(
-                                                            f"{message_key}:queued",
-                                                            "📥 Invoice received and added to processing queue."
-                                                        )
-                                                    else:
-                                                        await self._reply_once(
-                                                            f"{message_key}:queue_failed",
-                                                            "❌ Failed to add invoice to queue."
-                                                        )
-                                                else:
+                                                    self.tracer.request_dump("image_download_failed")
                                                     await self._reply_once(
-                                                        f"{message_key}:queue_failed",
-                                                        "❌ Failed to add invoice to queue."
+                                                        f"{message_key}:download_failed",
+                                                        "❌ Download failed."
                                                     )
-                                            except Exception as e:
-                                                logger.error(f"Failed during download trigger in viewer: {e}")
+                                            else:
+                                                logger.warning("Could not find visible download button in image viewer after 2s.")
+                                                self.metrics.inc("inbound.download_failed", kind="image")
+                                                self.journal.emit(
+                                                    "intake", "download", message_key=message_key, chat=header_title,
+                                                    kind="image", strategy="image_viewer", outcome="failed",
+                                                    error="viewer download button not found",
+                                                    duration=round(time.perf_counter() - image_started, 3),
+                                                )
+                                                self.tracer.request_dump("image_download_failed")
                                                 await self._reply_once(
                                                     f"{message_key}:download_failed",
                                                     "❌ Download failed."
                                                 )
-                                        else:
-                                            logger.warning("Could not find visible download button in image viewer after 2s.")
+                                                # Diagnostic: list potential icons in the header
+                                                try:
+                                                    icons = await self.page.locator("span[data-icon]").all()
+                                                    icon_names = [await i.get_attribute("data-icon") for i in icons]
+                                                    logger.info(f"[WA] Diagnostic - All icons on screen: {icon_names}")
+                                                except:
+                                                    pass
+                                            
+                                            # Ensure viewer is closed.
+                                            await self.page.keyboard.press("Escape")
+                                            await self.clock.sleep(0.5)
+                                        except Exception as e:
+                                            logger.error(f"Error handling image viewer: {e}")
+                                            self.metrics.inc("inbound.download_failed", kind="image")
+                                            self.journal.emit(
+                                                "intake", "download", message_key=message_key, chat=header_title,
+                                                kind="image", strategy="image_viewer", outcome="failed", error=str(e),
+                                                duration=round(time.perf_counter() - image_started, 3),
+                                            )
+                                            self.tracer.request_dump("image_download_failed")
                                             await self._reply_once(
                                                 f"{message_key}:download_failed",
                                                 "❌ Download failed."
                                             )
-                                            # Diagnostic: list potential icons in the header
-                                            try:
-                                                icons = await self.page.locator("span[data-icon]").all()
-                                                icon_names = [await i.get_attribute("data-icon") for i in icons]
-                                                logger.info(f"[WA] Diagnostic - All icons on screen: {icon_names}")
-                                            except:
-                                                pass
-                                            
-                                        # Ensure viewer is closed.
-                                        await self.page.keyboard.press("Escape")
-                                        await asyncio.sleep(0.5)
-                                    except Exception as e:
-                                        logger.error(f"Error handling image viewer: {e}")
+                                            # Ensure viewer is closed
+                                            await self.page.keyboard.press("Escape")
+
+                                # 3. Read any text attached
+                                text_element = message_target.locator("span.selectable-text")
+                                msg_text = ""
+                                if await text_element.count() > 0:
+                                    msg_text = await text_element.first.inner_text()
+                                    logger.info(f"Received WhatsApp Message: {msg_text}")
+                                
+                                # 4. Auto-reply for text mode (file acknowledgements are always-on above)
+                                if msg_text and not has_downloaded:
+                                    bot_val = self.plugin.get_setting('bot_mode', False, type=bool)
+                                    if bot_val:
                                         await self._reply_once(
-                                            f"{message_key}:download_failed",
-                                            "❌ Download failed."
+                                            f"{message_key}:bot_reply",
+                                            "I received your message! I am the Invoices Reader AI agent."
                                         )
-                                        # Ensure viewer is closed
-                                        await self.page.keyboard.press("Escape")
-
-                            # 3. Read any text attached
-                            text_element = message_target.locator("span.selectable-text")
-                            msg_text = ""
-                            if await text_element.count() > 0:
-                                msg_text = await text_element.first.inner_text()
-                                logger.info(f"Received WhatsApp Message: {msg_text}")
-                                
-                            # 4. Auto-reply for text mode (file acknowledgements are always-on above)
-                            if msg_text and not has_downloaded:
-                                bot_val = self.plugin.get_setting('bot_mode', False, type=bool)
-                                if bot_val:
-                                    await self._reply_once(
-                                        f"{message_key}:bot_reply",
-                                        "I received your message! I am the Invoices Reader AI agent."
-                                    )
                                     
-                    except Exception as e:
-                        error_text = str(e)
-                        if "intercepts pointer events" in error_text or "Timeout" in error_text:
-                            logger.debug(f"Skipping busy chat row in this cycle: {error_text}")
-                        else:
-                            logger.warning(f"Error checking individual message: {e}")
+                        except Exception as e:
+                            error_text = str(e)
+                            if "intercepts pointer events" in error_text or "Timeout" in error_text:
+                                logger.debug(f"Skipping busy chat row in this cycle: {error_text}")
+                            else:
+                                logger.warning(f"Error checking individual message: {e}")
                 
+                if not self.startup.finished:
+                    self.startup.mark("first_poll")
+                    self.startup.finish("connected")
+                    await asyncio.to_thread(self.startup.save)
+
                 # If we processed chats, maybe wait a bit less
                 if processed_in_this_loop:
-                    await asyncio.sleep(2)
+                    await self.clock.sleep(2)
                 else:
-                    await asyncio.sleep(5)
+                    await self.clock.sleep(5)
                 
-                # Check for pending replies (e.g., from duplicate / error signals sent from another thread)
+                # Check for pending replies (e.g., from duplicate / error signals sent from another thread).
+                # Handed to the outbox rather than awaited: while the scheduler is paused (phone
+                # offline) an awaited send would hold this loop and starve the heartbeat.
                 while self.pending_replies:
                     reply_task = self.pending_replies.pop(0)
                     recipient = reply_task.get('recipient')
                     message = reply_task.get('message')
                     if recipient and message:
                         logger.info(f"Processing pending reply to {recipient}")
-                        await self.send_message_to_chat_safely(recipient, message)
-                        await asyncio.sleep(3) # Wait before next action
+
+                        async def _send_pending(recipient=recipient, message=message):
+                            async def _send():
+                                sent = await self.send_message_to_chat_safely(recipient, message)
+                                await self.clock.sleep(3) # Wait before next action
+                                return sent
+
+                            return await self.scheduler.run(
+                                _send,
+                                chat=chat_key(recipient),
+                                priority=PRIORITY_NOTICE,
+                                label="pending_reply"
+                            )
+
+                        self.submit_outbound(_send_pending, label="pending_reply")
                 
             except Exception as e:
                 # Silently catch broad scraping errors to keep the loop resilient
-                await asyncio.sleep(5)
+                await self.clock.sleep(5)
+
+    async def _enqueue_downloaded_file(self, file_path: str, message_key: str, header_title: str = ""):
+        """Hand a downloaded file to the host processing queue and acknowledge in the chat."""
+        self.last_progress_at = time.time()
+        with self.metrics.timer("inbound.validate"):
+            verdict = await self.validator.validate(file_path)
+        if not verdict.ok:
+            logger.info(f"[WA] Rejected {os.path.basename(file_path)} from {header_title or message_key}: "
+                        f"{verdict.reason} {verdict.detail}".rstrip())
+            self.metrics.inc("inbound.rejected", reason=verdict.reason)
+            self.journal.emit("intake", "validate", message_key=message_key, chat=header_title,
+                              outcome="rejected", reason=verdict.reason, mime=verdict.mime, detail=verdict.detail)
+            await asyncio.to_thread(self.downloads.register, file_path, message_key)
+            self.downloads.settle(message_key, STATE_REJECTED)
+            await self._reply_once(f"{message_key}:rejected", self.validator.reply_for(verdict))
+            return
+
+        if not hasattr(self.plugin.api, 'processing'):
+            self.metrics.inc("inbound.enqueue", outcome="unavailable")
+            self.journal.emit("intake", "enqueue", message_key=message_key, chat=header_title, outcome="unavailable")
+            await self._reply_once(
+                f"{message_key}:queue_failed",
+                "❌ Failed to add invoice to queue."
+            )
+            return
+
+        await self.recorder.record_media(message_key, file_path)
+        stored = await asyncio.to_thread(self.downloads.register, file_path, message_key)
+        known = None
+        if self.plugin.get_setting('known_hash_shortcut', True, type=bool):
+            known = self.known.lookup(stored.get('sha256', ''))
+        if known is not None:
+            # The app sends no event when an invoice is deleted: make sure it still has this one.
+            in_host = await asyncio.to_thread(invoice_in_host, getattr(self.plugin.api, "db", None), known['summary'])
+            if in_host is False:
+                logger.info(f"[WA] Known invoice {known['summary'].get('invoice_number')} is no longer in the app; "
+                            f"queueing {os.path.basename(file_path)} again.")
+                self.known.forget(stored.get('sha256', ''))
+            if not in_host:
+                known = None
+        if known is not None:
+            # Same bytes as an invoice the host already has: its duplicate check would say so too.
+            logger.info(f"[WA] {os.path.basename(file_path)} from {header_title or message_key} is a known invoice; "
+                        f"not queueing it again.")
+            self.metrics.inc("inbound.known_duplicate")
+            self.journal.emit("intake", "duplicate", message_key=message_key, chat=header_title, outcome="local",
+                              sha256=stored.get('sha256'), invoice=known['summary'] or None)
+            self.downloads.settle(message_key, STATE_INGESTED)
+            await self._reply_once(f"{message_key}:duplicate", self._duplicate_notice_text(
+                known['summary'], received_at=known['first_seen']))
+            return
+
+        near, dhash = None, None
+        if self.perceptual.enabled and verdict.mime.startswith("image/"):
+            with self.metrics.timer("inbound.perceptual_hash"):
+                dhash = await asyncio.to_thread(image_dhash, file_path, self.perceptual.hash_size)
+            if dhash is not None:
+                near = self.perceptual.nearest(dhash, exclude=stored.get('sha256', ''))
+        if near is not None:
+            near_sha, near_entry, distance = near
+            self.metrics.inc("inbound.near_duplicate", mode=self.perceptual.mode)
+            self.journal.emit("intake", "near_duplicate", message_key=message_key, chat=header_title,
+                              outcome=self.perceptual.mode, sha256=stored.get('sha256'), original=near_sha,
+                              original_message_key=near_entry.get('message_key') or None, distance=distance)
+            if self.perceptual.mode == MODE_HOLD:
+                self.perceptual.held_total += 1
+                logger.info(f"[WA] Holding {os.path.basename(file_path)} from {header_title or message_key}: "
+                            f"looks like an earlier photo ({distance} bits apart).")
+                # Kept (like a failed file) in case it was a different invoice after all.
+                self.downloads.settle(message_key, STATE_FAILED)
+                await self._reply_once(f"{message_key}:near_duplicate", self._near_duplicate_notice_text(near_entry))
+                return
+            self.perceptual.flagged_total += 1
+
+        wa_metadata = {
+            'whatsapp_message_key': message_key,
+            'whatsapp_sha256': stored.get('sha256', ''),
+            'whatsapp_mime_type': verdict.mime,
+            'whatsapp_chat_title': header_title or "",
+            'whatsapp_sender_phone': self._extract_phone_candidate(
+                {'whatsapp_chat_title': header_title or ""},
+                message_key
+            )
+        }
+        if near is not None:
+            wa_metadata['whatsapp_near_duplicate_of'] = near[0]
+            wa_metadata['whatsapp_near_duplicate_distance'] = near[2]
+        if dhash is not None:
+            self.perceptual.add(stored.get('sha256', ''), dhash, message_key)
+        enqueue_started = time.perf_counter()
+        future = self.intake.submit(file_path, "WhatsApp", wa_metadata)
+        future.add_done_callback(lambda f: self._on_enqueued(f, wa_metadata, enqueue_started))
+
+    def _on_enqueued(self, future, metadata: dict, enqueue_started: float):
+        """The host answered a handoff: acknowledge in the chat the file came from."""
+        if future.cancelled():
+            return
+        message_key = metadata['whatsapp_message_key']
+        error = future.exception()
+        enqueued = error is None and future.result()
+        self.metrics.inc("inbound.enqueue", outcome="queued" if enqueued else "rejected")
+        self.journal.emit(
+            "intake", "enqueue", message_key=message_key, chat=metadata['whatsapp_chat_title'],
+            duration=round(time.perf_counter() - enqueue_started, 3),
+            outcome="queued" if enqueued else "rejected", error=str(error) if error else None,
+        )
+        if enqueued:
+            key, text = f"{message_key}:queued", "📥 Invoice received and added to processing queue."
+        else:
+            self.downloads.settle(message_key, STATE_FAILED)
+            key, text = f"{message_key}:queue_failed", "❌ Failed to add invoice to queue."
+
+        async def _send_ack():
+            await self.scheduler.run(
+                lambda: self._reply_routed(key, text, metadata),
+                chat=self._metadata_chat_key(metadata),
+                priority=PRIORITY_NOTICE,
+                label="queued_ack"
+            )
+
+        try:
+            self.submit_outbound(_send_ack, label="queued_ack")
+        except Exception as e:
+            logger.error(f"Failed to schedule queued acknowledgement: {e}")
 
     async def _collect_unread_badges(self):
-        """Collect unread badges and deduplicate by chat row when possible."""
+        """Collect (badge, row info) pairs for unread chats, deduplicated by chat row when possible."""
         unread_selectors = [
             "div[aria-label*='unread message']",
             "div[aria-label*='رسالة غير مقروءة']",
@@ -1037,17 +1763,32 @@ class WhatsAppClient:
         unread_badges = []
         seen_row_keys = set()
 
+        # Chat list geometry, so each row's position survives list scrolling (virtualized rows).
+        pane_top = 0.0
+        pane_scroll = 0.0
+        try:
+            pane_metrics = await self.page.locator("div#pane-side").first.evaluate(
+                "el => ({top: el.getBoundingClientRect().top, scroll: el.scrollTop})"
+            )
+            pane_top = float(pane_metrics.get("top") or 0)
+            pane_scroll = float(pane_metrics.get("scroll") or 0)
+        except Exception:
+            pass
+
         for selector in unread_selectors:
             elements = await self.page.locator(selector).all()
             for badge in elements:
                 row_key = None
+                row_info = {"row_id": "", "offset": None}
                 try:
                     row = badge.locator("xpath=ancestor::div[@role='listitem'][1]").first
                     if await row.count() > 0:
                         row_key = await row.get_attribute("data-id")
-                        if not row_key:
-                            box = await row.bounding_box()
-                            if box:
+                        row_info["row_id"] = row_key or ""
+                        box = await row.bounding_box()
+                        if box:
+                            row_info["offset"] = int(box['y'] - pane_top + pane_scroll)
+                            if not row_key:
                                 row_key = f"{int(box['x'])}:{int(box['y'])}"
                 except Exception:
                     row_key = None
@@ -1056,7 +1797,7 @@ class WhatsAppClient:
                     continue
                 if row_key:
                     seen_row_keys.add(row_key)
-                unread_badges.append(badge)
+                unread_badges.append((badge, row_info))
 
         return unread_badges
 
@@ -1081,11 +1822,11 @@ class WhatsAppClient:
                     pass
 
                 try:
-                    await target.click(timeout=3000)
+                    await target.click(timeout=self.clock.timeout(3000))
                     return True
                 except Exception as click_error:
                     last_error = click_error
-                    await target.click(timeout=3000, force=True)
+                    await target.click(timeout=self.clock.timeout(3000), force=True)
                     return True
             except Exception as target_error:
                 last_error = target_error
@@ -1114,6 +1855,38 @@ class WhatsAppClient:
             logger.debug(f"Could not open unread chat row this cycle: {last_error}")
         return False
 
+    def _metadata_chat_key(self, metadata: dict | None = None) -> str:
+        """Chat identity for a source-processing notice, used for scheduler affinity."""
+        route = self.routing.lookup_metadata(metadata)
+        if route is not None and route.chat:
+            return route.chat
+        safe_metadata = metadata or {}
+        return chat_key(
+            safe_metadata.get('whatsapp_sender_phone')
+            or safe_metadata.get('whatsapp_chat_title')
+            or ""
+        )
+
+    def metrics_snapshot(self) -> dict:
+        """Pipeline metrics snapshot with queue depth gauges refreshed."""
+        self.metrics.gauge("scheduler.pending").set(self.scheduler.pending_count)
+        self.metrics.gauge("pending_replies").set(len(self.pending_replies))
+        self.metrics.gauge("routing.indexed_messages").set(len(self.routing))
+        return self.metrics.snapshot()
+
+    def memory_state(self) -> dict:
+        """Sizes of the client's long-lived containers, for memory snapshots."""
+        return {
+            "recent_reply_keys": len(self._recent_reply_keys),
+            "recent_reply_lookup": len(self._recent_reply_lookup),
+            "pending_replies": len(self.pending_replies),
+            "routing_index": len(self.routing),
+            "scheduler_pending": self.scheduler.pending_count,
+            "metrics_series": len(self.metrics),
+            "loop_slow_callbacks": len(self.loop_monitor.slow_callbacks),
+            "journal_queued": self.journal.status()["queued"],
+        }
+
     def queue_reply(self, recipient: str, message: str):
         """Thread-safe way to queue a reply to be sent by the asyncio loop."""
         self.pending_replies.append({
@@ -1179,83 +1952,148 @@ class WhatsAppClient:
                 except Exception as send_error:
                     logger.warning(f"Auto-reply attempt {attempt}/{max_attempts} failed for key '{key}': {send_error}")
                 if attempt < max_attempts:
-                    await asyncio.sleep(delay_seconds)
+                    await self.clock.sleep(delay_seconds)
             return False
 
+        reply_kind = str(key).rsplit(":", 1)[-1]
+        message_key = str(key).rsplit(":", 1)[0]
         try:
             # Immediate retries handle transient UI states (media overlay, focus changes).
-            sent = await _attempt_send(max_attempts=4, delay_seconds=0.35)
+            reply_started = time.perf_counter()
+            with self.metrics.timer("reply.send", kind=reply_kind):
+                sent = await _attempt_send(max_attempts=4, delay_seconds=0.35)
+            self.journal.emit(
+                "reply", reply_kind, message_key=message_key, strategy="immediate",
+                duration=round(time.perf_counter() - reply_started, 3), outcome="sent" if sent else "postponed",
+            )
             if sent:
+                self.metrics.inc("reply.sent", kind=reply_kind)
                 self._mark_reply_key(key)
                 return
 
+            self.metrics.inc("reply.postponed", kind=reply_kind)
+            self.tracer.request_dump(f"reply_postponed_{reply_kind}")
+
             # One deferred retry window for late async completions (e.g. processing result).
             logger.warning(
                 f"Auto-reply postponed for key '{key}': chat input not available after immediate retries."
             )
 
             async def _deferred_retry():
-                await asyncio.sleep(2.0)
+                await self.clock.sleep(2.0)
                 if key in self._recent_reply_lookup:
                     return
-                deferred_sent = await _attempt_send(max_attempts=3, delay_seconds=0.5)
+                deferred_sent = await self.scheduler.run(
+                    lambda: _attempt_send(max_attempts=3, delay_seconds=0.5),
+                    chat=self._metadata_chat_key(metadata),
+                    priority=PRIORITY_NOTICE,
+                    label="deferred_reply"
+                )
+                self.journal.emit("reply", reply_kind, message_key=message_key, strategy="deferred",
+                                  outcome="sent" if deferred_sent else "skipped")
                 if deferred_sent:
+                    self.metrics.inc("reply.sent", kind=reply_kind)
                     self._mark_reply_key(key)
                 else:
+                    self.metrics.inc("reply.skipped", kind=reply_kind)
                     logger.warning(f"Auto-reply skipped for key '{key}': chat input not available.")
 
             asyncio.create_task(_deferred_retry())
         except Exception as e:
             logger.error(f"Failed to send deduplicated auto-reply: {e}")
 
+    async def _reply_routed(self, key: str, text: str, metadata: dict | None = None):
+        """Reply in the chat the referenced message arrived in, not whatever chat is open."""
+        route = self._route_for(metadata, key)
+        if route is not None and key not in self._recent_reply_lookup:
+            await self._open_routed_chat(route)
+        await self._reply_once(key, text, metadata)
+
+    def _duplicate_notice_text(self, existing_data: dict | None, received_at: float | None = None) -> str:
+        def _clean(val, fallback="N/A"):
+            if val is None:
+                return fallback
+            text = str(val).strip()
+            if not text or text.lower() in {"none", "null", "nan"}:
+                return fallback
+            if text in {"0", "0.0"}:
+                return fallback
+            return text
+
+        if not existing_data and received_at:
+            # Known only by its hash (seeded from the download store): no details to show.
+            return "\n".join([
+                "⚠️ Duplicate invoice detected",
+                f"📅 Already received on {time.strftime('%Y-%m-%d', time.localtime(received_at))}",
+                "No new action was taken.",
+            ])
+        vendor = _clean((existing_data or {}).get('vendor_name'), "Unknown")
+        inv_num = _clean((existing_data or {}).get('invoice_number'))
+        inv_date = _clean((existing_data or {}).get('date'))
+        total = (existing_data or {}).get('invoice_total')
+        currency = _clean((existing_data or {}).get('currency'), "")
+        amount_str = f"{total} {currency}".strip() if total not in (None, "") else "N/A"
+
+        return "\n".join([
+            "⚠️ Duplicate invoice detected",
+            f"🏢 Vendor: {vendor}",
+            f"🧾 Invoice #: {inv_num}",
+            f"📅 Date: {inv_date}",
+            f"💰 Total: {amount_str}",
+            "No new action was taken.",
+        ])
+
+    def _near_duplicate_notice_text(self, entry: dict) -> str:
+        summary = entry.get('summary') or {}
+        seen = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry.get('first_seen') or time.time()))
+        lines = ["⚠️ This photo looks like an invoice already received", f"📅 Received: {seen}"]
+        if summary:
+            lines += [line for line in self._duplicate_notice_text(summary).split("\n")[1:-1]]
+        lines.append("It was not processed again. If it is a different invoice, please send it as a PDF.")
+        return "\n".join(lines)
+
     def notify_duplicate(self, existing_data: dict, metadata: dict | None = None):
         """Schedule duplicate-notification reply to the active WhatsApp chat."""
-        if not self.is_running or not self.loop or not self.loop.is_running():
+        self.downloads.settle((metadata or {}).get('whatsapp_message_key', ''), STATE_INGESTED)
+        self.intake.settle((metadata or {}).get('whatsapp_message_key', ''))
+        self.known.remember((metadata or {}).get('whatsapp_sha256', ''), existing_data)
+        self.perceptual.remember((metadata or {}).get('whatsapp_sha256', ''), existing_data)
+        if not self.is_running:
             return
 
         safe_metadata = metadata or {}
 
         async def _send_notice():
-            def _clean(val, fallback="N/A"):
-                if val is None:
-                    return fallback
-                text = str(val).strip()
-                if not text or text.lower() in {"none", "null", "nan"}:
-                    return fallback
-                if text in {"0", "0.0"}:
-                    return fallback
-                return text
-
-            vendor = _clean((existing_data or {}).get('vendor_name'), "Unknown")
-            inv_num = _clean((existing_data or {}).get('invoice_number'))
-            inv_date = _clean((existing_data or {}).get('date'))
-            total = (existing_data or {}).get('invoice_total')
-            currency = _clean((existing_data or {}).get('currency'), "")
-            amount_str = f"{total} {currency}".strip() if total not in (None, "") else "N/A"
-
-            duplicate_msg = "\n".join([
-                "⚠️ Duplicate invoice detected",
-                f"🏢 Vendor: {vendor}",
-                f"🧾 Invoice #: {inv_num}",
-                f"📅 Date: {inv_date}",
-                f"💰 Total: {amount_str}",
-                "No new action was taken.",
-            ])
+            duplicate_msg = self._duplicate_notice_text(existing_data)
+            inv_num = (existing_data or {}).get('invoice_number')
+            vendor = (existing_data or {}).get('vendor_name')
 
             message_key = safe_metadata.get('whatsapp_message_key') or "wa_duplicate"
+            self.journal.emit("intake", "duplicate", message_key=message_key,
+                              chat=safe_metadata.get('whatsapp_chat_title'), outcome="host",
+                              sha256=safe_metadata.get('whatsapp_sha256'), invoice=invoice_summary(existing_data) or None)
             logger.info(
                 f"[WA] Sending duplicate notice (message_key={message_key}, invoice={inv_num}, vendor={vendor})"
             )
-            await self._reply_once(f"{message_key}:duplicate", duplicate_msg, safe_metadata)
+            await self.scheduler.run(
+                lambda: self._reply_routed(f"{message_key}:duplicate", duplicate_msg, safe_metadata),
+                chat=self._metadata_chat_key(safe_metadata),
+                priority=PRIORITY_NOTICE,
+                label="duplicate_notice"
+            )
 
         try:
-            asyncio.run_coroutine_threadsafe(_send_notice(), self.loop)
+            self.submit_outbound(_send_notice, label="duplicate_notice")
         except Exception as e:
             logger.error(f"Failed to schedule duplicate WhatsApp notice: {e}")
 
     def notify_processing_result(self, data: dict, metadata: dict | None = None):
         """Send a completion reply with extracted invoice details."""
-        if not self.is_running or not self.loop or not self.loop.is_running():
+        self.downloads.settle((metadata or {}).get('whatsapp_message_key', ''), STATE_INGESTED)
+        self.intake.settle((metadata or {}).get('whatsapp_message_key', ''))
+        self.known.remember((metadata or {}).get('whatsapp_sha256', ''), data)
+        self.perceptual.remember((metadata or {}).get('whatsapp_sha256', ''), data)
+        if not self.is_running:
             return
 
         safe_metadata = metadata or {}
@@ -1300,19 +2138,30 @@ class WhatsAppClient:
             lines.append(f"🧪 ZATCA: {zatca}")
 
             message_key = safe_metadata.get('whatsapp_message_key') or "wa_processed"
+            self.journal.emit("intake", "processed", message_key=message_key,
+                              chat=safe_metadata.get('whatsapp_chat_title'), outcome="ok",
+                              sha256=safe_metadata.get('whatsapp_sha256'), invoice=invoice_summary(safe_data) or None)
             logger.info(
                 f"[WA] Sending processing result notice (message_key={message_key}, invoice={inv_num}, vendor={vendor})"
             )
-            await self._reply_once(f"{message_key}:processed", "\n".join(lines), safe_metadata)
+            await self.scheduler.run(
+                lambda: self._reply_routed(f"{message_key}:processed", "\n".join(lines), safe_metadata),
+                chat=self._metadata_chat_key(safe_metadata),
+                priority=PRIORITY_NOTICE,
+                label="processed_notice"
+            )
 
         try:
-            asyncio.run_coroutine_threadsafe(_send_notice(), self.loop)
+            self.submit_outbound(_send_notice, label="result_notice")
         except Exception as e:
             logger.error(f"Failed to schedule processing result notice: {e}")
 
     def notify_processing_failed(self, error: str, metadata: dict | None = None):
         """Send a processing-failed reply."""
-        if not self.is_running or not self.loop or not self.loop.is_running():
+        self.downloads.settle((metadata or {}).get('whatsapp_message_key', ''), STATE_FAILED)
+        self.intake.settle((metadata or {}).get('whatsapp_message_key', ''))
+        self.perceptual.forget((metadata or {}).get('whatsapp_sha256', ''))
+        if not self.is_running:
             return
 
         safe_metadata = metadata or {}
@@ -1320,15 +2169,22 @@ class WhatsAppClient:
 
         async def _send_notice():
             message_key = safe_metadata.get('whatsapp_message_key') or "wa_failed"
+            self.journal.emit("intake", "processed", message_key=message_key,
+                              chat=safe_metadata.get('whatsapp_chat_title'), outcome="failed", error=safe_error)
             reply_text = (
                 "❌ Failed to process invoice.\n"
                 f"Error: {safe_error}"
             )
             logger.info(f"[WA] Sending processing failed notice (message_key={message_key})")
-            await self._reply_once(f"{message_key}:failed", reply_text, safe_metadata)
+            await self.scheduler.run(
+                lambda: self._reply_routed(f"{message_key}:failed", reply_text, safe_metadata),
+                chat=self._metadata_chat_key(safe_metadata),
+                priority=PRIORITY_NOTICE,
+                label="failed_notice"
+            )
 
         try:
-            asyncio.run_coroutine_threadsafe(_send_notice(), self.loop)
+            self.submit_outbound(_send_notice, label="failed_notice")
         except Exception as e:
             logger.error(f"Failed to schedule processing failed notice: {e}")
 
@@ -1376,7 +2232,7 @@ class WhatsAppClient:
                 if not input_box:
                     # If overlay blocks input (e.g., media viewer), close it and retry once.
                     await self.page.keyboard.press("Escape")
-                    await asyncio.sleep(0.2)
+                    await self.clock.sleep(0.2)
                     input_box = await self._find_chat_input()
 
                 if not input_box:
@@ -1387,7 +2243,7 @@ class WhatsAppClient:
                 if not input_box:
                     return False
 
-                await input_box.click(timeout=2000)
+                await input_box.click(timeout=self.clock.timeout(2000))
                 await self.page.keyboard.press("ControlOrMeta+A")
                 await self.page.keyboard.press("Backspace")
 
@@ -1416,7 +2272,7 @@ class WhatsAppClient:
             if phone_candidates:
                 target = phone_candidates[-1]
                 logger.info(f"Sending via phone navigation to extracted number: {target}")
-                success, _ = await self.send_invoice_async(target, message, None)
+                success, _ = await self._send_invoice_now(target, message, None)
                 return success
 
             # If no obvious phone number, use the search box
@@ -1426,22 +2282,22 @@ class WhatsAppClient:
                 search_box = self.page.locator("div.lexical-rich-text-input > div").first
                 
             if await search_box.count() > 0:
-                await search_box.click()
+                await search_box.click(timeout=self.clock.timeout(3000))
                 await self.page.keyboard.press("Control+A")
                 await self.page.keyboard.press("Backspace")
                 await search_box.fill(chat_name)
-                await asyncio.sleep(2)
+                await self.clock.sleep(2)
                 
                 result = self.page.locator("div[role='listitem']").first
                 if await result.count() > 0:
-                    await result.click()
-                    await asyncio.sleep(1)
+                    await result.click(timeout=self.clock.timeout(3000))
+                    await self.clock.sleep(1)
                     await self.auto_reply(message)
                     
                     # Clear search
                     clear_btn = self.page.locator("button[aria-label='Cancel search'], button[aria-label='إلغاء البحث']").first
                     if await clear_btn.count() > 0:
-                        await clear_btn.click()
+                        await clear_btn.click(timeout=self.clock.timeout(3000))
                         
                     return True
                 else:
@@ -1454,10 +2310,40 @@ class WhatsAppClient:
             logger.error(f"Failed to send safely to {chat_name}: {e}")
             return False
 
+    def send_invoice(self, phone: str, text: str, file_path: str = None) -> concurrent.futures.Future:
+        """User send from any thread; the future resolves with ``(success, message)``."""
+        return self.submit_outbound(
+            lambda: self.send_invoice_async(phone, text, file_path),
+            label="user_send",
+            replay=False,
+        )
+
     async def send_invoice_async(self, phone: str, text: str, file_path: str = None) -> tuple[bool, str]:
         """Sends a message and optional file to a specific phone number."""
         if not self.is_logged_in or not self.page:
             return False, "WhatsApp Agent is not logged in."
+
+        # User-initiated sends preempt the inbound sweep at its next checkpoint.
+        send_started = time.perf_counter()
+        with self.metrics.timer("outbound.total", kind="file" if file_path else "text"):
+            success, message = await self.scheduler.run(
+                lambda: self._send_invoice_now(phone, text, file_path),
+                chat=chat_key(phone),
+                priority=PRIORITY_USER,
+                label="user_send"
+            )
+        self.metrics.inc("outbound.sends", outcome="sent" if success else "failed")
+        self.journal.emit(
+            "outbound", "total", chat=str(phone), kind="file" if file_path else "text",
+            duration=round(time.perf_counter() - send_started, 3),
+            outcome="sent" if success else "failed", error=None if success else message,
+        )
+        return success, message
+
+    async def _send_invoice_now(self, phone: str, text: str, file_path: str = None) -> tuple[bool, str]:
+        """Navigate to the phone's chat and send; caller must own the page."""
+        if not self.is_logged_in or not self.page:
+            return False, "WhatsApp Agent is not logged in."
             
         try:
             logger.info(f"Targeting WhatsApp send to {phone}. File: {file_path}")
@@ -1465,8 +2351,9 @@ class WhatsAppClient:
                 logger.info(f"File exists: {os.path.exists(file_path)} (Path: {os.path.abspath(file_path)})")
 
             safe_text = quote(text)
-            url = f"https://web.whatsapp.com/send/?phone={phone}&text={safe_text}&type=phone_number&app_absent=0"
-            await self.page.goto(url)
+            url = f"{self.web_url}send/?phone={phone}&text={safe_text}&type=phone_number&app_absent=0"
+            navigate_started = time.perf_counter()
+            await self.page.goto(url, timeout=self.clock.timeout(30000))
             
             # Wait for chat to load (either chat input or invalid phone generic dialog)
             try:
@@ -1474,22 +2361,29 @@ class WhatsAppClient:
                 await self.page.wait_for_selector(
                     "div[contenteditable='true'], div[role='dialog'], #main", 
                     state="visible",
-                    timeout=45000
+                    timeout=self.clock.timeout(45000)
                 )
             except Exception as e:
                 logger.error(f"Navigation to chat timed out or failed: {e}")
+                self.metrics.observe("outbound.navigate", time.perf_counter() - navigate_started)
+                self.journal.emit("outbound", "navigate", chat=str(phone), outcome="timeout", error=str(e),
+                                  duration=round(time.perf_counter() - navigate_started, 3))
                 return False, "Timeout waiting for chat to load. Try checking your connection."
+            self.metrics.observe("outbound.navigate", time.perf_counter() - navigate_started)
+            self.journal.emit("outbound", "navigate", chat=str(phone), outcome="ok",
+                              duration=round(time.perf_counter() - navigate_started, 3))
                 
             # If invalid phone dialog exists, return error - support English and Arabic buttons
             dialog_btn_selectors = "div[role='button']:has-text('OK'), div[role='button']:has-text('Close'), div[role='button']:has-text('تم'), div[role='button']:has-text('موافق'), div[role='button']:has-text('إغلاق')"
             if await self.page.locator(dialog_btn_selectors).count() > 0:
                 logger.warning(f"WhatsApp reported invalid phone number: {phone}")
                 # Click close/ok
-                await self.page.locator(dialog_btn_selectors).first.click()
+                await self.page.locator(dialog_btn_selectors).first.click(timeout=self.clock.timeout(3000))
                 return False, "Invalid phone number."
                 
             # Allow some time for the 'connecting' overlay to disappear and the input to become active
-            await asyncio.sleep(2) 
+            await self.clock.sleep(2) 
+            await self.recorder.capture(self.page, "outbound.chat", phone=str(phone))
             
             if file_path and os.path.exists(file_path):
                 # Click the attach icon - include Arabic label 'إرفاق'
@@ -1497,8 +2391,10 @@ class WhatsAppClient:
                 attach_icon = self.page.locator(attach_selectors).first
                 
                 if await attach_icon.count() > 0:
-                    await attach_icon.click()
-                    await asyncio.sleep(2) # Wait for menu to fully expand
+                    attach_started = time.perf_counter()
+                    await attach_icon.click(timeout=self.clock.timeout(3000))
+                    await self.clock.sleep(2) # Wait for menu to fully expand
+                    await self.recorder.capture(self.page, "outbound.attach_menu", full_body=True, phone=str(phone))
                     
                     # Target 'Photos & Videos' specifically to avoid sticker/document behavior
                     # Broadened to support many Arabic variations found in different WhatsApp versions
@@ -1523,6 +2419,7 @@ class WhatsAppClient:
                         "li:has-text('مستند')"
                     ]
                     
+                    attach_strategy = "media_button"
                     try:
                         target_btn = None
                         # Try media selectors first
@@ -1539,13 +2436,14 @@ class WhatsAppClient:
                                 btn = self.page.locator(selector).first
                                 if await btn.count() > 0 and await btn.is_visible():
                                     target_btn = btn
+                                    attach_strategy = "document_button"
                                     logger.info(f"Targeting document button via: {selector}")
                                     break
                         
                         if target_btn:
                             # Use expect_file_chooser for maximum reliability
-                            async with self.page.expect_file_chooser() as fc_info:
-                                await target_btn.click(force=True)
+                            async with self.page.expect_file_chooser(timeout=self.clock.timeout(10000)) as fc_info:
+                                await target_btn.click(timeout=self.clock.timeout(3000), force=True)
                             file_chooser = await fc_info.value
                             await file_chooser.set_files(file_path)
                             logger.info("File selected via menu button.")
@@ -1556,16 +2454,27 @@ class WhatsAppClient:
                                 file_input = self.page.locator("input[type='file']").first
                             
                             await file_input.set_input_files(file_path)
+                            attach_strategy = "file_input"
                             logger.info("Used direct file input fallback (no menu buttons found).")
                     except Exception as e:
                         logger.error(f"Failed to set input files: {e}")
+                        self.journal.emit("outbound", "attach", chat=str(phone), strategy=attach_strategy,
+                                          outcome="failed", error=str(e),
+                                          duration=round(time.perf_counter() - attach_started, 3))
                         return False, f"File upload failed: {e}"
                     
+                    self.metrics.observe("outbound.attach", time.perf_counter() - attach_started)
+                    self.journal.emit("outbound", "attach", chat=str(phone), strategy=attach_strategy, outcome="ok",
+                                      duration=round(time.perf_counter() - attach_started, 3))
+
                     # Wait for preview modal to appear and click send
+                    confirm_started = time.perf_counter()
+                    confirm_strategy = "click"
                     try:
                         # Broaden selectors to include new WhatsApp Design System (WDS) icons
                         send_selectors = "span[data-icon='send'], [aria-label='Send'], [data-icon='wds-ic-send-filled']"
-                        await self.page.wait_for_selector(send_selectors, state="visible", timeout=20000)
+                        await self.page.wait_for_selector(send_selectors, state="visible", timeout=self.clock.timeout(20000))
+                        await self.recorder.capture(self.page, "outbound.preview", full_body=True, phone=str(phone))
                         
                         # Try to fill caption if text is provided
                         if text:
@@ -1587,16 +2496,20 @@ class WhatsAppClient:
                             except Exception as caption_err:
                                 logger.warning(f"Failed to fill caption (will try to send anyway): {caption_err}")
                         
-                        await asyncio.sleep(1) # Final stabilization for UI animations
+                        await self.clock.sleep(1) # Final stabilization for UI animations
                         
                         # Use force=True to bypass pointer-event interception by internal icons/spans
-                        await self.page.locator(send_selectors).last.click(force=True)
+                        await self.page.locator(send_selectors).last.click(timeout=self.clock.timeout(3000), force=True)
                         logger.info("Clicked attachment send button with force=True.")
                     except Exception as e:
                         logger.warning(f"Failed to find or click send button in preview modal: {e}")
                         # Fallback: try pressing Enter if the modal is focused
                         await self.page.keyboard.press("Enter")
+                        confirm_strategy = "enter_key"
                         logger.info("Attempted Enter key fallback after click failure.")
+                    self.metrics.observe("outbound.confirm_send", time.perf_counter() - confirm_started)
+                    self.journal.emit("outbound", "confirm_send", chat=str(phone), strategy=confirm_strategy,
+                                      outcome="ok", duration=round(time.perf_counter() - confirm_started, 3))
                 else:
                     return False, "Could not find the attach button. The WhatsApp UI might have changed."
             else:
@@ -1604,13 +2517,13 @@ class WhatsAppClient:
                 send_selectors = "span[data-icon='send'], [aria-label='Send'], [data-icon='wds-ic-send-filled']"
                 send_icon = self.page.locator(send_selectors).first
                 if await send_icon.count() > 0:
-                    await send_icon.click(force=True)
+                    await send_icon.click(timeout=self.clock.timeout(3000), force=True)
                 else:
                     await self.page.keyboard.press("Enter")
                 logger.info("Sent text-only message.")
             
             # Wait for message to actually leave the outbox
-            await asyncio.sleep(4)
+            await self.clock.sleep(4)
             return True, "Message sent successfully!"
             
         except Exception as e:
@@ -0,0 +1,867 @@
+"""
+Out-of-process agent: the WhatsApp client runs in a child Python process.
+
+The host side is ``AgentProcess``, a stand-in for ``WhatsAppClient`` that the plugin,
+settings tab and status endpoint use unchanged. The child (``python -m <package>.worker``)
+runs the real client. The two talk in JSON lines: commands go to the child's stdin,
+and events and replies come back on its stdout. The child's log goes to stderr and is
+forwarded into the host log.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import itertools
+import threading
+import subprocess
+import concurrent.futures
+from core.plugins.sdk import get_logger
+from .supervisor import AgentSupervisor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PUSH_INTERVAL = 1.0
+# Metrics ride along with the state push, at most this often (the payload is the largest part).
+METRICS_PUSH_INTERVAL = 5.0
+# The child pushes its state every second; this long without one means it is wedged.
+STALE_WORKER_SECONDS = 120
+STOP_GRACE_SECONDS = 45
+MEMORY_CHECK_INTERVAL = 5.0
+MEMORY_CHECKS_OVER_LIMIT = 3
+# Child exit code when its own supervisor gave up; restarting the process would not help.
+EXIT_GAVE_UP = 3
+
+
+def _coerce(value, type):
+    """QSettings-style conversion for values that crossed the pipe as JSON."""
+    if type is None or value is None:
+        return value
+    if type is bool and isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _settled(result) -> concurrent.futures.Future:
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+def _log_refusal(what: str, future):
+    answer = future.result()  # None: no answer, already logged by ``_ask``
+    if answer and not answer[0]:
+        logger.warning(f"[WA] Agent worker refused the {what}: {answer[1]}")
+
+
+def _tree_rss_mb(pid: int) -> float | None:
+    """RSS of a process and its descendants (Chromium included); None where it cannot be measured."""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            total = root.memory_info().rss
+            for child in root.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            return total / 1048576
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+    if not os.path.isdir("/proc"):
+        return None
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r", encoding="utf-8") as f:
+                # The command name may contain spaces; fields resume after its ')'.
+                parents[int(name)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    pids, frontier = [pid], [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        pids.extend(children)
+        frontier.extend(children)
+    total_kb = 0
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError, IndexError):
+            continue
+    return total_kb / 1024
+
+
+class _RemoteComponent:
+    """Read-only view of a worker-side component (connection, profiler, ...), refreshed by state pushes."""
+
+    def __init__(self, defaults: dict | None = None, **methods):
+        self._status = dict(defaults or {})
+        self.__dict__.update(self._status)
+        self.__dict__.update(methods)
+
+    def update(self, status: dict | None):
+        if status:
+            self._status = dict(status)
+            self.__dict__.update(self._status)
+
+    def status(self) -> dict:
+        return dict(self._status)
+
+
+class AgentProcess:
+    """
+    Host-side proxy for an agent running in a child process.
+
+    Quacks like ``WhatsAppClient`` for everything the plugin, the settings tab and the
+    status endpoint use. ``run`` (the plugin's agent thread) spawns the child and pumps
+    its events until it exits. It restarts the child with the supervisor's backoff when
+    the child dies, stops pushing state for ``STALE_WORKER_SECONDS``, or its process tree
+    (Python + Chromium) stays above ``agent_process_memory_limit_mb``. The child runs at
+    lower CPU priority, so a busy agent cannot starve the UI.
+    """
+
+    out_of_process = True
+
+    def __init__(self, plugin_instance):
+        self.plugin = plugin_instance
+        self.is_running = False
+        self.is_logged_in = False
+        self.standby = False
+        self.stopped = True
+        self.last_poll_at = None
+        self.session_dir = os.path.join(PLUGIN_DIR, "whatsapp_session")
+        self.user_data_dir = self.session_dir
+        self.pid = None
+        self.rss_mb = None
+        self.restarts = 0
+        self.last_exit = ""
+        self.supervisor = AgentSupervisor()
+        self.connection = _RemoteComponent({"state": "loading", "degraded": False})
+        self.profiler = _RemoteComponent({"active": False, "mode": "", "last_profile_path": ""}, stop=self._stop_profiling)
+        self.memory = _RemoteComponent({"active": False}, last_report=None, request_snapshot=self._request_memory_snapshot)
+        self.startup = _RemoteComponent(begin=self._startup_begin, summary=self._startup_summary, describe=self._startup_describe)
+        self._health = {}
+        self._status = {}
+        self._startup = {"summary": {"current": None, "phases": [], "runs": 0}, "describe": "No startup recorded yet."}
+        self._metrics = {}
+        self._process = None
+        self._write_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._requests = {}
+        self._requests_lock = threading.Lock()
+        self._last_push = 0.0
+        self._started = False
+        self._stop_requested = False
+        self._kill_reason = ""
+        self._ready_waiters = []
+        self._stopped_waiters = []
+        self._standby_waiters = []
+        self._waiters_lock = threading.Lock()
+
+    @staticmethod
+    def supported() -> tuple[bool, str]:
+        """Whether a child interpreter can be spawned here."""
+        if (getattr(sys, "frozen", False) or hasattr(sys, "_MEIPASS") or hasattr(sys, "__nuitka_binary_dir")
+                or "__compiled__" in globals()):
+            # sys.executable is the app itself; "-m" would relaunch it.
+            return False, "not available in the packaged app"
+        if not __package__:
+            return False, "plugin is not loaded as a package"
+        return True, ""
+
+    # -- lifecycle -------------------------------------------------------------------
+
+    def run(self):
+        """Entry point for the plugin's agent thread: runs (and restarts) the child until stopped."""
+        self.is_running = True
+        self.stopped = False
+        self._stop_requested = False
+        self.supervisor.max_restarts = self.plugin.get_setting('supervisor_max_restarts', 5, type=int)
+        self.supervisor.reset()
+        try:
+            while True:
+                reason = self._run_worker()
+                if self._stop_requested or reason is None or reason == "gave up":
+                    break
+                if not self._started:
+                    # Died before it finished importing: a restart will not help.
+                    self.plugin.update_status(f"Agent worker failed to start ({reason}); see the log.")
+                    break
+                delay = self.supervisor.next_delay()
+                if delay is None:
+                    self.plugin.update_status(f"Agent worker stopped after failure: {reason}")
+                    break
+                self.restarts += 1
+                self.plugin.update_status(f"Agent worker {reason}; restarting in {delay:.0f}s...")
+                logger.warning(f"[WA] Restarting agent worker in {delay:.0f}s ({reason}).")
+                if self.supervisor.wait(delay):
+                    break
+        finally:
+            self.is_running = False
+            self.is_logged_in = False
+            self.standby = False
+            self.pid = None
+            self._fail_requests("WhatsApp Agent stopped.")
+            self._settle(self._ready_waiters, error=RuntimeError("WhatsApp Agent stopped."), stopped=True)
+            self._settle(self._stopped_waiters, result="stopped")
+            self._settle(self._standby_waiters, result="stopped")
+
+    def _run_worker(self) -> str | None:
+        """One child process; returns why it ended, or None after a requested stop."""
+        self._started = False
+        self._kill_reason = ""
+        try:
+            self._process = self._spawn()
+        except Exception as e:
+            logger.error(f"[WA] Could not start agent worker: {e}")
+            return f"spawn failed: {e}"
+        process = self._process
+        self.pid = process.pid
+        self._last_push = time.monotonic()
+        logger.info(f"[WA] Agent worker started (pid {process.pid}).")
+        threading.Thread(target=self._forward_log, args=(process,), name="WhatsAppWorkerLog", daemon=True).start()
+        watchdog_stop = threading.Event()
+        threading.Thread(target=self._watchdog, args=(process, watchdog_stop), name="WhatsAppWorkerWatchdog",
+                         daemon=True).start()
+        self._send({"cmd": "start", "settings": self._settings_snapshot()})
+        try:
+            for line in process.stdout:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                self._handle(message)
+        finally:
+            watchdog_stop.set()
+            try:
+                code = process.wait(timeout=STOP_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                self._kill(process, "did not exit")
+                code = process.wait()
+            self._process = None
+            self.is_logged_in = False
+            self.standby = False
+            self._fail_requests("Agent worker exited.")
+        if self._stop_requested:
+            logger.info("[WA] Agent worker stopped.")
+            return None
+        if code == EXIT_GAVE_UP and not self._kill_reason:
+            logger.warning("[WA] Agent worker gave up after repeated failures.")
+            return "gave up"
+        reason = self._kill_reason or f"exited with code {code}"
+        self.last_exit = reason
+        logger.warning(f"[WA] Agent worker {reason}.")
+        return reason
+
+    def _spawn(self) -> subprocess.Popen:
+        # The child imports this package the way the host did, plus the host's own modules.
+        root = PLUGIN_DIR
+        for _ in __package__.split("."):
+            root = os.path.dirname(root)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([root] + [p for p in sys.path if p and os.path.isdir(p)])
+        env["PYTHONUNBUFFERED"] = "1"
+        env["PYTHONIOENCODING"] = "utf-8"
+        options = {}
+        if os.name == "nt":
+            options["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS | subprocess.CREATE_NO_WINDOW
+        else:
+            # Own process group so the whole tree (driver, Chromium) can be killed at once.
+            options["start_new_session"] = True
+        return subprocess.Popen(
+            [sys.executable, "-m", f"{__package__}.worker", str(getattr(self.plugin, "version", ""))],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=env, cwd=root, text=True, encoding="utf-8", bufsize=1, **options,
+        )
+
+    def _settings_snapshot(self) -> dict:
+        settings = getattr(self.plugin, "settings", None)
+        if settings is None or not hasattr(settings, "allKeys"):
+            return dict(getattr(self.plugin, "settings_values", {}) or {})
+        return {key: settings.value(key) for key in settings.allKeys()}
+
+    def update_setting(self, key: str, value):
+        if self._process is not None:
+            self._send({"cmd": "settings", "settings": {key: value}})
+
+    def stop(self):
+        """Ask the child to shut down; it is killed if it has not exited after a grace period."""
+        self._stop_requested = True
+        self.is_running = False
+        self.supervisor.request_stop()
+        process = self._process
+        if process is None:
+            return
+        self._send({"cmd": "stop"})
+        timer = threading.Timer(STOP_GRACE_SECONDS, self._kill, args=(process, "did not stop in time"))
+        timer.daemon = True
+        timer.start()
+
+    def _kill(self, process, reason: str):
+        if process.poll() is not None:
+            return
+        self._kill_reason = self._kill_reason or reason
+        logger.warning(f"[WA] Killing agent worker (pid {process.pid}): {reason}.")
+        try:
+            if os.name == "nt":
+                subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True, check=False)
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except Exception:
+            process.kill()
+
+    def _watchdog(self, process, stop_event):
+        limit_mb = self.plugin.get_setting('agent_process_memory_limit_mb', 2048, type=int)
+        over = 0
+        warned = False
+        while not stop_event.wait(MEMORY_CHECK_INTERVAL):
+            if process.poll() is not None:
+                return
+            if self._started and time.monotonic() - self._last_push > STALE_WORKER_SECONDS:
+                self._kill(process, f"sent no state for {STALE_WORKER_SECONDS}s")
+                return
+            rss = _tree_rss_mb(process.pid)
+            self.rss_mb = round(rss, 1) if rss is not None else None
+            if rss is None:
+                if limit_mb > 0 and not warned:
+                    logger.warning("[WA] Cannot measure agent worker memory here (install psutil); limit not enforced.")
+                    warned = True
+                continue
+            over = over + 1 if limit_mb > 0 and rss > limit_mb else 0
+            if over >= MEMORY_CHECKS_OVER_LIMIT:
+                self._kill(process, f"used {rss:.0f} MB (limit {limit_mb} MB)")
+                return
+
+    def _forward_log(self, process):
+        levels = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING,
+                  "ERROR": logging.ERROR, "CRITICAL": logging.CRITICAL}
+        level = logging.INFO
+        try:
+            for line in process.stderr:
+                line = line.rstrip()
+                if not line:
+                    continue
+                head = line.split(" ", 1)[0]
+                if head in levels:
+                    level, line = levels[head], line[len(head) + 1:]
+                logger.log(level, f"[WA worker] {line}")
+        except Exception:
+            pass
+
+    # -- protocol --------------------------------------------------------------------
+
+    def _send(self, message: dict) -> bool:
+        process = self._process
+        if process is None or process.poll() is not None:
+            return False
+        try:
+            with self._write_lock:
+                process.stdin.write(json.dumps(message, default=str) + "\n")
+                process.stdin.flush()
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _request(self, cmd: str, **args) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        request_id = next(self._ids)
+        with self._requests_lock:
+            self._requests[request_id] = future
+        if not self._send({"cmd": cmd, "id": request_id, **args}):
+            with self._requests_lock:
+                self._requests.pop(request_id, None)
+            future.set_exception(RuntimeError("Agent worker is not running."))
+        return future
+
+    def _ask(self, cmd: str, default, timeout: float = 5.0, **args) -> concurrent.futures.Future:
+        """Request whose future resolves with ``default`` on any failure or after ``timeout``; never blocks."""
+        answer = concurrent.futures.Future()
+
+        def _resolve(value, why=None):
+            if why is not None and not answer.done():
+                logger.warning(f"[WA] Agent worker did not answer '{cmd}': {why}")
+            try:
+                answer.set_result(value)
+            except concurrent.futures.InvalidStateError:
+                pass  # the timer and the reply raced
+
+        def _done(future):
+            timer.cancel()
+            try:
+                _resolve(future.result())
+            except Exception as e:
+                _resolve(default, e)
+
+        timer = threading.Timer(timeout, _resolve, args=(default, f"no reply within {timeout:g}s"))
+        timer.daemon = True
+        timer.start()
+        self._request(cmd, **args).add_done_callback(_done)
+        return answer
+
+    def _fail_requests(self, message: str):
+        with self._requests_lock:
+            pending, self._requests = self._requests, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(message))
+
+    def _handle(self, message: dict):
+        if "reply" in message:
+            with self._requests_lock:
+                future = self._requests.pop(message["reply"], None)
+            if future is not None and not future.done():
+                if "error" in message:
+                    future.set_exception(RuntimeError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+            return
+        event = message.get("event")
+        if event == "state":
+            self._apply_state(message)
+        elif event == "status":
+            self.plugin.update_status(message.get("message", ""))
+        elif event == "import_file":
+            threading.Thread(target=self._import_file, args=(message,), name="WhatsAppWorkerImport",
+                             daemon=True).start()
+        elif event == "db_query":
+            threading.Thread(target=self._db_query, args=(message,), name="WhatsAppWorkerQuery",
+                             daemon=True).start()
+
+    def _import_file(self, message: dict):
+        """Hand a received file to the host queue; the child waits for the answer."""
+        try:
+            result = self.plugin.api.processing.import_file_to_queue(
+                message["file_path"], message.get("source", "WhatsApp"), metadata=message.get("metadata") or {}
+            )
+            self._send({"reply": message["id"], "result": bool(result)})
+        except Exception as e:
+            logger.warning(f"[WA] Could not queue file from agent worker: {e}")
+            self._send({"reply": message["id"], "error": str(e)})
+
+    def _db_query(self, message: dict):
+        """Read-only host database query for the child (known-invoice checks)."""
+        try:
+            rows = self.plugin.api.db.query(message["sql"], tuple(message.get("params") or ()))
+            self._send({"reply": message["id"], "result": [list(row) for row in rows or []]})
+        except Exception as e:
+            self._send({"reply": message["id"], "error": str(e)})
+
+    def _apply_state(self, message: dict):
+        self._started = True
+        self._last_push = time.monotonic()
+        state = message.get("state", {})
+        self.is_logged_in = bool(state.get("is_logged_in"))
+        self.standby = bool(state.get("standby"))
+        self.last_poll_at = state.get("last_poll_at")
+        self._health = message.get("health", self._health)
+        self._status = message.get("status", self._status)
+        self._startup = message.get("startup", self._startup)
+        self._metrics = message.get("metrics", self._metrics)
+        self.connection.update(self._status.get("connection"))
+        diagnostics = self._status.get("diagnostics", {})
+        self.profiler.update(diagnostics.get("profiler"))
+        self.memory.update(diagnostics.get("memory"))
+        if "memory_report" in message:
+            self.memory.last_report = message["memory_report"]
+        if self.is_logged_in and state.get("is_running"):
+            self._settle(self._ready_waiters)
+        if self.standby:
+            self._settle(self._standby_waiters, result="standby")
+
+    # -- WhatsAppClient surface ------------------------------------------------------
+
+    def _waiter(self, waiters: list, current) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._waiters_lock:
+            result = current()
+            if result:
+                future.set_result(result)
+            elif self.stopped and waiters is self._ready_waiters:
+                future.set_exception(RuntimeError("WhatsApp Agent is not running."))
+            else:
+                waiters.append(future)
+        return future
+
+    def _settle(self, waiters: list, result=True, error=None, stopped: bool = False):
+        with self._waiters_lock:
+            if stopped:
+                self.stopped = True
+            pending = list(waiters)
+            waiters.clear()
+        for future in pending:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def when_ready(self) -> concurrent.futures.Future:
+        return self._waiter(self._ready_waiters, lambda: self.is_logged_in and self.is_running)
+
+    def when_stopped(self, standby: bool = False) -> concurrent.futures.Future:
+        if not standby:
+            return self._waiter(self._stopped_waiters, lambda: "stopped" if self.stopped else None)
+        return self._waiter(
+            self._standby_waiters,
+            lambda: "stopped" if self.stopped else ("standby" if self.standby else None),
+        )
+
+    def enter_standby_async(self) -> concurrent.futures.Future:
+        """Future of whether the worker went to standby; the caller chains on it instead of waiting."""
+        if not self.is_running or not self.is_logged_in:
+            return _settled(False)
+        entered = self._ask("standby", False, timeout=2.0)
+        entered.add_done_callback(self._on_standby_answer)
+        return entered
+
+    def _on_standby_answer(self, future):
+        if future.result():
+            self.is_running = False
+
+    def resume_async(self) -> concurrent.futures.Future:
+        """Future of whether the worker left standby."""
+        if self.stopped or self._stop_requested or self._process is None:
+            return _settled(False)
+        resumed = self._ask("resume", False, timeout=2.0)
+        resumed.add_done_callback(self._on_resume_answer)
+        return resumed
+
+    def _on_resume_answer(self, future):
+        if future.result():
+            self.is_running = True
+            self.is_logged_in = False  # ready again once the worker reports it
+
+    def send_invoice(self, phone: str, text: str, file_path: str = None) -> concurrent.futures.Future:
+        result = concurrent.futures.Future()
+
+        def _done(future):
+            try:
+                ok, message = future.result()
+                result.set_result((bool(ok), str(message)))
+            except Exception as e:
+                result.set_exception(e)
+
+        self._request("send", phone=phone, text=text, file_path=file_path).add_done_callback(_done)
+        return result
+
+    def notify_duplicate(self, existing_data: dict, metadata: dict | None = None):
+        self._send({"cmd": "notify", "kind": "duplicate", "payload": existing_data, "metadata": metadata or {}})
+
+    def notify_processing_result(self, data: dict, metadata: dict | None = None):
+        self._send({"cmd": "notify", "kind": "completed", "payload": data, "metadata": metadata or {}})
+
+    def notify_processing_failed(self, error: str, metadata: dict | None = None):
+        self._send({"cmd": "notify", "kind": "failed", "payload": error, "metadata": metadata or {}})
+
+    def queue_reply(self, recipient: str, message: str):
+        self._send({"cmd": "queue_reply", "recipient": recipient, "message": message})
+
+    def start_profiling(self, seconds: float = 30, mode: str = "sampling") -> tuple[bool, str]:
+        if not self.is_running:
+            return False, "WhatsApp Agent is not running."
+        # The outcome shows up in the pushed profiler status; only a refusal is worth a log line.
+        self._ask("profile", None, seconds=seconds, mode=mode).add_done_callback(
+            lambda f: _log_refusal("profile", f))
+        return True, f"Profiling request sent to the agent worker ({seconds}s, {mode})."
+
+    def _stop_profiling(self):
+        self._send({"cmd": "profile_stop"})
+
+    def _request_memory_snapshot(self, label: str = "manual") -> tuple[bool, str]:
+        if self._process is None:
+            return False, "WhatsApp Agent is not running."
+        self._ask("memory_snapshot", None, label=label).add_done_callback(
+            lambda f: _log_refusal("memory snapshot", f))
+        return True, "Memory snapshot request sent to the agent worker."
+
+    def metrics_snapshot(self) -> dict:
+        """The metrics the worker last pushed with its state (at most ``METRICS_PUSH_INTERVAL`` old)."""
+        if self._process is None:
+            return {}
+        return self._metrics
+
+    def _startup_begin(self, kind: str = "cold"):
+        """The worker times its own startup."""
+
+    def _startup_summary(self) -> dict:
+        return self._startup.get("summary", {})
+
+    def _startup_describe(self) -> str:
+        return self._startup.get("describe", "")
+
+    def health_payload(self) -> dict:
+        if not self.is_running and not self.standby:
+            return {"status": "down", "running": False, "logged_in": False, "standby": False,
+                    "connection_state": self.connection.state, "poll_age_seconds": None}
+        health = dict(self._health)
+        if not health or time.monotonic() - self._last_push > STALE_WORKER_SECONDS / 4:
+            health["status"] = "stalled" if health else "connecting"
+        return health
+
+    def worker_status(self) -> dict:
+        return {
+            "pid": self.pid,
+            "rss_mb": self.rss_mb,
+            "memory_limit_mb": self.plugin.get_setting('agent_process_memory_limit_mb', 2048, type=int),
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "seconds_since_state": round(time.monotonic() - self._last_push, 1) if self.pid else None,
+        }
+
+    def status_payload(self) -> dict:
+        payload = dict(self._status)
+        payload.update(self.health_payload())
+        payload["worker"] = self.worker_status()
+        return payload
+
+
+class _WorkerProcessing:
+    def __init__(self, host):
+        self._host = host
+
+    def import_file_to_queue(self, file_path: str, source: str, metadata: dict | None = None) -> bool:
+        # Blocks the caller like the in-process host API does.
+        future = self._host.request("import_file", file_path=file_path, source=source, metadata=metadata or {})
+        return bool(future.result(timeout=60))
+
+
+class _WorkerDb:
+    def __init__(self, host):
+        self._host = host
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        return self._host.request("db_query", sql=sql, params=list(params)).result(timeout=10)
+
+
+class _WorkerApi:
+    def __init__(self, host):
+        self.processing = _WorkerProcessing(host)
+        self.db = _WorkerDb(host)
+
+
+class WorkerHost:
+    """The child's stand-in for the plugin: settings, status and the host API go over the pipe."""
+
+    id = "whatsapp_automation_agent"
+
+    def __init__(self, output, version: str = ""):
+        self.version = version
+        self.settings_values = {}
+        self.api = _WorkerApi(self)
+        self.wa_client = None
+        self._status_message = "Starting browser..."
+        self._output = output
+        self._write_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._requests = {}
+        self._requests_lock = threading.Lock()
+        self._last_memory_snapshot = 0
+        self._last_metrics_push = 0.0
+
+    def get_setting(self, key: str, default_val=None, type=None):
+        return _coerce(self.settings_values.get(key, default_val), type)
+
+    def set_setting(self, key: str, value):
+        self.settings_values[key] = value
+
+    def update_status(self, message: str):
+        self._status_message = message
+        logger.info(f"WhatsApp Status: {message}")
+        self.send({"event": "status", "message": message})
+        # Login, standby and resume all announce themselves here; push the state right away.
+        self.push_state()
+
+    def send(self, message: dict):
+        try:
+            with self._write_lock:
+                self._output.write(json.dumps(message, ensure_ascii=False, default=str) + "\n")
+                self._output.flush()
+        except (OSError, ValueError):
+            pass
+
+    def request(self, cmd: str, **args) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        request_id = next(self._ids)
+        with self._requests_lock:
+            self._requests[request_id] = future
+        self.send({"event": cmd, "id": request_id, **args})
+        return future
+
+    def resolve(self, message: dict):
+        with self._requests_lock:
+            future = self._requests.pop(message["reply"], None)
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(RuntimeError(message["error"]))
+        else:
+            future.set_result(message.get("result"))
+
+    def push_state(self):
+        client = self.wa_client
+        if client is None:
+            return
+        try:
+            from .status_server import AgentStatusServer
+            server = AgentStatusServer(self)
+            message = {
+                "event": "state",
+                "state": {
+                    "is_running": client.is_running,
+                    "is_logged_in": client.is_logged_in,
+                    "standby": client.standby,
+                    "last_poll_at": client.last_poll_at,
+                },
+                "health": server.health_payload(),
+                "status": server.status_payload(),
+                "startup": {"summary": client.startup.summary(), "describe": client.startup.describe()},
+            }
+            # Full reports are large; only send one when there is a new one.
+            if client.memory.snapshots != self._last_memory_snapshot:
+                self._last_memory_snapshot = client.memory.snapshots
+                message["memory_report"] = client.memory.last_report
+            if time.monotonic() - self._last_metrics_push >= METRICS_PUSH_INTERVAL:
+                self._last_metrics_push = time.monotonic()
+                message["metrics"] = client.metrics_snapshot()
+            self.send(message)
+        except Exception as e:
+            logger.warning(f"[WA] Could not push worker state: {e}")
+
+
+def _serve(host: WorkerHost, client, commands, done):
+    """Run host commands until stdin closes; the host's replies to our requests arrive here too."""
+    started = False
+
+    def _reply(message, result=None, error=None):
+        if "id" not in message:
+            return
+        reply = {"reply": message["id"]}
+        if error is not None:
+            reply["error"] = str(error)
+        else:
+            reply["result"] = result
+        host.send(reply)
+
+    for line in commands:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if "reply" in message:
+            host.resolve(message)
+            continue
+        cmd = message.get("cmd")
+        try:
+            if cmd == "start" and not started:
+                started = True
+                host.settings_values.update(message.get("settings") or {})
+                client.startup.begin()
+                threading.Thread(target=_run_agent, args=(host, client, done), name="WhatsAppAgent", daemon=True).start()
+            elif cmd == "settings":
+                host.settings_values.update(message.get("settings") or {})
+            elif cmd == "stop":
+                client.stop()
+                if not started:
+                    done.set()
+            elif cmd == "standby":
+                _reply(message, client.enter_standby())
+            elif cmd == "resume":
+                _reply(message, client.resume())
+            elif cmd == "send":
+                future = client.send_invoice(message["phone"], message["text"], message.get("file_path"))
+                future.add_done_callback(
+                    lambda f, m=message: _reply(m, list(f.result())) if f.exception() is None
+                    else _reply(m, error=f.exception())
+                )
+            elif cmd == "notify":
+                notify = {
+                    "duplicate": client.notify_duplicate,
+                    "completed": client.notify_processing_result,
+                    "failed": client.notify_processing_failed,
+                }[message["kind"]]
+                notify(message.get("payload"), message.get("metadata") or {})
+            elif cmd == "queue_reply":
+                client.queue_reply(message["recipient"], message["message"])
+            elif cmd == "profile":
+                _reply(message, list(client.start_profiling(seconds=message.get("seconds", 30),
+                                                            mode=message.get("mode", "sampling"))))
+            elif cmd == "profile_stop":
+                client.profiler.stop()
+            elif cmd == "memory_snapshot":
+                _reply(message, list(client.memory.request_snapshot(message.get("label", "manual"))))
+            elif cmd == "metrics":
+                _reply(message, client.metrics_snapshot())
+            else:
+                _reply(message, error=f"unknown command '{cmd}'")
+        except Exception as e:
+            logger.warning(f"[WA] Worker command '{cmd}' failed: {e}")
+            _reply(message, error=e)
+    # stdin closed: the host is gone, so nobody is left to talk to.
+    client.stop()
+    if not started:
+        done.set()
+
+
+def _run_agent(host: WorkerHost, client, done):
+    try:
+        client.run()
+    finally:
+        done.set()
+
+
+def _push_states(host: WorkerHost, stop_event):
+    while not stop_event.wait(STATE_PUSH_INTERVAL):
+        host.push_state()
+
+
+def main():
+    # stdout carries the protocol; anything else printed by libraries goes to stderr.
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if os.name != "nt":
+        try:
+            os.nice(10)  # inherited by the Playwright driver and Chromium
+        except OSError:
+            pass
+
+    from .whatsapp_client import WhatsAppClient
+    host = WorkerHost(output, version=sys.argv[1] if len(sys.argv) > 1 else "")
+    client = WhatsAppClient(host)
+    host.wa_client = client
+    stop_pushing = threading.Event()
+    threading.Thread(target=_push_states, args=(host, stop_pushing), name="WhatsAppWorkerState", daemon=True).start()
+
+    # The agent thread ends on "stop", when stdin closes, or when its supervisor gives up.
+    done = threading.Event()
+    commands = iter(sys.stdin.readline, "")
+    threading.Thread(target=_serve, args=(host, client, commands, done), name="WhatsAppWorkerCommands",
+                     daemon=True).start()
+    done.wait()
+    stop_pushing.set()
+    host.push_state()
+    output.flush()
+    sys.exit(EXIT_GAVE_UP if client.supervisor.gave_up else 0)
+
+
+if __name__ == "__main__":
+    main()
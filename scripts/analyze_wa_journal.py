@@ -0,0 +1,192 @@
+"""
+Summarise WhatsApp Automation Agent event journals (``journal/wa_journal*.jsonl``).
+
+Pass journal files or directories, e.g. one folder per machine collected from a fleet:
+
+    python scripts/analyze_wa_journal.py ~/.local/share/InvoicesReader/whatsapp_agent/journal
+    python scripts/analyze_wa_journal.py fleet/ --since 2025-03-01 --top 20 --json summary.json
+
+Reports end-to-end intake latency (message detected -> queued, detected -> processed),
+per-stage durations, success rates per download/attach/reply strategy, and the
+slowest chats.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+SUCCESS_OUTCOMES = {"ok", "sent", "queued"}
+
+
+def find_journals(paths: list) -> list:
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            files.extend(sorted(path.rglob("wa_journal*.jsonl")))
+        elif path.exists():
+            files.append(path)
+        else:
+            print(f"Warning: {path} not found", file=sys.stderr)
+    return files
+
+
+def read_records(files: list, since: float = 0.0):
+    bad = 0
+    for file_path in files:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    bad += 1  # e.g. a line cut short by a crash
+                    continue
+                if record.get("ts", 0) >= since:
+                    yield record
+    if bad:
+        print(f"Warning: skipped {bad} unreadable lines", file=sys.stderr)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.50), 3),
+        "p90": round(percentile(values, 0.90), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def analyze(records, top: int = 10) -> dict:
+    # Message keys are only unique per machine, so correlate on (host, message_key).
+    messages = defaultdict(dict)
+    stage_durations = defaultdict(list)
+    strategies = defaultdict(lambda: {"attempts": 0, "succeeded": 0})
+    outcomes = defaultdict(lambda: defaultdict(int))
+    hosts = defaultdict(int)
+    total = 0
+
+    for record in records:
+        total += 1
+        event, stage = record.get("event", "?"), record.get("stage", "?")
+        hosts[record.get("host", "?")] += 1
+        if "duration" in record:
+            stage_durations[f"{event}.{stage}"].append(float(record["duration"]))
+        if "outcome" in record:
+            outcomes[f"{event}.{stage}"][record["outcome"]] += 1
+        if record.get("strategy"):
+            bucket = strategies[f"{event}.{stage}:{record['strategy']}"]
+            bucket["attempts"] += 1
+            bucket["succeeded"] += 1 if record.get("outcome") in SUCCESS_OUTCOMES else 0
+
+        key = record.get("message_key")
+        if event != "intake" or not key:
+            continue
+        message = messages[(record.get("host", "?"), key)]
+        if record.get("chat"):
+            message.setdefault("chat", record["chat"])
+        # Keep the first time each stage was reached.
+        if stage == "enqueue" and record.get("outcome") != "queued":
+            continue
+        if stage == "processed" and record.get("outcome") != "ok":
+            continue
+        message.setdefault(stage, record["ts"])
+
+    to_queue, to_processed = [], []
+    per_chat = defaultdict(list)
+    for message in messages.values():
+        detected = message.get("detected")
+        if detected is None:
+            continue
+        if "enqueue" in message:
+            latency = message["enqueue"] - detected
+            to_queue.append(latency)
+            per_chat[message.get("chat") or "?"].append(latency)
+        if "processed" in message:
+            to_processed.append(message["processed"] - detected)
+
+    slowest = sorted(
+        ({"chat": chat, **summarize(values)} for chat, values in per_chat.items()),
+        key=lambda item: (item["p95"], item["max"]),
+        reverse=True,
+    )[:top]
+
+    return {
+        "records": total,
+        "hosts": dict(hosts),
+        "messages_detected": sum(1 for m in messages.values() if "detected" in m),
+        "intake_detected_to_queued_seconds": summarize(to_queue),
+        "intake_detected_to_processed_seconds": summarize(to_processed),
+        "stage_durations_seconds": {name: summarize(values) for name, values in sorted(stage_durations.items())},
+        "strategies": {
+            name: {**counts, "success_rate": round(counts["succeeded"] / counts["attempts"], 3)}
+            for name, counts in sorted(strategies.items())
+        },
+        "outcomes": {name: dict(counts) for name, counts in sorted(outcomes.items())},
+        "slowest_chats": slowest,
+    }
+
+
+def print_summary(summary: dict):
+    print(f"Records: {summary['records']}  hosts: {len(summary['hosts'])}  messages detected: {summary['messages_detected']}")
+    print("\nEnd-to-end intake latency (seconds):")
+    for name in ("intake_detected_to_queued_seconds", "intake_detected_to_processed_seconds"):
+        s = summary[name]
+        print(f"  {name.replace('intake_', '').replace('_seconds', ''):<24} n={s['count']:<6} "
+              f"p50={s['p50']:>8.2f} p90={s['p90']:>8.2f} p95={s['p95']:>8.2f} p99={s['p99']:>8.2f} max={s['max']:>8.2f}")
+
+    print("\nStage durations (seconds):")
+    for name, s in summary["stage_durations_seconds"].items():
+        print(f"  {name:<28} n={s['count']:<6} p50={s['p50']:>8.2f} p95={s['p95']:>8.2f} max={s['max']:>8.2f}")
+
+    print("\nStrategy success rates:")
+    for name, s in summary["strategies"].items():
+        print(f"  {name:<40} {s['succeeded']:>6}/{s['attempts']:<6} {s['success_rate']:>7.1%}")
+
+    print("\nSlowest chats (detected -> queued):")
+    for item in summary["slowest_chats"]:
+        print(f"  {item['chat'][:40]:<40} n={item['count']:<5} p50={item['p50']:>8.2f} p95={item['p95']:>8.2f} max={item['max']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp agent event journals.")
+    parser.add_argument("paths", nargs="+", help="journal files or directories to search recursively")
+    parser.add_argument("--since", help="only records at or after this date/time (ISO format)")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest chats to list")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    files = find_journals(args.paths)
+    if not files:
+        print("No journal files found.")
+        return 1
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else 0.0
+
+    summary = analyze(read_records(files, since), top=args.top)
+    summary["files"] = [str(f) for f in files]
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"\nSummary written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())